@@ -0,0 +1,46 @@
+# hierarchical_throughput.py: measure the throughput of the vectorized
+# evaluation of maps derived from HierarchicalHealpixMap
+# Run from the command line as, e.g.,
+# python hierarchical_throughput.py Combined19 1e6 1e8
+# Large numbers of stars are evaluated in chunks of --chunk stars
+###############################################################################
+import sys
+import time
+import argparse
+import numpy
+import mwdust
+
+def throughput(dustmap,nstar,chunk=10**7,seed=1):
+    """Evaluate dustmap for nstar random stars and return the number of stars
+    per second"""
+    rng= numpy.random.default_rng(seed)
+    nstar= int(nstar)
+    ttot= 0.
+    ndone= 0
+    while ndone < nstar:
+        nchunk= min(chunk,nstar-ndone)
+        ls= rng.uniform(0.,360.,size=nchunk)
+        bs= numpy.degrees(numpy.arcsin(rng.uniform(-1.,1.,size=nchunk)))
+        ds= rng.uniform(0.1,10.,size=nchunk)
+        start= time.perf_counter()
+        dustmap(ls,bs,ds)
+        ttot+= time.perf_counter()-start
+        ndone+= nchunk
+    return nstar/ttot
+
+if __name__ == '__main__':
+    parser= argparse.ArgumentParser(description="Benchmark vectorized dust-map evaluation")
+    parser.add_argument('map',help="name of the map, e.g., Combined19")
+    parser.add_argument('nstars',nargs='+',type=float,help="number(s) of stars")
+    parser.add_argument('--chunk',type=int,default=10**7,
+                        help="maximum number of stars evaluated per call")
+    parser.add_argument('--interpk',type=int,default=1,
+                        help="interpolation order")
+    args= parser.parse_args()
+    start= time.perf_counter()
+    dustmap= getattr(mwdust,args.map)(interpk=args.interpk)
+    sys.stdout.write("Loaded %s in %.1f s\n" % (args.map,time.perf_counter()-start))
+    for nstar in args.nstars:
+        sys.stdout.write("%s: %.0e stars: %.3e stars/s\n" \
+                             % (args.map,nstar,
+                                throughput(dustmap,nstar,chunk=args.chunk)))
@@ -6,7 +6,7 @@
 ###############################################################################
 import os, os.path
 import numpy
-import h5py
+from mwdust.util.sidecar import read_dataset
 from mwdust.util.download import dust_dir, downloader
 from mwdust.HierarchicalHealpixMap import HierarchicalHealpixMap
 _DEGTORAD= numpy.pi/180.
@@ -15,7 +15,7 @@ class Combined19(HierarchicalHealpixMap):
     """extinction model obtained from a combination of Marshall et al.
     (2006), Green et al. (2019), and Drimmel et al. (2003)"""
     def __init__(self,filter=None,sf10=True,load_samples=False,
-                 interpk=1):
+                 interpk=1,precompute=False,mmap=False,cache=None):
         """
         NAME:
            __init__
@@ -25,6 +25,9 @@ class Combined19(HierarchicalHealpixMap):
            filter= filter to return the extinction in
            sf10= (True) if True, use the Schlafly & Finkbeiner calibrations
            interpk= (1) interpolation order
+           precompute= (False) if True, precompute the interpolation coefficients for interpk > 1 ('disk': also store them in a file)
+           mmap= (False) if True, memory-map the map's arrays rather than reading them into memory
+           cache= (None) LRUCache of the splines for interpk > 1 (default: mwdust.util.cache.shared_cache())
         OUTPUT:
            object
         HISTORY:
@@ -33,10 +36,9 @@ class Combined19(HierarchicalHealpixMap):
         """
         HierarchicalHealpixMap.__init__(self,filter=filter,sf10=sf10)
         #Read the map
-        with h5py.File(os.path.join(_combineddir,'combine19.h5'),'r') \
-                as combineddata:
-            self._pix_info= combineddata['/pixel_info'][:]
-            self._best_fit= combineddata['/best_fit'][:]
+        mapfile= os.path.join(_combineddir,'combine19.h5')
+        self._pix_info= read_dataset(mapfile,'/pixel_info',mmap=mmap)
+        self._best_fit= read_dataset(mapfile,'/best_fit',mmap=mmap)
         # Utilities
         self._distmods= numpy.linspace(4,18.875,120)
         self._minnside= numpy.amin(self._pix_info['nside'])
@@ -45,9 +47,10 @@ class Combined19(HierarchicalHealpixMap):
         self._nsides= [self._maxnside//2**ii for ii in range(nlevels)]
         self._indexArray= numpy.arange(len(self._pix_info['healpix_index']))
         # For the interpolation
-        self._intps= numpy.zeros(len(self._pix_info['healpix_index']),
-                                 dtype='object') #array to cache interpolated extinctions
+        self._setup_splines(cache)
         self._interpk= interpk
+        self._setup_ppoly(precompute,mapfile)
+        self._setup_lookup(mapfile)
         return None
 
     @classmethod
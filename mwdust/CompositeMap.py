@@ -0,0 +1,90 @@
+###############################################################################
+#
+#   CompositeMap: extinction map composed on the fly of a list of maps in
+#                 order of priority
+#
+###############################################################################
+import numpy
+from mwdust.util.extCurves import aebv
+from mwdust.DustMap3D import DustMap3D
+class CompositeMap(DustMap3D):
+    """extinction map composed on the fly of a list of maps in order of
+    priority"""
+    def __init__(self,maps,filter=None,sf10=True):
+        """
+        NAME:
+           __init__
+        PURPOSE:
+           Initialize the composite dust map
+        INPUT:
+           maps - list of DustMap3D instances in order of priority (e.g., [Zucker25(),Green19(),Marshall06(),Drimmel03()]); each star is evaluated with the first map that covers its sightline and does not return NaN
+           filter= filter to return the extinction in
+           sf10= (True) if True, use the Schlafly & Finkbeiner calibrations
+        OUTPUT:
+           object
+        HISTORY:
+           2026-10-18 - Written
+        """
+        DustMap3D.__init__(self,filter=filter)
+        self._sf10= sf10
+        self._maps= list(maps)
+        return None
+
+    def _evaluate(self,l,b,d):
+        """
+        NAME:
+           _evaluate
+        PURPOSE:
+           evaluate the dust-map
+        INPUT:
+           l- Galactic longitude (deg) can be array
+           b- Galactic latitude (deg) can be array
+           d- distance (kpc) can be array; (l,b,d) are broadcast against each other
+        OUTPUT:
+           extinction (NaN where none of the maps has a value)
+        HISTORY:
+           2026-10-18 - Written
+        """
+        l,b,d= numpy.broadcast_arrays(numpy.atleast_1d(l),
+                                      numpy.atleast_1d(b),
+                                      numpy.atleast_1d(d))
+        shape= l.shape
+        l,b,d= l.flatten(), b.flatten(), d.flatten()
+        out= numpy.full(len(l),numpy.nan)
+        # Each map is only evaluated for the stars that are left
+        todo= numpy.arange(len(l))
+        for dustmap in self._maps:
+            if len(todo) == 0: break
+            covered= dustmap.coverage(l[todo],b[todo])
+            indx= todo[covered]
+            if len(indx) == 0: continue
+            ebv= dustmap(l[indx],b[indx],d[indx])
+            if not dustmap._filter is None:
+                ebv= ebv/aebv(dustmap._filter,
+                              sf10=getattr(dustmap,'_sf10',True))
+            out[indx]= ebv
+            # Stars with NaN extinction fall through to the next map
+            todo= numpy.sort(numpy.concatenate((todo[~covered],
+                                                indx[numpy.isnan(ebv)])))
+        if not self._filter is None:
+            out*= aebv(self._filter,sf10=self._sf10)
+        return out.reshape(shape)
+
+    def coverage(self,l,b):
+        """
+        NAME:
+           coverage
+        PURPOSE:
+           return whether sightlines are covered by any of the maps
+        INPUT:
+           l,b - Galactic longitude and latitude (deg), broadcast against each other
+        OUTPUT:
+           boolean array with the broadcast shape of (l,b)
+        HISTORY:
+           2026-10-18 - Written
+        """
+        out= numpy.zeros(numpy.broadcast_shapes(numpy.shape(l),numpy.shape(b)),
+                         dtype='bool')
+        for dustmap in self._maps:
+            out|= dustmap.coverage(l,b)
+        return out
@@ -4,20 +4,18 @@
 #
 ###############################################################################
 import os
-import copy
 import numpy
 import tarfile
 import inspect
-from scipy.ndimage import map_coordinates
+from scipy.ndimage import map_coordinates, spline_filter
+from scipy.spatial import cKDTree
 from scipy import optimize
-try:
-    import healpy
-except ImportError: pass
 from mwdust.util.extCurves import aebv
 from mwdust.util import read_Drimmel
-from mwdust.util.tools import cos_sphere_dist
+from mwdust.util.healpix import pix2ang, nside2pixarea
 from mwdust.util.download import  dust_dir, downloader
-from mwdust.DustMap3D import DustMap3D
+from mwdust.DustMap3D import DustMap3D, _grid_lb, _disk_fields, \
+    _query_discs, _disk_offsets
 
 _DEGTORAD= numpy.pi/180.
 class Drimmel03(DustMap3D):
@@ -41,11 +39,15 @@ class Drimmel03(DustMap3D):
         #Read the maps
         drimmelMaps= read_Drimmel.readDrimmelAll()
         self._drimmelMaps= drimmelMaps
-        #Sines and cosines of sky positions of COBE pixels
-        self._rf_sintheta= numpy.sin(numpy.pi/2.-self._drimmelMaps['rf_glat']*_DEGTORAD)
-        self._rf_costheta= numpy.cos(numpy.pi/2.-self._drimmelMaps['rf_glat']*_DEGTORAD)
-        self._rf_sinphi= numpy.sin(self._drimmelMaps['rf_glon']*_DEGTORAD)
-        self._rf_cosphi= numpy.cos(self._drimmelMaps['rf_glon']*_DEGTORAD)
+        #KD-tree of the unit vectors of the COBE pixels to find the nearest
+        #pixel for the re-scaling
+        rf_glat= self._drimmelMaps['rf_glat'].astype('float64')*_DEGTORAD
+        rf_glon= self._drimmelMaps['rf_glon'].astype('float64')*_DEGTORAD
+        self._rf_tree= cKDTree(numpy.array([numpy.cos(rf_glat)*numpy.cos(rf_glon),
+                                            numpy.cos(rf_glat)*numpy.sin(rf_glon),
+                                            numpy.sin(rf_glat)]).T)
+        #Spline coefficients of the grids, computed when first used
+        self._splinecoeffs= {}
         #Various setups
         self._xsun= -8.
         self._zsun= 0.015
@@ -69,58 +71,73 @@ class Drimmel03(DustMap3D):
         PURPOSE:
            evaluate the dust-map
         INPUT:
-           l- Galactic longitude (deg)
-           b- Galactic latitude (deg)
-           d- distance (kpc) can be array
+           l- Galactic longitude (deg) can be array
+           b- Galactic latitude (deg) can be array
+           d- distance (kpc) can be array; (l,b,d) are broadcast against each other
            norescale= (False) if True, don't apply re-scalings
            _fd, _fs, _fo= (1.) amplitudes of the different components
         OUTPUT:
            extinction
         HISTORY:
            2013-12-10 - Started - Bovy (IAS)
+           2026-10-18 - Vectorized
         """
-        if isinstance(l,numpy.ndarray) or isinstance(b,numpy.ndarray):
-            raise NotImplementedError("array input for l and b for Drimmel dust map not implemented")
+        # Quantities that only depend on the line of sight are computed once
+        # per (l,b), and then broadcast to d
+        l,b= numpy.broadcast_arrays(l,b)
+        lbshape= l.shape
+        shape= numpy.broadcast_shapes(lbshape,numpy.shape(d))
+        l= l.flatten()
+        b= b.flatten()
 
         cl= numpy.cos(l*_DEGTORAD)
         sl= numpy.sin(l*_DEGTORAD)
         cb= numpy.cos(b*_DEGTORAD)
         sb= numpy.sin(b*_DEGTORAD)
 
+        #Find nearest pixel in COBE map for the re-scaling
+        rfdisk, rfspir, rfori= 1., 1., 1.
+        if not norescale:
+            rfIndx= self._rf_tree.query(numpy.array([cb*cl,cb*sl,sb]).T)[1]
+            rf_comp= self._drimmelMaps['rf_comp'][rfIndx]
+            rf= self._drimmelMaps['rf'][rfIndx]
+            rfdisk= numpy.where(rf_comp == 1,rf,1.)
+            rfspir= numpy.where(rf_comp == 2,rf,1.)
+            rfori= numpy.where(rf_comp == 3,rf,1.)
+
+        #Find maximum distance, for all grids and for the Orion grid, which
+        #is different from the other global grids
+        with numpy.errstate(divide='ignore',invalid='ignore'):
+            dmax= numpy.where(b != 0.,.49999/numpy.fabs(sb)-self._zsun/sb,100.)
+            dmax_ori= dmax
+            dmax= numpy.where(cl != 0.,
+                              numpy.fmin(dmax,14.9999/numpy.fabs(cl)
+                                         -self._xsun/cl),dmax)
+            dmax= numpy.where(sl != 0.,
+                              numpy.fmin(dmax,14.9999/numpy.fabs(sl)),dmax)
+            dmax_ori= numpy.where(cl > 0.,
+                                  numpy.fmin(dmax_ori,2.374999/numpy.fabs(cl)),
+                                  dmax_ori)
+            dmax_ori= numpy.where(cl < 0.,
+                                  numpy.fmin(dmax_ori,1.374999/numpy.fabs(cl)),
+                                  dmax_ori)
+            dmax_ori= numpy.where(sl != 0.,
+                                  numpy.fmin(dmax_ori,3.749999/numpy.fabs(sl)),
+                                  dmax_ori)
+
+        cl, sl, cb, sb, rfdisk, rfspir, rfori, dmax, dmax_ori=\
+            [numpy.broadcast_to(x.reshape(lbshape),shape).flatten()
+             if numpy.ndim(x) > 0 else x
+             for x in [cl,sl,cb,sb,rfdisk,rfspir,rfori,dmax,dmax_ori]]
+        d= numpy.broadcast_to(d,shape).astype('float64').flatten()
+
         #Setup arrays
         avori= numpy.zeros_like(d)
         avspir= numpy.zeros_like(d)
         avdisk= numpy.zeros_like(d)
 
-        #Find nearest pixel in COBE map for the re-scaling
-        rfIndx= numpy.argmax(cos_sphere_dist(self._rf_sintheta,
-                                             self._rf_costheta,
-                                             self._rf_sinphi,
-                                             self._rf_cosphi,
-                                             numpy.sin(numpy.pi/2.-b*_DEGTORAD),
-                                             numpy.cos(numpy.pi/2.-b*_DEGTORAD),
-                                             sl,cl))
-
-        rfdisk, rfspir, rfori= 1., 1., 1,
-        if self._drimmelMaps['rf_comp'][rfIndx] == 1 and not norescale:
-            rfdisk= self._drimmelMaps['rf'][rfIndx]
-        elif self._drimmelMaps['rf_comp'][rfIndx] == 2 and not norescale:
-            rfspir= self._drimmelMaps['rf'][rfIndx]
-        elif self._drimmelMaps['rf_comp'][rfIndx] == 3 and not norescale:
-            rfori= self._drimmelMaps['rf'][rfIndx]
+        d= numpy.where(d > dmax,dmax,d)
 
-        #Find maximum distance
-        dmax= 100.
-        if b != 0.: dmax= .49999/numpy.fabs(sb) - self._zsun/sb
-        if cl != 0.:
-            tdmax= (14.9999/numpy.fabs(cl)-self._xsun/cl)
-            if tdmax < dmax: dmax= tdmax
-        if sl != 0.:
-            tdmax = 14.9999/numpy.fabs(sl)
-            if tdmax < dmax: dmax= tdmax
-        d= copy.copy(d)
-        d[d > dmax]= dmax
-        
         #Rectangular coordinates
         X= d*cb*cl
         Y= d*cb*sl
@@ -133,18 +150,14 @@ class Drimmel03(DustMap3D):
             xi = X[locIndx]/self._dx_ori2+float(self._nx_ori2-1)/2.
             yj = Y[locIndx]/self._dy_ori2+float(self._ny_ori2-1)/2.
             zk = Z[locIndx]/self._dz_ori2+float(self._nz_ori2-1)/2.
-            avori[locIndx]= map_coordinates(self._drimmelMaps['avori2'],
-                                            [xi,yj,zk],
-                                            mode='constant',cval=0.)
+            avori[locIndx]= self._map_coordinates('avori2',[xi,yj,zk])
         #local disk
         locIndx= (numpy.fabs(X) < 0.75)*(numpy.fabs(Y) < 0.75)
         if numpy.sum(locIndx) > 0:
             xi = X[locIndx]/self._dx_diskloc+float(self._nx_diskloc-1)/2.
             yj = Y[locIndx]/self._dy_diskloc+float(self._ny_diskloc-1)/2.
             zk = Z[locIndx]/self._dz_diskloc+float(self._nz_diskloc-1)/2.
-            avdisk[locIndx]= map_coordinates(self._drimmelMaps['avdloc'],
-                                             [xi,yj,zk],
-                                             mode='constant',cval=0.)
+            avdisk[locIndx]= self._map_coordinates('avdloc',[xi,yj,zk])
         
         #Go to Galactocentric coordinates
         X= X+self._xsun
@@ -153,53 +166,48 @@ class Drimmel03(DustMap3D):
         #Orion
         globIndx= True^(numpy.fabs(X-self._xsun) < 1.)*(numpy.fabs(Y) < 2.)
         if numpy.sum(globIndx) > 0:
-            #Orion grid is different from other global grids, so has its own dmax
-            dmax= 100.
-            if b != 0.: dmax= .49999/numpy.fabs(sb) - self._zsun/sb
-            if cl > 0.:
-                tdmax = (2.374999/numpy.fabs(cl))
-                if tdmax < dmax: dmax= tdmax
-            if cl < 0.:
-                tdmax = (1.374999/numpy.fabs(cl))
-                if tdmax < dmax: dmax= tdmax
-            if sl != 0.:
-                tdmax = (3.749999/numpy.fabs(sl))
-                if tdmax < dmax: dmax= tdmax
-            dori= copy.copy(d)
-            dori[dori > dmax]= dmax
-            Xori= dori*cb*cl+self._xsun
-            Yori= dori*cb*sl
-            Zori= dori*sb+self._zsun
+            dori= numpy.where(d > dmax_ori,dmax_ori,d)[globIndx]
+            Xori= dori*cb[globIndx]*cl[globIndx]+self._xsun
+            Yori= dori*cb[globIndx]*sl[globIndx]
+            Zori= dori*sb[globIndx]+self._zsun
 
-            xi = Xori[globIndx]/self._dx_ori + 2.5*float(self._nx_ori-1)
-            yj = Yori[globIndx]/self._dy_ori + float(self._ny_ori-1)/2.
-            zk = Zori[globIndx]/self._dz_ori + float(self._nz_ori-1)/2.
+            xi = Xori/self._dx_ori + 2.5*float(self._nx_ori-1)
+            yj = Yori/self._dy_ori + float(self._ny_ori-1)/2.
+            zk = Zori/self._dz_ori + float(self._nz_ori-1)/2.
 
-            avori[globIndx]= map_coordinates(self._drimmelMaps['avori'],
-                                             [xi,yj,zk],
-                                             mode='constant',cval=0.)
+            avori[globIndx]= self._map_coordinates('avori',[xi,yj,zk])
         #disk & spir
         xi = X/self._dx_disk+float(self._nx_disk-1)/2.
         yj = Y/self._dy_disk+float(self._ny_disk-1)/2.
         zk = Z/self._dz_disk+float(self._nz_disk-1)/2.
-        avspir= map_coordinates(self._drimmelMaps['avspir'],
-                                [xi,yj,zk],
-                                mode='constant',cval=0.)
+        avspir= self._map_coordinates('avspir',[xi,yj,zk])
         globIndx= True^(numpy.fabs(X-self._xsun) < 0.75)*(numpy.fabs(Y) < 0.75)
         if numpy.sum(globIndx) > 0:
-            avdisk[globIndx]= map_coordinates(self._drimmelMaps['avdisk'],
-                                              [xi,yj,zk],
-                                              mode='constant',
-                                              cval=0.)[globIndx]
+            avdisk[globIndx]= self._map_coordinates('avdisk',
+                                                    [xi[globIndx],
+                                                     yj[globIndx],
+                                                     zk[globIndx]])
         
         #Return
-        out=_fd*rfdisk*avdisk+_fs*rfspir*avspir+_fo*rfori*avori
+        out=(_fd*rfdisk*avdisk+_fs*rfspir*avspir+_fo*rfori*avori)\
+            .reshape(shape)
         if self._filter is None: # From Rieke & Lebovksy (1985); if sf10, first put ebv on SFD scale
             return out/3.09/((1-self._sf10)+self._sf10*0.86)
         else: 
             return out/3.09/((1-self._sf10)+self._sf10*0.86)\
                 *aebv(self._filter,sf10=self._sf10)
 
+    def _map_coordinates(self,name,coords):
+        """Cubic-spline interpolation of the grid name at the grid coordinates coords, equivalent to map_coordinates with mode='constant' and cval=0., but using the spline coefficients of the grid that are computed only once"""
+        if not name in self._splinecoeffs:
+            self._splinecoeffs[name]= spline_filter(self._drimmelMaps[name],
+                                                    order=3,
+                                                    output=numpy.float64,
+                                                    mode='constant')
+        return map_coordinates(self._splinecoeffs[name],coords,
+                               output=self._drimmelMaps[name].dtype,
+                               mode='constant',cval=0.,prefilter=False)
+
     def dust_vals_disk(self,lcen,bcen,dist,radius):
         """
         NAME:
@@ -214,27 +222,39 @@ class Drimmel03(DustMap3D):
            (pixarea,extinction) - arrays of pixel-area in sq rad and extinction value
         HISTORY:
            2015-03-07 - Written - Bovy (IAS)
+           2026-10-18 - Evaluated with dust_vals_disks
+        """
+        return self.dust_vals_disks(lcen,bcen,dist,radius)[1:]
+
+    def dust_vals_disks(self,lcen,bcen,dist,radius):
+        """
+        NAME:
+           dust_vals_disks
+        PURPOSE:
+           return the distribution of extinction within many small disks (e.g., the fields of a survey) as samples
+        INPUT:
+           lcen, bcen - Galactic longitude and latitude of the centers of the disks (deg), can be arrays
+           dist - distance in kpc, scalar or array of distances at which all disks are evaluated
+           radius - radius of the disks (deg), can be array; (lcen,bcen,radius) are broadcast against each other
+        OUTPUT:
+           (offsets,pixarea,extinction) - the pixels of disk i are offsets[i]:offsets[i+1] of the arrays of pixel-area in sq rad and extinction value (with a trailing axis of distances for array dist)
+        HISTORY:
+           2026-10-18 - Written
         """
-        # Convert the disk center to a HEALPIX vector
-        vec= healpy.pixelfunc.ang2vec((90.-bcen)*_DEGTORAD,lcen*_DEGTORAD)
+        lcen,bcen,radius= _disk_fields(lcen,bcen,radius)
         # We pixelize the map with a HEALPIX grid with nside=256, to somewhat
         # oversample the Drimmel resolution
         nside= 256
-        # Find the pixels at this resolution that fall within the disk
-        ipixs= healpy.query_disc(nside,vec,radius*_DEGTORAD,
-                                 inclusive=False,nest=False)
-        # Query the HEALPIX map for pixels that lie within the disk
-        pixarea= healpy.pixelfunc.nside2pixarea(nside)+numpy.zeros(len(ipixs))
-        extinction= []
-        for ii, ipix in enumerate(ipixs):
-            # Get glon and glat
-            b9, l= healpy.pixelfunc.pix2ang(nside,ipix,nest=False)
-            b= 90.-b9/_DEGTORAD
-            l/= _DEGTORAD
-            # Now evaluate
-            extinction.append(self._evaluate(l,b,dist))
-        extinction= numpy.array(extinction)
-        return (pixarea,extinction)
+        # Find the pixels at this resolution that fall within the disks
+        field, ipixs= _query_discs(nside,lcen,bcen,radius,nest=True)
+        pixarea= nside2pixarea(nside)+numpy.zeros(len(ipixs))
+        # Get glon and glat
+        b9, l= pix2ang(nside,ipixs,nest=True)
+        b= 90.-b9/_DEGTORAD
+        l/= _DEGTORAD
+        # Now evaluate
+        extinction= self._evaluate(*_grid_lb(l,b,dist),dist)
+        return (_disk_offsets(field,len(lcen)),pixarea,extinction)
 
     def fit(self,l,b,dist,ext,e_ext):
         """
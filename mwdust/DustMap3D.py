@@ -4,12 +4,31 @@
 #              from this
 #
 ###############################################################################
+import os, os.path
+import shutil
+import contextlib
+import pickle
+import tempfile
+import uuid
+from concurrent.futures import Executor, ThreadPoolExecutor, \
+    ProcessPoolExecutor
 import numpy
+from mwdust.util.extCurves import aebv, aebv_array
+from mwdust.util.sidecar import share_arrays, unshare_arrays, shared_nbytes
+from mwdust.util.healpix import ang2vec, pix2ang, query_disc
 try:
     from galpy.util import plot as bovy_plot
     _BOVY_PLOT_LOADED= True
 except ImportError:
     _BOVY_PLOT_LOADED= False
+# Map most recently used by _evaluate_chunk in a worker process, as
+# (token,map), such that it is only loaded once per evaluate_parallel call
+_WORKER_MAP= (None,None)
+_REGION_DISKS= 64 # number of disks per chunk in region_stats
+_EXPORT_CHUNK= 2**18 # number of pixels per chunk in to_healpix
+_INVERT_CHUNK= 2**14 # number of sightlines per chunk in distance_at_extinction
+_DEGTORAD= numpy.pi/180.
+_SHM_MARGIN= 2**26 # free space to leave in /dev/shm when sharing a map
 
 class DustMap3D(object):
     """top-level class for a 3D dust map; all other dust maps inherit from this"""
@@ -37,19 +56,275 @@ class DustMap3D(object):
            evaluate the dust map
         INPUT:
            Either:
-              (l,b,d) -  Galactic longitude, latitude (deg), and distance (kpc)
+              (l,b,d) -  Galactic longitude, latitude (deg), and distance (kpc), scalars or arrays that are broadcast against each other
+           grid= (False) if True, evaluate the map at all distances d for all sightlines (l,b), returning an array with shape (l,b).shape+d.shape (e.g., (N,M) for N sightlines and M distances)
+           filters= (None) if given, return the extinction in these filters rather than in the map's filter from a single evaluation of the map: either a list of filters (e.g., ['2MASS J','2MASS H','2MASS Ks']), which adds a trailing axis with the filters to the output, or a numpy array of filters that is broadcast against (l,b,d) (e.g., a filter for each star)
         OUTPUT:
+           extinction, with the broadcast shape of (l,b,d) (or shape (l,b).shape+d.shape for grid=True), with a trailing axis for a list of filters
         HISTORY:
            2013-11-24 - Started - Bovy (IAS)
         """
+        grid= kwargs.pop('grid',False)
+        filters= kwargs.pop('filters',None)
         if True: #(l,b,d)
             l,b,d= args
             if isinstance(d,(int,float,numpy.float32,numpy.float64)):
                 d= numpy.array([d])
+            if grid:
+                l,b= _grid_lb(l,b,d)
             try:
-                return self._evaluate(l,b,d,**kwargs)
+                out= self._evaluate(l,b,d,**kwargs)
             except AttributeError:
                 raise NotImplementedError("'_evaluate' for this DustMap3D not implemented yet")
+            if filters is None:
+                return out
+            # Convert to the requested filters in one step
+            sf10= getattr(self,'_sf10',True)
+            fac= aebv_array(filters,sf10=sf10)
+            if not self._filter is None:
+                fac= fac/aebv(self._filter,sf10=sf10)
+            if isinstance(filters,numpy.ndarray):
+                return out*fac
+            else:
+                return out[...,None]*fac
+
+    def evaluate_parallel(self,l,b,d,n_workers=None,chunk_size=100000,
+                          executor='thread',grid=False,_state=None,**kwargs):
+        """
+        NAME:
+           evaluate_parallel
+        PURPOSE:
+           evaluate the dust map in chunks on a pool of threads or processes
+        INPUT:
+           l,b,d - Galactic longitude, latitude (deg), and distance (kpc), arrays that are broadcast against each other
+           n_workers= (None: os.cpu_count()) number of workers of the pool
+           chunk_size= (100000) number of evaluations per chunk
+           executor= ('thread') 'thread' or 'process' to evaluate on a new pool of threads or processes, or a concurrent.futures.Executor to use an existing pool; processes memory-map the map's arrays rather than receiving a copy (arrays that are not already memory-mapped, e.g., because the map was not set up with mmap=True, are written to a temporary file first, in /dev/shm if it has room for them and in the default temporary directory otherwise; maps set up with mmap=True avoid this copy)
+           grid= (False) if True, evaluate at all distances d for all sightlines (l,b) (see __call__)
+           _state= (None) (token,statefile) of the map's state shared with the processes by _shared_state, to share it only once for many calls (e.g., for the chunks of a catalog); by default, the state is shared for this call
+           Other keywords are passed to the map's __call__ (e.g., filters=)
+        OUTPUT:
+           extinction, with the broadcast shape of (l,b,d) and identical to __call__(l,b,d,grid=grid)
+        HISTORY:
+           2026-10-18 - Written
+        """
+        if grid:
+            l,b= _grid_lb(l,b,d)
+        l,b,d= numpy.broadcast_arrays(numpy.atleast_1d(l),
+                                      numpy.atleast_1d(b),
+                                      numpy.atleast_1d(d))
+        shape= l.shape
+        l,b,d= l.flatten(), b.flatten(), d.flatten()
+        starts= range(0,len(l),chunk_size)
+        # Per-star filters are split into chunks like (l,b,d)
+        filters= kwargs.pop('filters',None)
+        if isinstance(filters,numpy.ndarray):
+            filters= numpy.broadcast_to(filters,shape).flatten()
+            chunk_kwargs= [dict(kwargs,filters=filters[start:start+chunk_size])
+                           for start in starts]
+        else:
+            chunk_kwargs= [kwargs if filters is None
+                           else dict(kwargs,filters=filters)]*len(starts)
+        if isinstance(executor,Executor):
+            pool= executor
+        elif executor == 'thread':
+            pool= ThreadPoolExecutor(max_workers=n_workers)
+        elif executor == 'process':
+            pool= ProcessPoolExecutor(max_workers=n_workers)
+        else:
+            raise ValueError("executor= must be 'thread', 'process', or a concurrent.futures.Executor")
+        try:
+            if isinstance(pool,ProcessPoolExecutor):
+                with contextlib.ExitStack() as stack:
+                    if _state is None:
+                        _state= stack.enter_context(_shared_state(self))
+                    token,statefile= _state
+                    futures= [pool.submit(_evaluate_chunk,token,statefile,
+                                          l[start:start+chunk_size],
+                                          b[start:start+chunk_size],
+                                          d[start:start+chunk_size],
+                                          ckwargs)
+                              for start,ckwargs in zip(starts,chunk_kwargs)]
+                    out= [future.result() for future in futures]
+            else:
+                futures= [pool.submit(self,l[start:start+chunk_size],
+                                      b[start:start+chunk_size],
+                                      d[start:start+chunk_size],**ckwargs)
+                          for start,ckwargs in zip(starts,chunk_kwargs)]
+                out= [future.result() for future in futures]
+        finally:
+            if not pool is executor:
+                pool.shutdown()
+        out= numpy.concatenate(out)
+        return out.reshape(shape+out.shape[1:])
+
+    def coverage(self,l,b):
+        """
+        NAME:
+           coverage
+        PURPOSE:
+           return whether sightlines are covered by the map (all sightlines for full-sky maps)
+        INPUT:
+           l,b - Galactic longitude and latitude (deg), broadcast against each other
+        OUTPUT:
+           boolean array with the broadcast shape of (l,b)
+        HISTORY:
+           2026-10-18 - Written
+        """
+        return numpy.ones(numpy.broadcast_shapes(numpy.shape(l),numpy.shape(b)),
+                          dtype='bool')
+
+    def dust_vals_disks(self,lcen,bcen,dist,radius):
+        """
+        NAME:
+           dust_vals_disks
+        PURPOSE:
+           return the distribution of extinction within many small disks (e.g., the fields of a survey) as samples
+        INPUT:
+           lcen, bcen - Galactic longitude and latitude of the centers of the disks (deg), can be arrays
+           dist - distance in kpc, scalar or array of distances at which all disks are evaluated
+           radius - radius of the disks (deg), can be array; (lcen,bcen,radius) are broadcast against each other
+        OUTPUT:
+           (offsets,pixarea,extinction) - the pixels of disk i are offsets[i]:offsets[i+1] of the arrays of pixel-area in sq rad and extinction value (with a trailing axis of distances for array dist)
+        HISTORY:
+           2026-10-18 - Written
+        """
+        # Maps without a vectorized implementation evaluate the disks in turn
+        lcen,bcen,radius= _disk_fields(lcen,bcen,radius)
+        pixarea= []
+        extinction= []
+        for tl,tb,tr in zip(lcen,bcen,radius):
+            tarea,text= self.dust_vals_disk(tl,tb,dist,tr)
+            pixarea.append(numpy.atleast_1d(tarea))
+            extinction.append(numpy.reshape(text,(len(pixarea[-1]),)
+                                            +numpy.shape(dist)))
+        offsets= numpy.cumsum([0]+[len(tarea) for tarea in pixarea])
+        if len(pixarea) == 0:
+            return (offsets,numpy.zeros(0),numpy.zeros((0,)+numpy.shape(dist)))
+        return (offsets,numpy.concatenate(pixarea),
+                numpy.concatenate(extinction))
+
+    def region_stats(self,lcen,bcen,dist,radius,
+                     stats=('mean','p50','p95'),bins=None):
+        """
+        NAME:
+           region_stats
+        PURPOSE:
+           return area-weighted statistics of the extinction within many small disks (e.g., the fields of a survey), reducing the pixels of the disks in chunks without keeping the extinction of all pixels
+        INPUT:
+           lcen, bcen - Galactic longitude and latitude of the centers of the disks (deg), can be arrays
+           dist - distance in kpc, scalar or array of distances at which all disks are evaluated
+           radius - radius of the disks (deg), can be array; (lcen,bcen,radius) are broadcast against each other
+           stats= (('mean','p50','p95')) statistics to return: 'mean', 'std', 'min', 'max', 'area' (area in sq rad of the pixels with extinction), 'hist' (area in sq rad in each of the bins), or 'pXX' for the XXth percentile (e.g., 'p2.5'); percentiles are interpolated linearly within the bins of the histogram of the extinction, so they are accurate to the width of the bins (except for 'p0' and 'p100', which are the extrema)
+           bins= (None: numpy.linspace(0.,10.,2001)) edges of the bins of the histogram of the extinction
+        OUTPUT:
+           dictionary with an array (ndisk,)+dist.shape for each statistic (with a trailing axis of bins for 'hist'); pixels without extinction (e.g., outside of the map's coverage) are ignored and the statistics are NaN for disks without any such pixels
+        HISTORY:
+           2026-10-18 - Written
+        """
+        lcen,bcen,radius= _disk_fields(lcen,bcen,radius)
+        if bins is None:
+            bins= numpy.linspace(0.,10.,2001)
+        acc= _RegionStats(len(lcen),numpy.shape(dist),bins)
+        for field,pixarea,extinction in self._region_pixels(lcen,bcen,dist,
+                                                            radius):
+            acc.add(field,pixarea,extinction)
+        return acc.result(stats)
+
+    def _region_pixels(self,lcen,bcen,dist,radius):
+        """Generate the pixels of the disks (1D arrays) in chunks of (field,pixarea,extinction) for region_stats; maps without a more fine-grained implementation evaluate dust_vals_disks for chunks of disks"""
+        for start in range(0,len(lcen),_REGION_DISKS):
+            offsets,pixarea,extinction= self.dust_vals_disks(\
+                lcen[start:start+_REGION_DISKS],
+                bcen[start:start+_REGION_DISKS],dist,
+                radius[start:start+_REGION_DISKS])
+            yield (start+numpy.repeat(numpy.arange(len(offsets)-1),
+                                      numpy.diff(offsets)),
+                   pixarea,extinction)
+
+    def to_healpix(self,nside,distances,nest=True,filename=None,
+                   dtype='float64'):
+        """
+        NAME:
+           to_healpix
+        PURPOSE:
+           export the map at a set of distances as full-sky HEALPix maps
+        INPUT:
+           nside - nside of the HEALPix maps
+           distances - distance(s) in kpc
+           nest= (True) if True, use the NESTED ordering, otherwise the RING ordering (which requires healpy)
+           filename= (None) if given, write the maps to a memory-mapped .npy file with this name (for maps that do not fit in memory), otherwise return an array in memory
+           dtype= ('float64') data type of the output
+        OUTPUT:
+           array (ndist,npix) of the extinction at the centers of the pixels (NaN outside of the map's coverage)
+        HISTORY:
+           2026-10-18 - Written
+        """
+        distances= numpy.atleast_1d(numpy.asarray(distances,dtype='float64'))
+        out= _healpix_output(nside,len(distances),filename,dtype)
+        for start in range(0,out.shape[1],_EXPORT_CHUNK):
+            pix= numpy.arange(start,min(start+_EXPORT_CHUNK,out.shape[1]))
+            theta,phi= pix2ang(nside,pix,nest=True)
+            out[:,_healpix_order(nside,pix,nest)]=\
+                self(phi/_DEGTORAD,90.-theta/_DEGTORAD,distances,grid=True).T
+        if isinstance(out,numpy.memmap): out.flush()
+        return out
+
+    def distance_at_extinction(self,l,b,A,distances=None):
+        """
+        NAME:
+           distance_at_extinction
+        PURPOSE:
+           return the distance at which the extinction along a sightline first reaches a given value
+        INPUT:
+           l,b - Galactic longitude and latitude (deg)
+           A - extinction in the map's filter (E(B-V) if the map has no filter); (l,b,A) are broadcast against each other
+           distances= (numpy.linspace(0.,20.,401)) increasing distances (kpc) at which the map is evaluated along each sightline; maps that are given as extinction curves along sightlines (HierarchicalHealpixMap, Marshall06, Sale14) use the distances of their curves instead
+        OUTPUT:
+           distance in kpc, with the broadcast shape of (l,b,A): the extinction curve (linearly interpolated between the distances) is inverted at its first crossing of A, such that decreasing (non-monotonic) segments after the curve has first reached A are ignored; the first distance if the extinction there already reaches A; infinity if the extinction saturates below A within the last distance; NaN outside of the map's coverage
+        HISTORY:
+           2026-10-18 - Written
+        """
+        if distances is None:
+            distances= numpy.linspace(0.,20.,401)
+        distances= numpy.asarray(distances,dtype='float64')
+        l,b,A,shape= _invert_args(l,b,A)
+        out= numpy.full(len(A),numpy.nan)
+        for start in range(0,len(A),_INVERT_CHUNK):
+            end= start+_INVERT_CHUNK
+            out[start:end]= _first_crossing(distances,
+                                            self(l[start:end],b[start:end],
+                                                 distances,grid=True),
+                                            A[start:end])[0]
+        return out.reshape(shape)
+
+    def __getstate__(self):
+        """
+        NAME:
+           __getstate__
+        PURPOSE:
+           return the state of the map for pickling, with memory-mapped arrays replaced by references to their files, such that they are memory-mapped again rather than copied when unpickled
+        INPUT:
+        OUTPUT:
+           state
+        HISTORY:
+           2026-10-18 - Written
+        """
+        return share_arrays(self.__dict__)
+
+    def __setstate__(self,state):
+        """
+        NAME:
+           __setstate__
+        PURPOSE:
+           restore the state of the map from __getstate__
+        INPUT:
+           state - state from __getstate__
+        OUTPUT:
+        HISTORY:
+           2026-10-18 - Written
+        """
+        self.__dict__.update(unshare_arrays(state))
 
     def plot(self,l,b,*args,**kwargs):
         """
@@ -97,3 +372,194 @@ class DustMap3D(object):
     @classmethod
     def download(cls, test=False):
         pass
+
+def _grid_lb(l,b,d):
+    """Reshape (l,b) such that they broadcast against d to give the shape (l,b).shape+d.shape"""
+    l,b= numpy.broadcast_arrays(l,b)
+    shape= l.shape+(1,)*numpy.ndim(d)
+    return (l.reshape(shape),b.reshape(shape))
+
+def _disk_fields(lcen,bcen,radius):
+    """Broadcast the centers and radii of disks against each other to 1D arrays"""
+    lcen,bcen,radius= numpy.broadcast_arrays(\
+        numpy.atleast_1d(numpy.asarray(lcen,dtype='float64')),
+        numpy.atleast_1d(numpy.asarray(bcen,dtype='float64')),
+        numpy.atleast_1d(numpy.asarray(radius,dtype='float64')))
+    return (lcen.ravel(),bcen.ravel(),radius.ravel())
+
+def _query_discs(nside,lcen,bcen,radius,nest=True):
+    """Pixels at nside whose centers are within the disks (lcen,bcen,radius) (deg; 1D arrays), returned as (field,pix) arrays with the pixels of each disk in increasing order"""
+    offsets,pix= query_disc(nside,ang2vec((90.-bcen)*_DEGTORAD,lcen*_DEGTORAD),
+                            radius*_DEGTORAD,inclusive=False,nest=nest)
+    return (numpy.repeat(numpy.arange(len(lcen)),numpy.diff(offsets)),pix)
+
+def _disk_offsets(field,nfield):
+    """Offsets of the pixels of each disk in arrays sorted by field"""
+    return numpy.concatenate(([0],numpy.cumsum(numpy.bincount(field,
+                                                              minlength=nfield))))
+
+def _invert_args(l,b,A):
+    """Broadcast (l,b,A) against each other to 1D arrays, returning these and their broadcast shape"""
+    l,b,A= numpy.broadcast_arrays(numpy.asarray(l,dtype='float64'),
+                                  numpy.asarray(b,dtype='float64'),
+                                  numpy.asarray(A,dtype='float64'))
+    return (l.ravel(),b.ravel(),A.ravel(),l.shape)
+
+def _first_crossing(xs,curves,A):
+    """Invert the piecewise-linear curves (N,nx) with increasing nodes xs ((nx,) or (N,nx)) at their first crossing of A (N,): the running maximum of each curve gives the first node jj at which the curve reaches A, and the crossing is interpolated between nodes jj-1 and jj; returns (x,jj), with x= xs[0] if the curve reaches A at the first node, infinity if the curve never reaches A, and NaN for NaN A or curves that are NaN everywhere"""
+    xs= numpy.broadcast_to(xs,curves.shape)
+    runmax= numpy.fmax.accumulate(curves,axis=1)
+    reached= runmax >= A[:,None]
+    jj= numpy.argmax(reached,axis=1)
+    rows= numpy.arange(len(A))
+    lo= curves[rows,numpy.maximum(jj-1,0)]
+    hi= curves[rows,jj]
+    x_lo= xs[rows,numpy.maximum(jj-1,0)]
+    x_hi= xs[rows,jj]
+    with numpy.errstate(divide='ignore',invalid='ignore'):
+        x= x_lo+(A-lo)/(hi-lo)*(x_hi-x_lo)
+    # Curves that are NaN just before the crossing cross at the node
+    x= numpy.where(numpy.isnan(lo),x_hi,x)
+    x= numpy.where(jj == 0,xs[:,0],x)
+    x= numpy.where(numpy.any(reached,axis=1),x,numpy.inf)
+    x[numpy.isnan(A)+numpy.all(numpy.isnan(curves),axis=1)]= numpy.nan
+    return (x,jj)
+
+def _healpix_output(nside,ndist,filename,dtype):
+    """Allocate the (ndist,npix) output of to_healpix, in memory or as a memory-mapped .npy file"""
+    shape= (ndist,12*int(nside)**2)
+    if filename is None:
+        return numpy.empty(shape,dtype=dtype)
+    return numpy.lib.format.open_memmap(filename,mode='w+',dtype=dtype,
+                                        shape=shape)
+
+def _healpix_order(nside,pix,nest):
+    """Convert NESTED pixel numbers to the output ordering of to_healpix"""
+    if nest:
+        return pix
+    try:
+        import healpy
+    except ImportError:
+        raise ModuleNotFoundError("The RING ordering requires healpy to be installed")
+    return healpy.nest2ring(nside,pix)
+
+class _RegionStats(object):
+    """Area-weighted sums, extrema, and histogram of the extinction of the pixels of ndisk disks at distances with shape dshape, accumulated over chunks of pixels"""
+    def __init__(self,ndisk,dshape,bins):
+        self._shape= (ndisk,)+tuple(dshape)
+        self._bins= numpy.asarray(bins,dtype='float64')
+        ncell= int(numpy.prod(self._shape))
+        self._area= numpy.zeros(ncell)
+        self._sum= numpy.zeros(ncell)
+        self._sum2= numpy.zeros(ncell)
+        self._min= numpy.full(ncell,numpy.inf)
+        self._max= numpy.full(ncell,-numpy.inf)
+        # Histogram with an underflow and an overflow bin
+        self._hist= numpy.zeros(ncell*(len(self._bins)+1))
+
+    def add(self,field,pixarea,extinction):
+        """Add the pixels (field,pixarea,extinction) (extinction with shape (npix,)+dshape)"""
+        nd= int(numpy.prod(self._shape[1:]))
+        extinction= numpy.reshape(extinction,(len(field),nd))
+        cell= (field[:,None]*nd+numpy.arange(nd)).ravel()
+        weight= numpy.repeat(pixarea,nd)
+        extinction= extinction.ravel()
+        good= ~numpy.isnan(extinction)
+        cell, weight, extinction= cell[good], weight[good], extinction[good]
+        ncell= len(self._area)
+        self._area+= numpy.bincount(cell,weights=weight,minlength=ncell)
+        self._sum+= numpy.bincount(cell,weights=weight*extinction,
+                                   minlength=ncell)
+        self._sum2+= numpy.bincount(cell,weights=weight*extinction**2.,
+                                    minlength=ncell)
+        numpy.minimum.at(self._min,cell,extinction)
+        numpy.maximum.at(self._max,cell,extinction)
+        nbin= len(self._bins)+1
+        self._hist+= numpy.bincount(\
+            cell*nbin+numpy.searchsorted(self._bins,extinction,side='right'),
+            weights=weight,minlength=len(self._hist))
+
+    def result(self,stats):
+        """Return a dictionary with the statistics stats"""
+        with numpy.errstate(invalid='ignore',divide='ignore'):
+            empty= self._area == 0.
+            mean= self._sum/self._area
+            out= {}
+            for stat in stats:
+                if stat == 'mean':
+                    val= mean
+                elif stat == 'std':
+                    val= numpy.sqrt(numpy.clip(self._sum2/self._area-mean**2.,
+                                               0.,None))
+                elif stat == 'min':
+                    val= numpy.where(empty,numpy.nan,self._min)
+                elif stat == 'max':
+                    val= numpy.where(empty,numpy.nan,self._max)
+                elif stat == 'area':
+                    val= self._area
+                elif stat == 'hist':
+                    out[stat]= self._hist.reshape((-1,len(self._bins)+1))\
+                        [:,1:-1].reshape(self._shape+(len(self._bins)-1,))
+                    continue
+                elif stat.startswith('p'):
+                    try:
+                        q= float(stat[1:])/100.
+                    except ValueError:
+                        raise ValueError(f"Unknown statistic {stat}")
+                    val= self._quantile(q)
+                else:
+                    raise ValueError(f"Unknown statistic {stat}")
+                out[stat]= val.reshape(self._shape)
+        return out
+
+    def _quantile(self,q):
+        """Quantile q of the histogram, interpolating linearly within the bins, whose edges are clipped to the extrema (such that the underflow and overflow bins extend to the minimum and maximum)"""
+        hist= self._hist.reshape((-1,len(self._bins)+1))
+        cumhist= numpy.cumsum(hist,axis=1)
+        target= q*self._area
+        jj= numpy.minimum(numpy.sum(cumhist < target[:,None],axis=1),
+                          hist.shape[1]-1)
+        edges= numpy.concatenate(([-numpy.inf],self._bins,[numpy.inf]))
+        lo= numpy.clip(edges[jj],self._min,self._max)
+        hi= numpy.clip(edges[jj+1],self._min,self._max)
+        below= numpy.take_along_axis(cumhist,jj[:,None],axis=1)[:,0]\
+            -hist[numpy.arange(len(jj)),jj]
+        binhist= hist[numpy.arange(len(jj)),jj]
+        # Empty bins (e.g., the underflow bin for q=0) give their lower edge
+        frac= numpy.where(binhist > 0.,
+                          numpy.clip((target-below)/binhist,0.,1.),0.)
+        out= lo+frac*(hi-lo)
+        if q <= 0.: out= self._min
+        elif q >= 1.: out= self._max
+        return numpy.where(self._area == 0.,numpy.nan,out)
+
+@contextlib.contextmanager
+def _shared_state(dustmap):
+    """Write the state of a map once to a temporary file for evaluate_parallel on processes, with all large arrays replaced by references to memory-mapped files, yielding (token,statefile) and removing the files afterwards"""
+    state= dustmap.__getstate__()
+    with tempfile.TemporaryDirectory(dir=_share_dir(state),
+                                     ignore_cleanup_errors=True) as tmpdir:
+        statefile= os.path.join(tmpdir,'state.pkl')
+        with open(statefile,'wb') as savefile:
+            pickle.dump((dustmap.__class__,share_arrays(state,tmpdir=tmpdir)),
+                        savefile)
+        yield (uuid.uuid4().hex,statefile)
+
+def _share_dir(state):
+    """Directory in which evaluate_parallel writes the arrays of the map's state that are not memory-mapped already: /dev/shm if it is writable and has room for them (a full /dev/shm kills the process with SIGBUS rather than raising an error), otherwise the default temporary directory"""
+    if os.access('/dev/shm',os.W_OK) and shutil.disk_usage('/dev/shm').free\
+            >= shared_nbytes(state)+_SHM_MARGIN:
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+def _evaluate_chunk(token,statefile,l,b,d,kwargs):
+    """Evaluate the map pickled to statefile by evaluate_parallel in a worker process, only loading the map once for each evaluate_parallel call"""
+    global _WORKER_MAP
+    if _WORKER_MAP[0] != token:
+        _WORKER_MAP= (None,None) # release the previous map first
+        with open(statefile,'rb') as savefile:
+            cls, state= pickle.load(savefile)
+        dustmap= cls.__new__(cls)
+        dustmap.__setstate__(state)
+        _WORKER_MAP= (token,dustmap)
+    return _WORKER_MAP[1](l,b,d,**kwargs)
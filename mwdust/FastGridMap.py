@@ -0,0 +1,213 @@
+###############################################################################
+#
+#   FastGridMap: extinction map resampled once onto a regular grid, either
+#                (HEALPix pixel, distance modulus) or Galactic (x,y,z), and
+#                evaluated by linear interpolation on the grid
+#
+###############################################################################
+import os, os.path
+import numpy
+import h5py
+from scipy.ndimage import map_coordinates
+from mwdust.util.extCurves import aebv
+from mwdust.util.healpix import ang2pix
+from mwdust.DustMap3D import DustMap3D
+_DEGTORAD= numpy.pi/180.
+_RESAMPLE_CHUNK= 2**18 # number of grid points per chunk when resampling
+class FastGridMap(DustMap3D):
+    """extinction map resampled once onto a regular grid, either (HEALPix pixel, distance modulus) or Galactic (x,y,z), and evaluated by linear interpolation on the grid"""
+    def __init__(self,filename,filter=None,sf10=True):
+        """
+        NAME:
+           __init__
+        PURPOSE:
+           Initialize a resampled dust map from the file written by FastGridMap.resample
+        INPUT:
+           filename - name of the HDF5 file with the resampled map
+           filter= filter to return the extinction in
+           sf10= (True) if True, use the Schlafly & Finkbeiner calibrations
+        OUTPUT:
+           object
+        HISTORY:
+           2026-10-18 - Written
+        """
+        DustMap3D.__init__(self,filter=filter)
+        self._sf10= sf10
+        self._filename= filename
+        with h5py.File(filename,'r') as gridfile:
+            self._grid= gridfile.attrs['grid']
+            self._ebv= gridfile['ebv'][:]
+            if self._grid == 'healpix':
+                self._nside= int(gridfile.attrs['nside'])
+                self._distmods= gridfile['distmod'][:]
+            else:
+                self._axes= [gridfile[axis][:] for axis in ['x','y','z']]
+            self.source= gridfile.attrs['source']
+            self.errors= dict((key,gridfile.attrs[key+'_error'])
+                              for key in ['max','rms'])
+            self.errors['npoints']= int(gridfile.attrs['npoints_error'])
+        return None
+
+    @classmethod
+    def resample(cls,dustmap,filename,grid='healpix',nside=256,
+                 distmods=None,x=None,y=None,z=None,dtype='float32',
+                 npoints_error=100000,filter=None,sf10=True):
+        """
+        NAME:
+           resample
+        PURPOSE:
+           resample a dust map once onto a regular grid, store the grid in a file, and report the error of the resampled map against the original map at random points within the grid
+        INPUT:
+           dustmap - DustMap3D instance
+           filename - name of the HDF5 file to write the resampled map to
+           grid= ('healpix') 'healpix' for a grid of HEALPix pixels (NESTED) and distance moduli (the map is exported with to_healpix, such that HEALPix maps with pixels finer than nside are averaged) or 'cartesian' for a grid in heliocentric Galactic (x,y,z) (x towards the Galactic center, z towards the north Galactic pole)
+           nside= (256) nside of the HEALPix grid
+           distmods= (numpy.linspace(4.,19.,61)) distance moduli of the HEALPix grid (increasing); the extinction is constant beyond the first and last distance modulus
+           x,y,z= (numpy.linspace(-5.,5.,201),numpy.linspace(-5.,5.,201),numpy.linspace(-1.,1.,81)) equally-spaced axes of the Cartesian grid in kpc; the extinction is NaN outside of the grid
+           dtype= ('float32') data type of the stored grid
+           npoints_error= (100000) number of random points at which the error of the resampled map is computed
+           filter=, sf10= keywords for the returned FastGridMap
+        OUTPUT:
+           FastGridMap instance, with the max and RMS absolute error of E(B-V) in the dictionary errors
+        HISTORY:
+           2026-10-18 - Written
+        """
+        # The grid holds E(B-V), converted back from the map's filter
+        fac= 1.
+        if not dustmap._filter is None:
+            fac= 1./aebv(dustmap._filter,sf10=getattr(dustmap,'_sf10',True))
+        axes= {}
+        if grid == 'healpix':
+            if distmods is None:
+                distmods= numpy.linspace(4.,19.,61)
+            axes['distmod']= numpy.asarray(distmods,dtype='float64')
+            ebv= (dustmap.to_healpix(nside,10.**(axes['distmod']/5.-2.),
+                                     dtype=dtype)*fac).T
+        elif grid == 'cartesian':
+            axes['x']= numpy.linspace(-5.,5.,201) if x is None else x
+            axes['y']= numpy.linspace(-5.,5.,201) if y is None else y
+            axes['z']= numpy.linspace(-1.,1.,81) if z is None else z
+            for axis in ['x','y','z']:
+                axes[axis]= numpy.asarray(axes[axis],dtype='float64')
+                step= numpy.diff(axes[axis])
+                if len(axes[axis]) < 2 or numpy.any(step <= 0.) \
+                        or not numpy.allclose(step,step[0]):
+                    raise ValueError(f"Axis {axis} of the Cartesian grid needs to be equally spaced and increasing")
+            shape= tuple(len(axes[axis]) for axis in ['x','y','z'])
+            ebv= numpy.empty(shape,dtype=dtype).ravel()
+            for start in range(0,len(ebv),_RESAMPLE_CHUNK):
+                indx= numpy.unravel_index(\
+                    numpy.arange(start,min(start+_RESAMPLE_CHUNK,len(ebv))),
+                    shape)
+                ebv[start:start+_RESAMPLE_CHUNK]= fac*dustmap(\
+                    *_xyz_to_lbd(axes['x'][indx[0]],axes['y'][indx[1]],
+                                 axes['z'][indx[2]]))
+            ebv= ebv.reshape(shape)
+        else:
+            raise ValueError("grid= must be 'healpix' or 'cartesian'")
+        # Write the grid atomically
+        tmpfilename= filename+'.tmp'
+        with h5py.File(tmpfilename,'w') as gridfile:
+            gridfile.attrs['grid']= grid
+            gridfile.attrs['source']= type(dustmap).__name__
+            if grid == 'healpix':
+                gridfile.attrs['nside']= nside
+            for axis,vals in axes.items():
+                gridfile.create_dataset(axis,data=vals)
+            gridfile.create_dataset('ebv',data=ebv)
+            for key in ['max','rms']:
+                gridfile.attrs[key+'_error']= numpy.nan
+            gridfile.attrs['npoints_error']= 0
+        os.replace(tmpfilename,filename)
+        out= cls(filename,filter=filter,sf10=sf10)
+        # Error at random points within the grid
+        if npoints_error > 0:
+            rng= numpy.random.default_rng()
+            if grid == 'healpix':
+                l= rng.uniform(0.,360.,size=npoints_error)
+                b= numpy.arcsin(rng.uniform(-1.,1.,size=npoints_error))\
+                    /_DEGTORAD
+                d= 10.**(rng.uniform(axes['distmod'][0],axes['distmod'][-1],
+                                     size=npoints_error)/5.-2.)
+            else:
+                l,b,d= _xyz_to_lbd(*[rng.uniform(axes[axis][0],axes[axis][-1],
+                                                 size=npoints_error)
+                                     for axis in ['x','y','z']])
+            diff= out._evaluate_ebv(l,b,d)-fac*dustmap(l,b,d)
+            diff= diff[numpy.isfinite(diff)]
+            if len(diff) > 0:
+                out.errors= {'max':numpy.amax(numpy.fabs(diff)),
+                             'rms':numpy.sqrt(numpy.mean(diff**2.)),
+                             'npoints':len(diff)}
+                with h5py.File(filename,'a') as gridfile:
+                    for key in ['max','rms','npoints']:
+                        gridfile.attrs[key+'_error']= out.errors[key]
+        return out
+
+    def _evaluate(self,l,b,d):
+        """
+        NAME:
+           _evaluate
+        PURPOSE:
+           evaluate the dust-map
+        INPUT:
+           l- Galactic longitude (deg) can be array
+           b- Galactic latitude (deg) can be array
+           d- distance (kpc) can be array; (l,b,d) are broadcast against each other
+        OUTPUT:
+           extinction (NaN outside of a Cartesian grid)
+        HISTORY:
+           2026-10-18 - Written
+        """
+        out= self._evaluate_ebv(l,b,d)
+        if not self._filter is None:
+            out*= aebv(self._filter,sf10=self._sf10)
+        return out
+
+    def _evaluate_ebv(self,l,b,d):
+        """Linear interpolation of the grid at (l,b,d), broadcast against each other"""
+        l,b,d= numpy.broadcast_arrays(numpy.atleast_1d(l),
+                                      numpy.atleast_1d(b),
+                                      numpy.atleast_1d(d))
+        shape= l.shape
+        l,b,d= l.ravel(), b.ravel(), d.ravel()
+        if self._grid == 'healpix':
+            pix= ang2pix(self._nside,(90.-b)*_DEGTORAD,l*_DEGTORAD,nest=True)
+            # Linear interpolation in distance modulus (the pixel is exact),
+            # constant beyond the grid
+            jj= numpy.interp(5.*numpy.log10(d)+10.,self._distmods,
+                             numpy.arange(len(self._distmods)))
+            j0= numpy.clip(numpy.floor(jj).astype('int64'),0,
+                           len(self._distmods)-2)
+            fac= jj-j0
+            out= self._ebv[pix,j0]*(1.-fac)+self._ebv[pix,j0+1]*fac
+        else:
+            X,Y,Z= _lbd_to_xyz(l,b,d)
+            coords= [(X-self._axes[0][0])/(self._axes[0][1]-self._axes[0][0]),
+                     (Y-self._axes[1][0])/(self._axes[1][1]-self._axes[1][0]),
+                     (Z-self._axes[2][0])/(self._axes[2][1]-self._axes[2][0])]
+            # NaN outside of the grid, up to round-off at its edges
+            outside= numpy.zeros(len(l),dtype='bool')
+            for ii in range(3):
+                outside|= (coords[ii] < -1e-6)\
+                    +(coords[ii] > len(self._axes[ii])-1.+1e-6)
+                coords[ii]= numpy.clip(coords[ii],0.,len(self._axes[ii])-1.)
+            out= map_coordinates(self._ebv,coords,order=1,mode='nearest',
+                                 prefilter=False,output='float64')
+            out[outside]= numpy.nan
+        return out.reshape(shape)
+
+def _lbd_to_xyz(l,b,d):
+    """Heliocentric Galactic (x,y,z) in kpc of (l,b,d)"""
+    return (d*numpy.cos(b*_DEGTORAD)*numpy.cos(l*_DEGTORAD),
+            d*numpy.cos(b*_DEGTORAD)*numpy.sin(l*_DEGTORAD),
+            d*numpy.sin(b*_DEGTORAD))
+
+def _xyz_to_lbd(x,y,z):
+    """(l,b,d) of heliocentric Galactic (x,y,z) in kpc; points at the Sun are moved to a distance of 1 pc towards the north Galactic pole"""
+    d= numpy.sqrt(x**2.+y**2.+z**2.)
+    atsun= d < 1e-3
+    z= numpy.where(atsun,1e-3,z)
+    d= numpy.where(atsun,1e-3,d)
+    return (numpy.arctan2(y,x)/_DEGTORAD % 360.,
+            numpy.arcsin(numpy.clip(z/d,-1.,1.))/_DEGTORAD,d)
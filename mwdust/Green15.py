@@ -5,7 +5,7 @@
 ###############################################################################
 import os, os.path
 import numpy
-import h5py
+from mwdust.util.sidecar import read_dataset
 from mwdust.util.download import dust_dir, downloader
 from mwdust.HierarchicalHealpixMap import HierarchicalHealpixMap
 _DEGTORAD= numpy.pi/180.
@@ -13,7 +13,7 @@ _greendir= os.path.join(dust_dir, 'green15')
 class Green15(HierarchicalHealpixMap):
     """extinction model from Green et al. (2015)"""
     def __init__(self,filter=None,sf10=True,load_samples=False,
-                 interpk=1):
+                 interpk=1,precompute=False,mmap=False,cache=None):
         """
         NAME:
            __init__
@@ -22,8 +22,11 @@ class Green15(HierarchicalHealpixMap):
         INPUT:
            filter= filter to return the extinction in
            sf10= (True) if True, use the Schlafly & Finkbeiner calibrations
-           load_samples= (False) if True, also load the samples
+           load_samples= (False) if True, also load the samples (for substitute_sample)
            interpk= (1) interpolation order
+           precompute= (False) if True, precompute the interpolation coefficients for interpk > 1 ('disk': also store them in a file)
+           mmap= (False) if True, memory-map the map's arrays rather than reading them into memory
+           cache= (None) LRUCache of the splines for interpk > 1 (default: mwdust.util.cache.shared_cache())
         OUTPUT:
            object
         HISTORY:
@@ -31,13 +34,13 @@ class Green15(HierarchicalHealpixMap):
         """
         HierarchicalHealpixMap.__init__(self,filter=filter,sf10=sf10)
         #Read the map
-        with h5py.File(os.path.join(_greendir,'dust-map-3d.h5'),'r') \
-                as greendata:
-            self._pix_info= greendata['/pixel_info'][:]
-            if load_samples:
-                self._samples= greendata['/samples'][:]
-            self._best_fit= greendata['/best_fit'][:]
-            self._GR= greendata['/GRDiagnostic'][:]
+        mapfile= os.path.join(_greendir,'dust-map-3d.h5')
+        self._pix_info= read_dataset(mapfile,'/pixel_info',mmap=mmap)
+        if load_samples:
+            self._setup_samples(mapfile)
+        self._best_fit= read_dataset(mapfile,'/best_fit',mmap=mmap)
+        self._samplesfile= mapfile # for evaluate_samples and the quantiles
+        self._GR= read_dataset(mapfile,'/GRDiagnostic',mmap=mmap)
         # Utilities
         self._distmods= numpy.linspace(4.,19.,31)
         self._minnside= numpy.amin(self._pix_info['nside'])
@@ -46,9 +49,10 @@ class Green15(HierarchicalHealpixMap):
         self._nsides= [self._maxnside//2**ii for ii in range(nlevels)]
         self._indexArray= numpy.arange(len(self._pix_info['healpix_index']))
         # For the interpolation
-        self._intps= numpy.zeros(len(self._pix_info['healpix_index']),
-                                 dtype='object') #array to cache interpolated extinctions
+        self._setup_splines(cache)
         self._interpk= interpk
+        self._setup_ppoly(precompute,mapfile)
+        self._setup_lookup(mapfile)
         return None
 
     def substitute_sample(self,samplenum):
@@ -65,10 +69,11 @@ class Green15(HierarchicalHealpixMap):
            2015-03-08 - Written - Bovy (IAS)
         """
         # Substitute the sample
-        self._best_fit= self._samples[:,samplenum,:]
+        self._best_fit= (self._samples if self._samples_dset is None
+                         else self._samples_dset)[:,samplenum,:]
         # Reset the cache
-        self._intps= numpy.zeros(len(self._pix_info['healpix_index']),
-                                 dtype='object') #array to cache interpolated extinctions
+        self._setup_splines(self._intps)
+        self._setup_ppoly(self._ppoly_coefs is not None)
         return None
 
     @classmethod
@@ -5,12 +5,27 @@
 #                           et al. 2015)
 #
 ###############################################################################
+import os
+import glob
+import uuid
 import numpy
+import h5py
 from scipy import interpolate
 from mwdust.util.healpix import ang2pix
 from mwdust.util.extCurves import aebv
-from mwdust.DustMap3D import DustMap3D
+from mwdust.util.cache import shared_cache
+from mwdust.util.sidecar import sidecar_filename, load_sidecar, \
+    open_sidecar, close_sidecar, rechunk_samples, find_rechunked_samples
+from mwdust.DustMap3D import DustMap3D, _grid_lb, _disk_fields, \
+    _query_discs, _disk_offsets, _REGION_DISKS, _EXPORT_CHUNK, \
+    _healpix_output, _healpix_order, _INVERT_CHUNK, _invert_args, \
+    _first_crossing
 _DEGTORAD= numpy.pi/180.
+_PPOLY_CHUNK= 2**16 # number of pixels per chunk when precomputing coefficients
+_DENSE_LOOKUP_MAXNSIDE= 2048 # largest nside for a dense pixel lookup table
+_SAMPLES_CHUNK= 2**16 # number of stars per chunk when evaluating samples
+_REGION_CHUNK= 2**16 # number of pixels per chunk in region_stats
+_BISECT_ITER= 40 # number of bisections to refine spline crossings
 class HierarchicalHealpixMap(DustMap3D):
     """General class for extinction maps given as a hierarchical HEALPix 
     pixelation (e.g., Green et al. 2015) """
@@ -30,10 +45,17 @@ class HierarchicalHealpixMap(DustMap3D):
         """
         super(HierarchicalHealpixMap, self).__init__(filter=filter, **download_kwargs)
         self._sf10 = sf10
+        self._ppoly_coefs= None
+        self._lookup= None
+        self._lookup_levels= None
+        self._samplesfile= None
+        self._samples= None
+        self._samples_dset= None
+        self._quantile_cubes= {}
         return None
 
 
-    def _evaluate(self, ls, bs, ds):
+    def _evaluate(self, ls, bs, ds, quantiles=None):
         """
         NAME:
            _evaluate
@@ -42,40 +64,376 @@ class HierarchicalHealpixMap(DustMap3D):
         INPUT:
            l- Galactic longitude (deg) can be array
            b- Galactic latitude (deg) can be array
-           d- distance (kpc) can be array
+           d- distance (kpc) can be array; (l,b,d) are broadcast against each other
+           quantiles= (None) if given, sequence of quantiles (e.g., [0.16,0.5,0.84]) of the posterior samples to return, interpolated from the quantiles at the map's distances that are computed once by precompute_quantiles (which approximates the quantiles of the interpolated samples returned by evaluate_samples)
         OUTPUT:
-           extinction E(B-V)
+           extinction E(B-V) (with a trailing axis of quantiles if quantiles is given)
         HISTORY:
            2015-03-02 - Started - Bovy (IAS)
            2023-07-05 - Vectorized - Henry Leung (UofT)
+           2026-10-18 - Broadcasting
         """
-        ls = numpy.atleast_1d(ls)
-        bs = numpy.atleast_1d(bs)
+        ls, bs = numpy.broadcast_arrays(numpy.atleast_1d(ls), numpy.atleast_1d(bs))
         ds = numpy.atleast_1d(ds)
 
+        # Look up the pixels once per sightline, then broadcast to distances
         distmod= 5.*numpy.log10(ds)+10.
-        lbIndx= self._lbIndx(ls, bs)
-        if len(ls) == 1 and len(ds) > 1:
-            lbIndx = numpy.tile(lbIndx, len(ds))
-
-        result = numpy.zeros_like(ds)
-        for counter, i, d in zip(numpy.arange(len(result)), lbIndx, distmod):
-            if self._intps[i] != 0:
-                out= self._intps[i](d)
-            else:
-                interpData=\
-                    interpolate.InterpolatedUnivariateSpline(self._distmods,
-                                                            self._best_fit[i],
-                                                            k=self._interpk)
-                out= interpData(d)
-                self._intps[i]= interpData
-            result[counter] = out
+        lbIndx= self._lbIndx(ls.ravel(), bs.ravel()).reshape(ls.shape)
+        lbIndx, distmod= numpy.broadcast_arrays(lbIndx, distmod)
+        shape= lbIndx.shape
+        lbIndx= lbIndx.ravel()
+        distmod= distmod.ravel()
+
+        if quantiles is not None:
+            cube, indx= self._load_quantiles(quantiles)
+            result= self._evaluate_rows(cube, lbIndx, distmod, samples=indx)
+            return result.reshape(shape+result.shape[1:])
+        result= self._interp_rows(lbIndx, distmod)
         if self._filter is not None:
             result =  result * aebv(self._filter,sf10=self._sf10)
         # set nan for invalid indices
         result[lbIndx==-1] = numpy.nan
+        return result.reshape(shape)
+
+    def coverage(self, l, b):
+        """
+        NAME:
+           coverage
+        PURPOSE:
+           return whether sightlines are covered by the map
+        INPUT:
+           l,b - Galactic longitude and latitude (deg), broadcast against each other
+        OUTPUT:
+           boolean array with the broadcast shape of (l,b)
+        HISTORY:
+           2026-10-18 - Written
+        """
+        l, b= numpy.broadcast_arrays(numpy.asarray(l, dtype='float64'),
+                                     numpy.asarray(b, dtype='float64'))
+        return self._lbIndx(l.ravel(), b.ravel()).reshape(l.shape) != -1
+
+    def _interp_rows(self, lbIndx, distmod):
+        """Interpolate the _best_fit rows lbIndx at distmod (1D arrays) with the map's interpolation"""
+        if self._interpk == 1:
+            return self._interp_linear(lbIndx, distmod)
+        elif self._ppoly_coefs is not None:
+            return self._interp_ppoly(lbIndx, distmod)
+        return self._interp_spline(lbIndx, distmod)
+
+    def _interp_linear(self, lbIndx, distmod, best_fit=None):
+        """Piecewise-linear interpolation of the _best_fit rows lbIndx at distmod, vectorized over all stars; equivalent to a k=1 InterpolatedUnivariateSpline (including linear extrapolation beyond the grid); best_fit= can be an array (nrow,ndistmod,...) to interpolate instead of _best_fit"""
+        if best_fit is None:
+            best_fit= self._best_fit
+        jj= numpy.searchsorted(self._distmods, distmod, side='right')-1
+        jj= numpy.clip(jj, 0, len(self._distmods)-2)
+        dm_lo= self._distmods[jj]
+        dm_hi= self._distmods[jj+1]
+        # Same operations as FITPACK's B-spline evaluation for k=1
+        fac= 1./(dm_hi-dm_lo)
+        extra= (1,)*(best_fit.ndim-2)
+        return best_fit[lbIndx, jj]\
+            *(fac*(dm_hi-distmod)).reshape(distmod.shape+extra)\
+            +best_fit[lbIndx, jj+1]\
+            *(fac*(distmod-dm_lo)).reshape(distmod.shape+extra)
+
+    def _interp_ppoly(self, lbIndx, distmod, coefs=None, breaks=None):
+        """Evaluate the precomputed piecewise-polynomial coefficients of the rows lbIndx at distmod, vectorized over all stars; coefs= and breaks= can be an array (nrow,nbreak-1,k+1,...) and its breaks to evaluate instead of _ppoly_coefs"""
+        if coefs is None:
+            coefs, breaks= self._ppoly_coefs, self._ppoly_breaks
+        jj= numpy.searchsorted(breaks, distmod, side='right')-1
+        jj= numpy.clip(jj, 0, len(breaks)-2)
+        dx= (distmod-breaks[jj]).reshape(distmod.shape+(1,)*(coefs.ndim-3))
+        coefs= coefs[lbIndx, jj]
+        result= coefs[:,0].copy()
+        for pp in range(1, coefs.shape[1]):
+            result= result*dx+coefs[:,pp]
         return result
 
+    def _setup_ppoly(self, precompute, filename=None):
+        """Precompute the piecewise-polynomial coefficients of all pixels for interpk > 1 if precompute; if precompute == 'disk', store them in (or load them from) a .npy file next to the map's file filename"""
+        self._ppoly_coefs= None
+        if not precompute or self._interpk == 1:
+            return None
+        breaks, transform= _ppoly_transform(self._distmods, self._interpk)
+        shape= (len(self._best_fit), len(breaks)-1, self._interpk+1)
+        cachefile= None
+        if precompute == 'disk' and filename is not None:
+            cachefile= sidecar_filename(filename, 'ppolyk%i' % self._interpk)
+            coefs= load_sidecar(cachefile, filename=filename, shape=shape)
+            if coefs is not None:
+                self._ppoly_breaks= breaks
+                self._ppoly_coefs= coefs
+                return None
+        if cachefile is None:
+            coefs= numpy.empty(shape, dtype='float64')
+        else:
+            coefs= open_sidecar(cachefile, 'float64', shape)
+        for start in range(0, shape[0], _PPOLY_CHUNK):
+            end= min(start+_PPOLY_CHUNK, shape[0])
+            coefs[start:end]= numpy.dot(\
+                numpy.asarray(self._best_fit[start:end], dtype='float64'),
+                transform).reshape((end-start,)+shape[1:])
+        if cachefile is not None:
+            coefs= close_sidecar(coefs, cachefile)
+        self._ppoly_breaks= breaks
+        self._ppoly_coefs= coefs
+        return None
+
+    def _interp_spline(self, lbIndx, distmod):
+        """Spline interpolation of order _interpk of the _best_fit rows lbIndx at distmod, caching the per-pixel splines in the LRUCache _intps; each spline is evaluated once for all of its stars (NaN for lbIndx == -1)"""
+        result= numpy.full(len(distmod), numpy.nan)
+        sortIndx= numpy.argsort(lbIndx, kind='stable')
+        rows, starts= numpy.unique(lbIndx[sortIndx], return_index=True)
+        for i, indx in zip(rows, numpy.split(sortIndx, starts[1:])):
+            if i == -1: continue
+            interpData= self._intps.get((self._intps_owner, i))
+            if interpData is None:
+                interpData=\
+                    interpolate.InterpolatedUnivariateSpline(self._distmods,
+                                                            self._best_fit[i],
+                                                            k=self._interpk)
+                self._intps.put((self._intps_owner, i), interpData)
+            result[indx]= interpData(distmod[indx])
+        return result
+
+    def _setup_splines(self, cache=None):
+        """Set up the cache of the per-pixel splines for interpk > 1 without precomputed coefficients (cache= an LRUCache, by default the cache shared by all maps), removing the splines of this map that are already cached (e.g., after substitute_sample)"""
+        if getattr(self, '_intps', None) is not None:
+            self._intps.clear(owner=self._intps_owner)
+        self._intps= shared_cache() if cache is None else cache
+        self._intps_owner= uuid.uuid4().hex
+        return None
+
+
+    def evaluate_samples(self,l,b,d,samples=None,percentiles=None,grid=False):
+        """
+        NAME:
+           evaluate_samples
+        PURPOSE:
+           evaluate the dust map for all (or a subset of the) posterior samples of the map in a single pass, reading only the samples of the pixels that contain the stars
+        INPUT:
+           l- Galactic longitude (deg)
+           b- Galactic latitude (deg)
+           d- distance (kpc); (l,b,d) are broadcast against each other
+           samples= (None) samples to evaluate: None for all samples, a slice, or a sequence of indices
+           percentiles= (None) if given, sequence of percentiles (e.g., [16.,50.,84.]) of the samples to return for each star rather than the samples, computed in chunks of stars to limit memory use
+           grid= (False) if True, evaluate the map at all distances d for all sightlines (l,b) (see __call__)
+        OUTPUT:
+           extinction of each sample, with shape (broadcast shape of (l,b,d),nsample) (or (broadcast shape of (l,b,d),npercentile) if percentiles is given)
+        HISTORY:
+           2026-10-18 - Written
+        """
+        d= numpy.atleast_1d(d)
+        if grid:
+            l,b= _grid_lb(l,b,d)
+        ls, bs= numpy.broadcast_arrays(numpy.atleast_1d(l), numpy.atleast_1d(b))
+        lbIndx= self._lbIndx(ls.ravel(), bs.ravel()).reshape(ls.shape)
+        distmod= 5.*numpy.log10(d)+10.
+        lbIndx, distmod= numpy.broadcast_arrays(lbIndx, distmod)
+        shape= lbIndx.shape
+        lbIndx= lbIndx.ravel()
+        distmod= distmod.ravel()
+        source, h5file= self._open_samples()
+        try:
+            out= self._evaluate_rows(source, lbIndx, distmod, samples=samples,
+                                     percentiles=percentiles)
+        finally:
+            if h5file is not None:
+                h5file.close()
+        return out.reshape(shape+out.shape[1:])
+
+    def _setup_samples(self, filename, load=True):
+        """Set up the samples in filename for substitute_sample: open the re-chunked samples with the 'sample' layout if they exist (see rechunk_samples), otherwise load the samples into memory if load or open them"""
+        samplesfile= find_rechunked_samples(filename, 'sample')
+        if samplesfile is None and load:
+            with h5py.File(filename, 'r') as h5file:
+                self._samples= h5file['/samples'][:]
+            return None
+        self._samples_dsetfile= filename if samplesfile is None \
+            else samplesfile
+        self._samples_dset= h5py.File(self._samples_dsetfile, 'r')['/samples']
+        return None
+
+    def _open_samples(self):
+        """Return the samples (array or HDF5 dataset with shape (npix,nsample,ndistmod)) for reading the samples of sets of pixels, preferring the samples in memory, the re-chunked samples with the 'pixel' layout, and the original samples, in that order, and the HDF5 file that was opened to read them (None if no file was opened)"""
+        if self._samples is not None:
+            return (self._samples, None)
+        samplesfile= None if self._samplesfile is None \
+            else find_rechunked_samples(self._samplesfile, 'pixel')
+        if samplesfile is None and self._samplesfile is not None \
+                and os.path.exists(self._samplesfile):
+            samplesfile= self._samplesfile
+        if samplesfile is not None:
+            h5file= h5py.File(samplesfile, 'r')
+            return (h5file['/samples'], h5file)
+        elif self._samples_dset is not None:
+            return (self._samples_dset, None)
+        raise RuntimeError("This map does not have samples; set up the map with load_samples=True (which downloads the samples if necessary)")
+
+    def _evaluate_rows(self, source, lbIndx, distmod, samples=None,
+                       percentiles=None):
+        """Interpolate the rows lbIndx of source (array or HDF5 dataset with shape (npix,nsample,ndistmod)) at distmod for all samples, in chunks of stars and reading only the rows that are used; returns (nstar,nsample) or (nstar,npercentile)"""
+        if self._interpk > 1:
+            breaks, transform= _ppoly_transform(self._distmods, self._interpk)
+        filter_fac= aebv(self._filter,sf10=self._sf10) \
+            if not self._filter is None else 1.
+        out= []
+        for start in range(0, len(lbIndx), _SAMPLES_CHUNK):
+            cIndx= lbIndx[start:start+_SAMPLES_CHUNK]
+            cdistmod= distmod[start:start+_SAMPLES_CHUNK]
+            # Only read the samples of the pixels that are used
+            rows, cIndx= numpy.unique(cIndx, return_inverse=True)
+            csamples= _read_sample_rows(source, rows[rows != -1], samples)
+            # Pixels outside of the map use the first row and are set to NaN
+            # below
+            if rows[0] == -1:
+                cIndx= numpy.maximum(cIndx-1, 0)
+            nrow, nsample, ndistmod= csamples.shape
+            if nrow == 0:
+                result= numpy.full((len(cIndx),nsample), numpy.nan)
+            elif self._interpk == 1:
+                result= self._interp_linear(\
+                    cIndx, cdistmod, best_fit=numpy.swapaxes(csamples, 1, 2))
+            else:
+                coefs= numpy.dot(\
+                    numpy.asarray(csamples.reshape((nrow*nsample,ndistmod)),
+                                  dtype='float64'), transform)
+                coefs= numpy.moveaxis(\
+                    coefs.reshape((nrow,nsample,len(breaks)-1,
+                                   self._interpk+1)), 1, 3)
+                result= self._interp_ppoly(cIndx, cdistmod,
+                                           coefs=coefs, breaks=breaks)
+            if self._filter is not None:
+                result= result*filter_fac
+            result[lbIndx[start:start+_SAMPLES_CHUNK] == -1]= numpy.nan
+            if percentiles is not None:
+                result= numpy.percentile(result, percentiles, axis=1).T
+            out.append(result)
+        return numpy.concatenate(out)
+
+    def precompute_quantiles(self, quantiles=(0.16,0.5,0.84)):
+        """
+        NAME:
+           precompute_quantiles
+        PURPOSE:
+           reduce the posterior samples of the map to quantiles of the extinction at each distance of each pixel, streaming through the samples in chunks of pixels, and store these in a file next to the samples' file in DUST_DIR, for evaluation with quantiles= (this only needs to be done once)
+        INPUT:
+           quantiles= ((0.16,0.5,0.84)) quantiles to compute (between 0 and 1)
+        OUTPUT:
+           (none)
+        HISTORY:
+           2026-10-18 - Written
+        """
+        quantiles= tuple(float(q) for q in quantiles)
+        source, h5file= self._open_samples()
+        try:
+            shape= (source.shape[0],len(quantiles),source.shape[2])
+            cubefile= self._quantiles_filename(quantiles)
+            cube= open_sidecar(cubefile, 'float32', shape)
+            # Read the samples in whole HDF5 chunks if possible
+            nrows= _SAMPLES_CHUNK
+            if getattr(source, 'chunks', None) is not None:
+                nrows= max(source.chunks[0],
+                           nrows//source.chunks[0]*source.chunks[0])
+            for start in range(0, shape[0], nrows):
+                end= min(start+nrows, shape[0])
+                cube[start:end]= numpy.moveaxis(\
+                    numpy.quantile(source[start:end], quantiles, axis=1), 0, 1)
+            self._quantile_cubes[quantiles]= \
+                (close_sidecar(cube, cubefile),list(range(len(quantiles))))
+        finally:
+            if h5file is not None:
+                h5file.close()
+        return None
+
+    def rechunk_samples(self, layout='pixel', compression=None):
+        """
+        NAME:
+           rechunk_samples
+        PURPOSE:
+           copy the map's samples to a file next to the samples' file in DUST_DIR with a layout for fast reads, which is used automatically from then on (this only needs to be done once)
+        INPUT:
+           layout= ('pixel') 'pixel' for reading the samples of the pixels that contain a set of stars (used by evaluate_samples and precompute_quantiles) or 'sample' for reading one sample of all pixels (used by substitute_sample, without loading all samples into memory)
+           compression= (None) None for uncompressed samples or an HDF5 compression filter (e.g., 'lzf' for a fast codec or 'gzip')
+        OUTPUT:
+           (none)
+        HISTORY:
+           2026-10-18 - Written
+        """
+        if self._samplesfile is None \
+                or not os.path.exists(self._samplesfile):
+            raise RuntimeError("This map does not have samples; set up the map with load_samples=True (which downloads the samples if necessary)")
+        rechunk_samples(self._samplesfile, layout=layout,
+                        compression=compression)
+        return None
+
+    def _quantiles_filename(self, quantiles):
+        """Name of the file with the quantile cube of quantiles"""
+        if self._samplesfile is None:
+            raise RuntimeError("This map does not have samples to compute quantiles from")
+        return sidecar_filename(self._samplesfile, 'quantiles_%s'
+                                % '_'.join('%g' % q for q in quantiles))
+
+    def _load_quantiles(self, quantiles):
+        """Return the quantile cube (npix,nquantile,ndistmod) that contains quantiles, memory-mapped from a file created by precompute_quantiles, and the indices of quantiles in the cube"""
+        quantiles= tuple(float(q) for q in quantiles)
+        if not quantiles in self._quantile_cubes:
+            # Also look for cubes with more quantiles
+            cubefiles= [self._quantiles_filename(quantiles)]\
+                +sorted(glob.glob(sidecar_filename(self._samplesfile,
+                                                   'quantiles_*')))
+            for cubefile in cubefiles:
+                cquantiles= tuple(float(q) for q in os.path.basename(\
+                    cubefile)[:-4].split('_quantiles_')[-1].split('_'))
+                if not set(quantiles) <= set(cquantiles):
+                    continue
+                cube= load_sidecar(cubefile, filename=self._samplesfile,
+                                   shape=(len(self._best_fit),len(cquantiles),
+                                          len(self._distmods)))
+                if cube is not None:
+                    self._quantile_cubes[quantiles]= \
+                        (cube,[cquantiles.index(q) for q in quantiles])
+                    break
+            else:
+                raise RuntimeError(f"Quantiles {quantiles} of the samples have not been computed (or are out of date); compute them once using precompute_quantiles(quantiles={quantiles})")
+        return self._quantile_cubes[quantiles]
+
+    def __getstate__(self):
+        """
+        NAME:
+           __getstate__
+        PURPOSE:
+           return the state of the map for pickling, without the open HDF5 samples
+        INPUT:
+        OUTPUT:
+           state
+        HISTORY:
+           2026-10-18 - Written
+        """
+        state= DustMap3D.__getstate__(self)
+        state['_samples_dset']= self._samples_dset is not None
+        # The shared spline cache is that of the process that loads the state
+        if state.get('_intps') is shared_cache():
+            state['_intps']= None
+        return state
+
+    def __setstate__(self, state):
+        """
+        NAME:
+           __setstate__
+        PURPOSE:
+           restore the state of the map from __getstate__, re-opening the HDF5 samples
+        INPUT:
+           state - state from __getstate__
+        OUTPUT:
+        HISTORY:
+           2026-10-18 - Written
+        """
+        DustMap3D.__setstate__(self, state)
+        self._samples_dset= h5py.File(self._samples_dsetfile, 'r')['/samples'] \
+            if self._samples_dset else None
+        if '_intps' in state and self._intps is None:
+            self._intps= shared_cache()
 
     def dust_vals_disk(self,lcen,bcen,dist,radius):
         """
@@ -91,71 +449,286 @@ class HierarchicalHealpixMap(DustMap3D):
            (pixarea,extinction) - arrays of pixel-area in sq rad and extinction value
         HISTORY:
            2015-03-06 - Written - Bovy (IAS)
+           2026-10-18 - Evaluated with dust_vals_disks
         """
-        try:
-            import healpy
-        except ImportError:
-            raise ModuleNotFoundError("This function requires healpy to be installed")
-        # Convert the disk center to a HEALPIX vector
-        vec= healpy.pixelfunc.ang2vec((90.-bcen)*_DEGTORAD,lcen*_DEGTORAD)
-        distmod= 5.*numpy.log10(dist)+10.
-        # Query the HEALPIX map for pixels that lie within the disk
+        return self.dust_vals_disks(lcen,bcen,dist,radius)[1:]
+
+    def dust_vals_disks(self,lcen,bcen,dist,radius):
+        """
+        NAME:
+           dust_vals_disks
+        PURPOSE:
+           return the distribution of extinction within many small disks (e.g., the fields of a survey) as samples
+        INPUT:
+           lcen, bcen - Galactic longitude and latitude of the centers of the disks (deg), can be arrays
+           dist - distance in kpc, scalar or array of distances at which all disks are evaluated
+           radius - radius of the disks (deg), can be array; (lcen,bcen,radius) are broadcast against each other
+        OUTPUT:
+           (offsets,pixarea,extinction) - the pixels of disk i are offsets[i]:offsets[i+1] of the arrays of pixel-area in sq rad and extinction value (with a trailing axis of distances for array dist); the pixels of each disk are ordered by level, from the coarsest level
+        HISTORY:
+           2026-10-18 - Written
+        """
+        lcen, bcen, radius= _disk_fields(lcen, bcen, radius)
+        # Pixels of all disks that are in the map at each level
+        fields= []
+        rows= []
         pixarea= []
-        extinction= []
+        for nside, field, lbIndx in self._disk_rows(lcen, bcen, radius):
+            fields.append(field)
+            rows.append(lbIndx)
+            pixarea.append(numpy.full(len(field),
+                                      4.*numpy.pi/(12.*float(nside)**2)))
+        # Sort by disk, keeping the order of the levels and pixels
+        field= numpy.concatenate(fields)
+        sortIndx= numpy.argsort(field, kind='stable')
+        lbIndx= numpy.concatenate(rows)[sortIndx]
+        pixarea= numpy.concatenate(pixarea)[sortIndx]
+        return (_disk_offsets(field, len(lcen)), pixarea,
+                self._disk_extinction(lbIndx, dist))
+
+    def _region_pixels(self, lcen, bcen, dist, radius):
+        """Generate the pixels of the disks (1D arrays) in chunks of (field,pixarea,extinction) for region_stats, level by level for chunks of disks"""
+        for start in range(0, len(lcen), _REGION_DISKS):
+            for nside, field, lbIndx in self._disk_rows(\
+                    lcen[start:start+_REGION_DISKS],
+                    bcen[start:start+_REGION_DISKS],
+                    radius[start:start+_REGION_DISKS]):
+                for pstart in range(0, len(field), _REGION_CHUNK):
+                    tlbIndx= lbIndx[pstart:pstart+_REGION_CHUNK]
+                    yield (start+field[pstart:pstart+_REGION_CHUNK],
+                           numpy.full(len(tlbIndx),
+                                      4.*numpy.pi/(12.*float(nside)**2)),
+                           self._disk_extinction(tlbIndx, dist))
+
+    def _disk_rows(self, lcen, bcen, radius):
+        """Generate the pixels of the disks that are in the map as (nside,field,lbIndx) for each level"""
         for nside in self._nsides:
-            # Find the pixels at this resolution that fall within the disk
-            ipixs= healpy.query_disc(nside,vec,radius*_DEGTORAD,
-                                    inclusive=False,nest=True)
-            # Get indices of all pixels within the disk at current nside level
-            nsideindx= self._pix_info['nside'] == nside
-            potenIndxs= self._indexArray[nsideindx]
-            nsidepix= self._pix_info['healpix_index'][nsideindx]
-            # Loop through the pixels in the (small) disk
-            tout= []
-            for ii,ipix in enumerate(ipixs):
-                lbIndx= potenIndxs[ipix == nsidepix]
-                if numpy.sum(lbIndx) == 0: continue
-                if self._intps[lbIndx] != 0:
-                    tout.append(self._intps[lbIndx][0](distmod))
-                else:
-                    interpData=\
-                        interpolate.InterpolatedUnivariateSpline(self._distmods,
-                                                                 self._best_fit[lbIndx],
-                                                                 k=self._interpk)
-                    tout.append(interpData(distmod))
-                    self._intps[lbIndx]= interpData
-            tarea= healpy.pixelfunc.nside2pixarea(nside)
-            tarea= [tarea for ii in range(len(tout))]
-            pixarea.extend(tarea)
-            extinction.extend(tout)
-        pixarea= numpy.array(pixarea)
-        extinction= numpy.array(extinction)
+            field, ipix= _query_discs(nside, lcen, bcen, radius, nest=True)
+            lbIndx= self._levelIndx(nside, ipix)
+            good= lbIndx != -1
+            yield (nside, field[good], lbIndx[good])
+
+    def _disk_extinction(self, lbIndx, dist):
+        """Extinction of the rows lbIndx at the distances dist, with shape lbIndx.shape+dist.shape"""
+        distmod= 5.*numpy.log10(numpy.asarray(dist, dtype='float64'))+10.
+        lbIndx, distmod= numpy.broadcast_arrays(\
+            lbIndx.reshape(lbIndx.shape+(1,)*distmod.ndim), distmod)
+        extinction= self._interp_rows(lbIndx.ravel(), distmod.ravel())\
+            .reshape(lbIndx.shape)
         if not self._filter is None:
-            extinction= extinction*aebv(self._filter,sf10=self._sf10)        
-        return (pixarea,extinction)
+            extinction= extinction*aebv(self._filter,sf10=self._sf10)
+        return extinction
+
+    def _levelIndx(self, nside, pix):
+        """Return the indices in the _combineddata array of the nested pixels pix at level nside (-1 for pixels that are not in the map at this level)"""
+        if self._lookup is None and self._lookup_levels is None:
+            self._setup_lookup()
+        shift= 2*int(numpy.log2(self._maxnside//nside))
+        if self._lookup_levels is None:
+            # The finest pixel of the map that contains the first subpixel
+            lbIndx= numpy.asarray(self._lookup[pix << shift], dtype='int64')
+            good= lbIndx != -1
+            good[good]= self._pix_info['nside'][lbIndx[good]] == nside
+            return numpy.where(good, lbIndx, -1)
+        lbIndx= numpy.full(len(pix), -1, dtype='int64')
+        for tshift, healpix_index_nside, nside_idx in self._lookup_levels:
+            if tshift != shift or len(nside_idx) == 0: continue
+            result= numpy.searchsorted(healpix_index_nside, pix)
+            result[result == len(nside_idx)]= 0
+            good= healpix_index_nside[result] == pix
+            lbIndx[good]= nside_idx[result[good]]
+        return lbIndx
 
     def _lbIndx(self, ls, bs):
         """Return the indices in the _combineddata array corresponding to arrays of (l, b)"""
-        stop_mask = numpy.zeros(len(ls), dtype=bool)  # mask to be accumulated when looping through nside
-        indx_result = numpy.ones(len(ls), dtype=int) * -1  # -1 for bad star, int array has no nan
-        for nside in self._nsides:
-            tpix = ang2pix(nside, (90.-bs)*_DEGTORAD, ls*_DEGTORAD, nest=True)
-            nside_idx = numpy.where(self._pix_info['nside'] == nside)[0]
-            healpix_index_nside = self._pix_info['healpix_index'][nside_idx]
-            sorted_order = numpy.argsort(healpix_index_nside)
-            # use searchsorted to find the index of tpix in healpix_index_nside efficiently
-            result = numpy.searchsorted(healpix_index_nside, tpix, sorter=sorted_order)
-            # need to deal with indices where they are larger than the largest healpix_index_nside
-            known_bad_idx = (result == len(nside_idx))
-            result[known_bad_idx] = 0  # wrap around
-            result = sorted_order[result]  # reverse the sorting before indexing
-            result = nside_idx[result]
-            good_result_idx = ((self._pix_info['healpix_index'][result] == tpix) & (self._pix_info['nside'][result] == nside) & (~known_bad_idx))
-            indx_result = numpy.where(~stop_mask & good_result_idx, result, indx_result)
-            indx_result = numpy.where(known_bad_idx & ~stop_mask, -1, indx_result)  # set bad star to -1
-            stop_mask = stop_mask | good_result_idx  # update mask for the next nside
+        if self._lookup is None and self._lookup_levels is None:
+            self._setup_lookup()
+        tpix= ang2pix(self._maxnside, (90.-bs)*_DEGTORAD, ls*_DEGTORAD,
+                      nest=True)
+        if self._lookup_levels is None:
+            return self._lookup[tpix]
+        # Per-level sorted index, finest level first
+        indx_result= numpy.full(len(tpix), -1, dtype='int64') # -1 for bad star
+        for shift, healpix_index_nside, nside_idx in self._lookup_levels:
+            tpix_nside= tpix >> shift
+            result= numpy.searchsorted(healpix_index_nside, tpix_nside)
+            result[result == len(nside_idx)]= 0
+            good_result_idx= (indx_result == -1)\
+                & (healpix_index_nside[result] == tpix_nside)
+            indx_result[good_result_idx]= nside_idx[result[good_result_idx]]
         return indx_result
 
+    def _setup_lookup(self, filename=None):
+        """Set up the table that maps nested pixels at _maxnside to rows of _pix_info (-1 if not in the map, finest level wins); if _maxnside <= _DENSE_LOOKUP_MAXNSIDE this is a dense array that is stored in (or loaded from) a .npy file next to the map's file filename, otherwise it is a sorted index for each level"""
+        self._lookup_levels= None
+        npix= 12*int(self._maxnside)**2
+        if self._maxnside > _DENSE_LOOKUP_MAXNSIDE:
+            self._lookup= None
+            self._lookup_levels= []
+            for nside in self._nsides:
+                nside_idx= numpy.nonzero(self._pix_info['nside'] == nside)[0]
+                healpix_index_nside= numpy.asarray(\
+                    self._pix_info['healpix_index'][nside_idx], dtype='int64')
+                sorted_order= numpy.argsort(healpix_index_nside)
+                self._lookup_levels.append(\
+                    (2*int(numpy.log2(self._maxnside//nside)),
+                     healpix_index_nside[sorted_order],
+                     nside_idx[sorted_order]))
+            return None
+        lookup= None
+        if filename is not None:
+            cachefile= sidecar_filename(filename, 'pixlookup')
+            lookup= load_sidecar(cachefile, filename=filename, shape=(npix,))
+            if lookup is not None:
+                self._lookup= lookup
+                return None
+            try:
+                lookup= open_sidecar(cachefile, 'int32', (npix,))
+            except OSError: # e.g., DUST_DIR is not writeable
+                lookup= None
+        if lookup is None:
+            lookup= numpy.empty(npix, dtype='int32')
+        lookup[:]= -1
+        # Fill from the coarsest to the finest level, such that finer pixels
+        # overwrite the coarser pixels that contain them
+        for nside in self._nsides[::-1]:
+            nside_idx= numpy.nonzero(self._pix_info['nside'] == nside)[0]
+            lookup.reshape((12*int(nside)**2, -1))\
+                [self._pix_info['healpix_index'][nside_idx]]= nside_idx[:,None]
+        if isinstance(lookup, numpy.memmap):
+            lookup= close_sidecar(lookup, cachefile)
+        self._lookup= lookup
+        return None
+
+    def distance_at_extinction(self, l, b, A):
+        """
+        NAME:
+           distance_at_extinction
+        PURPOSE:
+           return the distance at which the extinction along a sightline first reaches a given value
+        INPUT:
+           l,b - Galactic longitude and latitude (deg)
+           A - extinction in the map's filter (E(B-V) if the map has no filter); (l,b,A) are broadcast against each other
+        OUTPUT:
+           distance in kpc, with the broadcast shape of (l,b,A): the best-fit extinction curve of each pixel on the map's grid of distance moduli is inverted at its first crossing of A, such that decreasing (non-monotonic) segments after the curve has first reached A are ignored; the crossing is interpolated linearly in distance modulus (for interpk > 1, the crossing is located on the grid and then refined by bisection of the spline within that segment of the grid); the first distance of the grid if the extinction there already reaches A; infinity if the extinction saturates below A within the last distance of the grid; NaN outside of the map's coverage
+        HISTORY:
+           2026-10-18 - Written
+        """
+        l, b, A, shape= _invert_args(l, b, A)
+        if self._filter is not None:
+            A= A/aebv(self._filter,sf10=self._sf10)
+        lbIndx= self._lbIndx(l, b)
+        out= numpy.full(len(A), numpy.nan)
+        for start in range(0, len(A), _INVERT_CHUNK):
+            end= start+_INVERT_CHUNK
+            tlbIndx= lbIndx[start:end]
+            good= tlbIndx != -1
+            tlbIndx, tA= tlbIndx[good], A[start:end][good]
+            distmod, jj= _first_crossing(\
+                self._distmods,
+                numpy.asarray(self._best_fit[tlbIndx], dtype='float64'), tA)
+            if self._interpk > 1:
+                # Bisect the spline between the nodes around the crossing
+                refine= numpy.isfinite(distmod)*(jj > 0)
+                lo= self._distmods[jj[refine]-1]
+                hi= self._distmods[jj[refine]]
+                for ii in range(_BISECT_ITER):
+                    mid= 0.5*(lo+hi)
+                    above= self._interp_rows(tlbIndx[refine], mid)\
+                        >= tA[refine]
+                    hi= numpy.where(above, mid, hi)
+                    lo= numpy.where(above, lo, mid)
+                distmod[refine]= hi
+            out[start:end][good]= 10.**(distmod/5.-2.)
+        return out.reshape(shape)
+
+    def to_healpix(self, nside, distances, nest=True, filename=None,
+                   dtype='float64'):
+        """
+        NAME:
+           to_healpix
+        PURPOSE:
+           export the map at a set of distances as full-sky HEALPix maps
+        INPUT:
+           nside - nside of the HEALPix maps
+           distances - distance(s) in kpc
+           nest= (True) if True, use the NESTED ordering, otherwise the RING ordering (which requires healpy)
+           filename= (None) if given, write the maps to a memory-mapped .npy file with this name (for maps that do not fit in memory), otherwise return an array in memory
+           dtype= ('float64') data type of the output
+        OUTPUT:
+           array (ndist,npix) of the extinction interpolated to the distances; pixels of the map that are coarser than nside are expanded to all of their child pixels, pixels that are finer than nside are averaged over the part of each output pixel that is covered by the map (NaN outside of the map's coverage)
+        HISTORY:
+           2026-10-18 - Written
+        """
+        distances= numpy.atleast_1d(numpy.asarray(distances, dtype='float64'))
+        out= _healpix_output(nside, len(distances), filename, dtype)
+        # Map pixels that are finer than nside are averaged, using the
+        # covered fraction of each output pixel; the weights only depend on
+        # the distance through NaN extinction, so one weight is kept per
+        # output pixel and the weights of NaN extinction are kept separately
+        npix= out.shape[1]
+        wsum= None
+        if nside < self._maxnside:
+            wsum= numpy.zeros(npix)
+            nan_cells, nan_weights= [], []
+            out[:]= 0.
+        else:
+            out[:]= numpy.nan
+        for nside_level in self._nsides:
+            rows= numpy.nonzero(self._pix_info['nside'] == nside_level)[0]
+            if nside >= nside_level:
+                # Vectorized expansion to the child pixels
+                mult= (nside//nside_level)**2
+                chunk= max(_EXPORT_CHUNK//mult, 1)
+                for start in range(0, len(rows), chunk):
+                    trows= rows[start:start+chunk]
+                    children= (numpy.asarray(\
+                        self._pix_info['healpix_index'][trows],
+                        dtype='int64')[:,None]*mult
+                               +numpy.arange(mult)).ravel()
+                    children= _healpix_order(nside, children, nest)
+                    out[:,children]= numpy.repeat(\
+                        self._disk_extinction(trows, distances).T, mult,
+                        axis=1)
+                    if wsum is not None: wsum[children]= 1.
+                continue
+            shift= 2*int(numpy.log2(nside_level//nside))
+            weight= 1./4.**(shift//2)
+            for start in range(0, len(rows), _EXPORT_CHUNK):
+                trows= rows[start:start+_EXPORT_CHUNK]
+                ext= self._disk_extinction(trows, distances).T
+                parent= _healpix_order(\
+                    nside, numpy.asarray(self._pix_info['healpix_index'][trows],
+                                         dtype='int64') >> shift, nest)
+                good= ~numpy.isnan(ext)
+                numpy.add.at(wsum, parent, weight)
+                numpy.add.at(out, (slice(None), parent),
+                             numpy.where(good, weight*ext, 0.))
+                jdist, jpix= numpy.nonzero(~good)
+                nan_cells.append(parent[jpix]+jdist*npix)
+                nan_weights.append(numpy.full(len(jpix), weight))
+        if wsum is not None:
+            # Total weight of the NaN extinction in each (distance,pixel)
+            nan_cells, nan_indx= numpy.unique(\
+                numpy.concatenate(nan_cells+[numpy.zeros(0, dtype='int64')]),
+                return_inverse=True)
+            nan_weights= numpy.bincount(nan_indx, minlength=len(nan_cells),
+                weights=numpy.concatenate(nan_weights+[numpy.zeros(0)]))
+            sortIndx= numpy.argsort(nan_cells % npix, kind='stable')
+            nan_pix= (nan_cells % npix)[sortIndx]
+            for start in range(0, npix, _EXPORT_CHUNK):
+                end= min(start+_EXPORT_CHUNK, npix)
+                tw= numpy.tile(wsum[start:end], (len(distances), 1))
+                indx= sortIndx[numpy.searchsorted(nan_pix, start):
+                               numpy.searchsorted(nan_pix, end)]
+                tw[nan_cells[indx]//npix, nan_cells[indx] % npix-start]-=\
+                    nan_weights[indx]
+                with numpy.errstate(invalid='ignore', divide='ignore'):
+                    out[:,start:end]= numpy.where(tw > 0., out[:,start:end]/tw,
+                                                  numpy.nan)
+        if isinstance(out, numpy.memmap): out.flush()
+        return out
+
     def plot_mollweide(self,d,**kwargs):
         """
         NAME:
@@ -163,50 +736,27 @@ class HierarchicalHealpixMap(DustMap3D):
         PURPOSE:
            plot the extinction across the sky in Galactic coordinates  out to a given distance using a Mollweide projection
         INPUT:
-           d - distance in kpc (nearest distance to this in the map is plotted)
+           d - distance in kpc
            nside_plot= (2048) nside of the plotted map
            healpy.visufunc.mollview kwargs
         OUTPUT:
            plot to output device
         HISTORY:
            2019-12-06 - Written - Bovy (UofT)
+           2026-10-18 - Use to_healpix
         """
         try:
             import healpy
         except ImportError:
             raise ModuleNotFoundError("This function requires healpy to be installed")
-        # Distance modulus
-        dm= 5.*numpy.log10(d)+10.
-        # Get factor to apply to map to obtain extinction in object's filter
-        filter_fac= aebv(self._filter,sf10=self._sf10) \
-                    if not self._filter is None else 1.
-        # Map the dust map to a common nside, first find nearest distance pixel
-        tpix= numpy.argmin(numpy.fabs(dm-self._distmods))
-        # Construct an empty map at the highest HEALPix resolution present in the map; code snippets adapted from http://argonaut.skymaps.info/usage
+        # Export the map at the highest HEALPix resolution present in the
+        # map, or at the desired nside if it is less than this
         nside_max= numpy.max(self._pix_info['nside'])
-        npix= healpy.pixelfunc.nside2npix(nside_max)
-        pix_val= numpy.empty(npix,dtype='f8')
-        pix_val[:] = healpy.UNSEEN
-        # Fill the upsampled map
-        for nside in numpy.unique(self._pix_info['nside']):
-            # Get indices of all pixels at current nside level
-            indx= self._pix_info['nside'] == nside
-            # Extract A_X of each selected pixel
-            pix_val_n= filter_fac*self._best_fit[indx,tpix]
-            # Determine nested index of each selected pixel in upsampled map
-            mult_factor = (nside_max//nside)**2
-            pix_idx_n = self._pix_info['healpix_index'][indx]*mult_factor
-            # Write the selected pixels into the upsampled map
-            for offset in range(mult_factor):
-                pix_val[pix_idx_n+offset] = pix_val_n[:]
-        # If the desired nside is less than the maximum nside in the map, degrade
-        nside_plot= kwargs.get('nside_plot',2048)
-        if not nside_plot is None and nside_plot < nside_max:
-            pix_val= healpy.pixelfunc.ud_grade(pix_val,
-                                               nside_plot,pess=False,
-                                               order_in='NEST', 
-                                               order_out='NEST')
-        pix_val[pix_val == healpy.UNSEEN]= -1.
+        nside_plot= kwargs.pop('nside_plot',2048)
+        if nside_plot is None or nside_plot > nside_max:
+            nside_plot= nside_max
+        pix_val= self.to_healpix(int(nside_plot),d)[0]
+        pix_val[numpy.isnan(pix_val)]= -1.
 
         if not self._filter is None:
             kwargs['unit']= r'$A_{%s}\,(\mathrm{mag})$' % (self._filter.split(' ')[-1])
@@ -222,3 +772,45 @@ class HierarchicalHealpixMap(DustMap3D):
                                  cmap='gist_yarg',
                                  **kwargs)
         return None
+
+def _read_sample_rows(source, rows, samples):
+    """Read the samples (a slice, sequence of indices, or None for all) of the (increasing) rows of source (an array or HDF5 dataset with shape (nrow,nsample,ndistmod)), returning an array (len(rows),nsample,ndistmod)"""
+    if samples is None:
+        samples= slice(None)
+    if isinstance(samples, slice):
+        indx= None
+    else: # HDF5 only supports a single list of indices, so read the range
+        indx= numpy.atleast_1d(samples)
+        samples= slice(numpy.amin(indx), numpy.amax(indx)+1)
+        indx= indx-samples.start
+    if len(rows) == 0:
+        out= numpy.empty((0,)+source.shape[1:], dtype=source.dtype)[:, samples]
+    elif isinstance(source, numpy.ndarray):
+        out= source[rows, samples]
+    else:
+        out= numpy.concatenate([source[list(rows[start:start+_SAMPLES_CHUNK]),
+                                       samples]
+                                for start in range(0, len(rows),
+                                                   _SAMPLES_CHUNK)])
+    if indx is not None:
+        out= out[:, indx]
+    return out
+
+def _ppoly_transform(xs, k):
+    """Return the breakpoints and the (len(xs), nbreak-1 x k+1) matrix that transforms data values at xs to the piecewise-polynomial coefficients (highest power first, in powers of x-breakpoint) of the interpolating spline of order k that InterpolatedUnivariateSpline fits"""
+    xs= numpy.asarray(xs, dtype='float64')
+    nx= len(xs)
+    # Interior knots as chosen by FITPACK for an interpolating spline (s=0)
+    if k % 2 == 1:
+        interior= xs[(k+1)//2:nx-(k+1)//2]
+    else:
+        interior= 0.5*(xs[k//2:nx-k//2-1]+xs[k//2+1:nx-k//2])
+    knots= numpy.concatenate(([xs[0]]*(k+1), interior, [xs[-1]]*(k+1)))
+    # Splines through the unit vectors, their coefficients are linear in y
+    bspl= interpolate.make_interp_spline(xs, numpy.eye(nx), k=k, t=knots)
+    breaks= numpy.unique(knots)
+    transform= numpy.empty((len(breaks)-1, k+1, nx))
+    for pp in range(k+1):
+        transform[:,k-pp]= bspl(breaks[:-1], nu=pp)\
+            /numpy.prod(numpy.arange(1, pp+1))
+    return (breaks, transform.reshape(((len(breaks)-1)*(k+1), nx)).T)
@@ -7,12 +7,12 @@ import os, os.path
 import sys
 import gzip
 import numpy
-from scipy import interpolate
 from astropy.io import ascii
 from mwdust.util.extCurves import aebv
 from mwdust.util.tools import cos_sphere_dist
 from mwdust.util.download import dust_dir, downloader
-from mwdust.DustMap3D import DustMap3D
+from mwdust.DustMap3D import DustMap3D, _grid_lb, _disk_fields, \
+    _disk_offsets, _INVERT_CHUNK, _invert_args, _first_crossing
 
 try:
     from galpy.util import plot as bovy_plot
@@ -61,7 +61,30 @@ class Marshall06(DustMap3D):
         self._marshalldata= self._marshalldata[sortIndx]
         self._dl= 0.25
         self._db= 0.25
-        self._intps= numpy.zeros(len(self._marshalldata),dtype='object') #array to cache interpolated extinctions
+        #Convert to dense arrays of the lines of sight, including the
+        #boundary conditions (extinction is zero at zero distance; extinction
+        #is constant after last data point, out to 30 kpc); unused entries
+        #beyond the last data point have infinite distance
+        self._nb= numpy.asarray(self._marshalldata['nb'],dtype='int64')
+        nbmax= numpy.amax(self._nb)
+        self._lbdata= numpy.zeros((len(self._marshalldata),nbmax+2),
+                                  dtype=[('dist', 'f8'),
+                                         ('e_dist', 'f8'),
+                                         ('aks', 'f8'),
+                                         ('e_aks','f8')])
+        self._lbdata['dist'][:,1:]= numpy.inf
+        rows= numpy.arange(len(self._marshalldata))
+        for ii in range(nbmax):
+            indx= self._nb > ii
+            for key,col in zip(self._lbdata.dtype.names,
+                               ['r','e_r','ext','e_ext']):
+                self._lbdata[key][indx,ii+1]=\
+                    numpy.ma.filled(self._marshalldata['%s%i' % (col,ii+1)],
+                                    numpy.nan)[indx]
+        self._lbdata['dist'][rows,self._nb+1]= 30.
+        self._lbdata['aks'][rows,self._nb+1]= self._lbdata['aks'][rows,self._nb]
+        self._lbdata['e_aks'][rows,self._nb+1]= \
+            self._lbdata['e_aks'][rows,self._nb]
         return None
 
     def _evaluate(self,l,b,d):
@@ -71,27 +94,34 @@ class Marshall06(DustMap3D):
         PURPOSE:
            evaluate the dust-map
         INPUT:
-           l- Galactic longitude (deg)
-           b- Galactic latitude (deg)
-           d- distance (kpc) can be array
+           l- Galactic longitude (deg) can be array
+           b- Galactic latitude (deg) can be array
+           d- distance (kpc) can be array; (l,b,d) are broadcast against each other
         OUTPUT:
-           extinction
+           extinction (NaN for array (l,b) outside of the region covered by the map)
         HISTORY:
            2013-12-12 - Started - Bovy (IAS)
+           2026-10-18 - Vectorized
         """
-        if isinstance(l,numpy.ndarray) or isinstance(b,numpy.ndarray):
-            raise NotImplementedError("array input for l and b for Marshall06 dust map not implemented")
+        # Look up the lines of sight once per (l,b), then broadcast to d
         lbIndx= self._lbIndx(l,b)
-        if self._intps[lbIndx] != 0:
-            out= self._intps[lbIndx](d)
-        else:
-            tlbData= self.lbData(l,b,addBC=True)
-            interpData=\
-                interpolate.InterpolatedUnivariateSpline(tlbData['dist'],
-                                                         tlbData['aks'],
-                                                         k=1)
-            out= interpData(d)
-            self._intps[lbIndx]= interpData
+        lbIndx= numpy.reshape(lbIndx,(1,)*(numpy.ndim(d)-numpy.ndim(lbIndx))
+                              +numpy.shape(lbIndx))
+        d= numpy.reshape(d,(1,)*(numpy.ndim(lbIndx)-numpy.ndim(d))
+                         +numpy.shape(d))
+        good= lbIndx != -1
+        dists= self._lbdata['dist'][lbIndx]
+        akss= self._lbdata['aks'][lbIndx]
+        # Piecewise-linear interpolation, extrapolating the first and last
+        # segments like a k=1 InterpolatedUnivariateSpline
+        jj= numpy.sum(dists <= d[...,None],axis=-1)-1
+        jj= numpy.clip(jj,0,self._nb[lbIndx])[...,None]
+        dist_lo= numpy.take_along_axis(dists,jj,axis=-1)[...,0]
+        dist_hi= numpy.take_along_axis(dists,jj+1,axis=-1)[...,0]
+        fac= 1./(dist_hi-dist_lo)
+        out= numpy.take_along_axis(akss,jj,axis=-1)[...,0]*(fac*(dist_hi-d))\
+            +numpy.take_along_axis(akss,jj+1,axis=-1)[...,0]*(fac*(d-dist_lo))
+        out= numpy.where(good,out,numpy.nan)
         if self._filter is None:
             return out/aebv('2MASS Ks',sf10=self._sf10)
         else:
@@ -112,36 +142,86 @@ class Marshall06(DustMap3D):
            (pixarea,extinction) - arrays of pixel-area in sq rad and extinction value
         HISTORY:
            2015-03-07 - Written - Bovy (IAS)
+           2026-10-18 - Evaluated with dust_vals_disks
+        """
+        return self.dust_vals_disks(lcen,bcen,dist,radius)[1:]
+
+    def dust_vals_disks(self,lcen,bcen,dist,radius):
+        """
+        NAME:
+           dust_vals_disks
+        PURPOSE:
+           return the distribution of extinction within many small disks (e.g., the fields of a survey) as samples
+        INPUT:
+           lcen, bcen - Galactic longitude and latitude of the centers of the disks (deg), can be arrays
+           dist - distance in kpc, scalar or array of distances at which all disks are evaluated
+           radius - radius of the disks (deg), can be array; (lcen,bcen,radius) are broadcast against each other
+        OUTPUT:
+           (offsets,pixarea,extinction) - the pixels of disk i are offsets[i]:offsets[i+1] of the arrays of pixel-area in sq rad and extinction value (with a trailing axis of distances for array dist)
+        HISTORY:
+           2026-10-18 - Written
         """
-        # Find all of the (l,b) of the pixels within radius of (lcen,bcen)
-        lmin= round((lcen-radius-self._dl)/self._dl)*self._dl
-        lmax= round((lcen+radius+self._dl)/self._dl)*self._dl
-        bmin= round((bcen-radius-self._db)/self._db)*self._db
-        bmax= round((bcen+radius+self._db)/self._db)*self._db
-        ls= numpy.arange(lmin,lmax+self._dl,self._dl)
-        bs= numpy.arange(bmin,bmax+self._db,self._db)
-        ll,bb= numpy.meshgrid(ls,bs,indexing='ij')
-        ll= ll.flatten()
-        bb= bb.flatten()
+        lcen,bcen,radius= _disk_fields(lcen,bcen,radius)
+        # Grid of (l,b) around each disk, with the grid points of all disks
+        # concatenated
+        lmin= numpy.round((lcen-radius-self._dl)/self._dl)*self._dl
+        lmax= numpy.round((lcen+radius+self._dl)/self._dl)*self._dl
+        bmin= numpy.round((bcen-radius-self._db)/self._db)*self._db
+        bmax= numpy.round((bcen+radius+self._db)/self._db)*self._db
+        nl= numpy.ceil((lmax+self._dl-lmin)/self._dl).astype('int64')
+        nb= numpy.ceil((bmax+self._db-bmin)/self._db).astype('int64')
+        field= numpy.repeat(numpy.arange(len(lcen)),nl*nb)
+        kk= numpy.arange(len(field))-_disk_offsets(field,len(lcen))[field]
+        ll= lmin[field]+(kk//nb[field])*self._dl
+        bb= bmin[field]+(kk%nb[field])*self._db
         indx= cos_sphere_dist(numpy.sin((90.-bb)*_DEGTORAD),
                               numpy.cos((90.-bb)*_DEGTORAD),
                               numpy.sin(ll*_DEGTORAD),
                               numpy.cos(ll*_DEGTORAD),
-                              numpy.sin((90.-bcen)*_DEGTORAD),
-                              numpy.cos((90.-bcen)*_DEGTORAD),
-                              numpy.sin(lcen*_DEGTORAD),
-                              numpy.cos(lcen*_DEGTORAD)) \
-                              >= numpy.cos(radius*_DEGTORAD)
-        ll= ll[indx]
-        bb= bb[indx]
+                              numpy.sin((90.-bcen[field])*_DEGTORAD),
+                              numpy.cos((90.-bcen[field])*_DEGTORAD),
+                              numpy.sin(lcen[field]*_DEGTORAD),
+                              numpy.cos(lcen[field]*_DEGTORAD)) \
+                              >= numpy.cos(radius[field]*_DEGTORAD)
+        field= field[indx]
         # Now get the extinctions for these pixels
-        pixarea= self._dl*self._db*_DEGTORAD**2.+numpy.zeros(numpy.sum(indx))
-        extinction= []
-        for l,b in zip(ll,bb):
-            extinction.append(self._evaluate(l,b,dist))
-        extinction= numpy.array(extinction)
-        return (pixarea,extinction)
-               
+        pixarea= self._dl*self._db*_DEGTORAD**2.+numpy.zeros(len(field))
+        extinction= self._evaluate(*_grid_lb(ll[indx],bb[indx],dist),dist)
+        return (_disk_offsets(field,len(lcen)),pixarea,extinction)
+
+    def distance_at_extinction(self,l,b,A):
+        """
+        NAME:
+           distance_at_extinction
+        PURPOSE:
+           return the distance at which the extinction along a sightline first reaches a given value
+        INPUT:
+           l,b - Galactic longitude and latitude (deg)
+           A - extinction in the map's filter (E(B-V) if the map has no filter); (l,b,A) are broadcast against each other
+        OUTPUT:
+           distance in kpc, with the broadcast shape of (l,b,A): the extinction curve of each line of sight (linearly interpolated between zero extinction at zero distance and the data points) is inverted at its first crossing of A, such that decreasing (non-monotonic) segments after the curve has first reached A are ignored; zero for A <= 0; infinity if the extinction saturates below A within the last data point; NaN outside of the region covered by the map
+        HISTORY:
+           2026-10-18 - Written
+        """
+        l,b,A,shape= _invert_args(l,b,A)
+        # Convert to A_Ks
+        if self._filter is None:
+            A= A*aebv('2MASS Ks',sf10=self._sf10)
+        else:
+            A= A*aebv('2MASS Ks',sf10=self._sf10)\
+                /aebv(self._filter,sf10=self._sf10)
+        lbIndx= self._lbIndx(l,b)
+        out= numpy.full(len(A),numpy.nan)
+        for start in range(0,len(A),_INVERT_CHUNK):
+            end= start+_INVERT_CHUNK
+            tlbIndx= lbIndx[start:end]
+            good= tlbIndx != -1
+            out[start:end][good]=\
+                _first_crossing(self._lbdata['dist'][tlbIndx[good]],
+                                self._lbdata['aks'][tlbIndx[good]],
+                                A[start:end][good])[0]
+        return out.reshape(shape)
+
     def dmax(self,l,b):
         """
         NAME:
@@ -150,15 +230,18 @@ class Marshall06(DustMap3D):
            return the maximum distance for which there is Marshall et al. 
            (2006) data
         INPUT:
-           l- Galactic longitude (deg)
-           b- Galactic latitude (deg)
+           l- Galactic longitude (deg) can be array
+           b- Galactic latitude (deg) can be array
         OUTPUT:
-           maximum distance in kpc
+           maximum distance in kpc (NaN for array (l,b) outside of the region covered by the map)
         HISTORY:
            2013-12-19 - Started - Bovy (IAS)
         """
-        tlbData= self.lbData(l,b,addBC=False)
-        return tlbData['dist'][-1]
+        lbIndx= self._lbIndx(l,b)
+        out= self._lbdata['dist'][lbIndx,self._nb[lbIndx]]
+        if isinstance(out,numpy.ndarray):
+            out[lbIndx == -1]= numpy.nan
+        return out
 
     def lbData(self,l,b,addBC=False):
         """
@@ -177,28 +260,8 @@ class Marshall06(DustMap3D):
         """
         #Find correct entry
         lbIndx= self._lbIndx(l,b)
-        #Build output array
-        out= numpy.recarray((self._marshalldata[lbIndx]['nb']+2*addBC,),
-                            dtype=[('dist', 'f8'),
-                                   ('e_dist', 'f8'),
-                                   ('aks', 'f8'),
-                                   ('e_aks','f8')])
-        if addBC:
-            #Add boundary conditions
-            out[0]['dist']= 0.
-            out[0]['e_dist']= 0.
-            out[0]['aks']= 0.
-            out[0]['e_aks']= 0.
-            out[-1]['dist']= 30.
-            out[-1]['e_dist']= 0.
-            out[-1]['aks']= self._marshalldata[lbIndx]['ext%i' % (self._marshalldata[lbIndx]['nb'])]
-            out[-1]['e_aks']=  self._marshalldata[lbIndx]['e_ext%i' % (self._marshalldata[lbIndx]['nb'])]
-        for ii in range(self._marshalldata[lbIndx]['nb']):
-            out[ii+addBC]['dist']= self._marshalldata[lbIndx]['r%i' % (ii+1)]
-            out[ii+addBC]['e_dist']= self._marshalldata[lbIndx]['e_r%i' % (ii+1)]
-            out[ii+addBC]['aks']= self._marshalldata[lbIndx]['ext%i' % (ii+1)]
-            out[ii+addBC]['e_aks']= self._marshalldata[lbIndx]['e_ext%i' % (ii+1)]
-        return out
+        return self._lbdata[lbIndx,1-addBC:self._nb[lbIndx]+1+addBC]\
+            .copy().view(numpy.recarray)
 
     def plotData(self,l,b,*args,**kwargs):
         """
@@ -236,13 +299,37 @@ class Marshall06(DustMap3D):
                         ls='none',marker=None,color='k')
         return out
 
+    def coverage(self,l,b):
+        """
+        NAME:
+           coverage
+        PURPOSE:
+           return whether sightlines are covered by the map
+        INPUT:
+           l,b - Galactic longitude and latitude (deg), broadcast against each other
+        OUTPUT:
+           boolean array with the broadcast shape of (l,b)
+        HISTORY:
+           2026-10-18 - Written
+        """
+        return self._lbIndx(numpy.asarray(l,dtype='float64'),
+                            numpy.asarray(b,dtype='float64')) != -1
+
     def _lbIndx(self,l,b):
-        """Return the index in the _marshalldata array corresponding to this (l,b)"""
-        if l <= -100.125 or l >= 100.125 or b <= -10.125 or b >= 10.125:
-            raise IndexError("Given (l,b) pair not within the region covered by the Marshall et al. (2006) dust map")
-        lIndx= int(round((l+100.)/self._dl))
-        bIndx= int(round((b+10.)/self._db))
-        return lIndx*81+bIndx
+        """Return the index in the _marshalldata array corresponding to this (l,b) (l in [-180,180] or [0,360]); for array input, return an array of indices that is -1 outside of the region covered by the map"""
+        l= numpy.where(l > 180.,l-360.,l) if isinstance(l,numpy.ndarray) \
+            else (l-360. if l > 180. else l)
+        if not isinstance(l,numpy.ndarray) and not isinstance(b,numpy.ndarray):
+            if l <= -100.125 or l >= 100.125 or b <= -10.125 or b >= 10.125:
+                raise IndexError("Given (l,b) pair not within the region covered by the Marshall et al. (2006) dust map")
+            lIndx= int(round((l+100.)/self._dl))
+            bIndx= int(round((b+10.)/self._db))
+            return lIndx*81+bIndx
+        l, b= numpy.broadcast_arrays(l,b)
+        lIndx= numpy.round((l+100.)/self._dl).astype('int64')
+        bIndx= numpy.round((b+10.)/self._db).astype('int64')
+        return numpy.where((l > -100.125)*(l < 100.125)
+                           *(b > -10.125)*(b < 10.125),lIndx*81+bIndx,-1)
 
     @classmethod
     def download(cls, test=False):
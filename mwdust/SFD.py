@@ -13,7 +13,8 @@ from mwdust.DustMap3D import DustMap3D
 
 class SFD(DustMap3D):
     """Schlegel, Finkbeiner, & Davis (1998) dust map (2D)"""
-    def __init__(self,filter=None,sf10=True,interp=True,noloop=False):
+    def __init__(self,filter=None,sf10=True,interp=True,noloop=False,
+                 inmemory=False):
         """
         NAME:
            __init__
@@ -24,6 +25,7 @@ class SFD(DustMap3D):
            filter= filter to return the extinction in
            interp= (True) if True, interpolate using the nearest pixels
            noloop= (False) if True, don't loop through the glons
+           inmemory= (False) if True, memory-map the maps once per process and evaluate them in Python, rather than reading them from disk in the C code for every call
         OUTPUT:
            object
         HISTORY:
@@ -33,6 +35,7 @@ class SFD(DustMap3D):
         self._sf10= sf10
         self._interp= interp
         self._noloop= noloop
+        self._inmemory= inmemory
         return None
 
     def _evaluate(self,l,b,d):
@@ -42,16 +45,18 @@ class SFD(DustMap3D):
         PURPOSE:
            evaluate the dust-map
         INPUT:
-           l- Galactic longitude (deg)
-           b- Galactic latitude (deg)
-           d- distance (kpc)
+           l- Galactic longitude (deg) can be array
+           b- Galactic latitude (deg) can be array
+           d- distance (kpc) can be array; (l,b,d) are broadcast against each other
         OUTPUT:
            extinction
         HISTORY:
            2013-11-24 - Started - Bovy (IAS)
         """
-        tebv= read_SFD_EBV(l,b,interp=self._interp,
-                           noloop=self._noloop,verbose=False)
+        l,b= numpy.broadcast_arrays(numpy.atleast_1d(l),numpy.atleast_1d(b))
+        tebv= read_SFD_EBV(l.flatten(),b.flatten(),interp=self._interp,
+                           noloop=self._noloop,verbose=False,
+                           inmemory=self._inmemory).reshape(l.shape)
         if self._filter is None:
             return tebv*numpy.ones_like(d)
         else:
@@ -8,14 +8,15 @@ import sys
 import tarfile
 import shutil
 import numpy
-from scipy import interpolate
 from astropy.io import ascii
 from mwdust.util.extCurves import aebv
 from mwdust.util.tools import cos_sphere_dist
 from mwdust.util.download import downloader, dust_dir
-from mwdust.DustMap3D import DustMap3D
+from mwdust.DustMap3D import DustMap3D, _disk_fields, _disk_offsets, \
+    _INVERT_CHUNK, _invert_args, _first_crossing
 
 _DEGTORAD= numpy.pi/180.
+_DISK_CHUNK= 2**22 # number of (disk,pixel) pairs per chunk in dust_vals_disks
 _saledir= os.path.join(dust_dir,'sale14')
 _ERASESTR= "                                                                                "
 class Sale14(DustMap3D):
@@ -61,7 +62,13 @@ class Sale14(DustMap3D):
         self._costheta= numpy.cos((90.-self._saledata['GLAT'])*_DEGTORAD)
         self._sinphi= numpy.sin(self._saledata['GLON']*_DEGTORAD)
         self._cosphi= numpy.cos(self._saledata['GLON']*_DEGTORAD)
-        self._intps= numpy.zeros(len(self._saledata),dtype='object') #array to cache interpolated extinctions
+        # Dense array of the extinction along each line of sight
+        self._meanA= numpy.array([numpy.ma.filled(self._saledata['meanA%i' % (ii+1)],
+                                                  numpy.nan)
+                                  for ii in range(self._ndistbin)],
+                                 dtype='float64').T.copy()
+        # Direct index of the cells on a regular (l,b) grid
+        self._setup_lbgrid()
         return None
 
     def _evaluate(self,l,b,d,_lbIndx=None):
@@ -71,28 +78,27 @@ class Sale14(DustMap3D):
         PURPOSE:
            evaluate the dust-map
         INPUT:
-           l- Galactic longitude (deg)
-           b- Galactic latitude (deg)
-           d- distance (kpc) can be array
+           l- Galactic longitude (deg) can be array
+           b- Galactic latitude (deg) can be array
+           d- distance (kpc) can be array; (l,b,d) are broadcast against each other
         OUTPUT:
-           extinction
+           extinction (NaN for array (l,b) outside of the region covered by the map)
         HISTORY:
            2015-03-08 - Started - Bovy (IAS)
+           2026-10-18 - Vectorized
         """
-        if isinstance(l,numpy.ndarray) or isinstance(b,numpy.ndarray):
-            raise NotImplementedError("array input for l and b for Sale et al. (2014) dust map not implemented")
+        # The cells are looked up once per (l,b) and broadcast to d by the
+        # indexing of _meanA
         if _lbIndx is None: lbIndx= self._lbIndx(l,b)
         else: lbIndx= _lbIndx
-        if self._intps[lbIndx] != 0:
-            out= self._intps[lbIndx](d)
-        else:
-            tlbData= self.lbData(l,b)
-            interpData=\
-                interpolate.InterpolatedUnivariateSpline(self._ds,
-                                                         tlbData['a0'],
-                                                         k=1)
-            out= interpData(d)
-            self._intps[lbIndx]= interpData
+        # Linear interpolation, extrapolating the first and last segments
+        # like a k=1 InterpolatedUnivariateSpline
+        jj= numpy.searchsorted(self._ds,d,side='right')-1
+        jj= numpy.clip(jj,0,self._ndistbin-2)
+        fac= 1./(self._ds[jj+1]-self._ds[jj])
+        out= self._meanA[lbIndx,jj]*(fac*(self._ds[jj+1]-d))\
+            +self._meanA[lbIndx,jj+1]*(fac*(d-self._ds[jj]))
+        out= numpy.where(lbIndx != -1,out,numpy.nan)
         if self._filter is None: # Sale et al. say A0/Aks = 11
             return out/11./aebv('2MASS Ks',sf10=self._sf10)
         else: # if sf10, first put ebv on SFD scale
@@ -113,28 +119,89 @@ class Sale14(DustMap3D):
            (pixarea,extinction) - arrays of pixel-area in sq rad and extinction value
         HISTORY:
            2015-03-07 - Written - Bovy (IAS)
+           2026-10-18 - Evaluated with dust_vals_disks
+        """
+        return self.dust_vals_disks(lcen,bcen,dist,radius)[1:]
+
+    def dust_vals_disks(self,lcen,bcen,dist,radius):
+        """
+        NAME:
+           dust_vals_disks
+        PURPOSE:
+           return the distribution of extinction within many small disks (e.g., the fields of a survey) as samples
+        INPUT:
+           lcen, bcen - Galactic longitude and latitude of the centers of the disks (deg), can be arrays
+           dist - distance in kpc, scalar or array of distances at which all disks are evaluated
+           radius - radius of the disks (deg), can be array; (lcen,bcen,radius) are broadcast against each other
+        OUTPUT:
+           (offsets,pixarea,extinction) - the pixels of disk i are offsets[i]:offsets[i+1] of the arrays of pixel-area in sq rad and extinction value (with a trailing axis of distances for array dist)
+        HISTORY:
+           2026-10-18 - Written
         """
-        # Find all of the (l,b) of the pixels within radius of (lcen,bcen)
-        indx= cos_sphere_dist(self._sintheta,self._costheta,
-                              self._sinphi,self._cosphi,
-                              numpy.sin((90.-bcen)*_DEGTORAD),
-                              numpy.cos((90.-bcen)*_DEGTORAD),
-                              numpy.sin(lcen*_DEGTORAD),
-                              numpy.cos(lcen*_DEGTORAD)) \
-                              >= numpy.cos(radius*_DEGTORAD)
-        ll= self._saledata['GLON'][indx]
-        bb= self._saledata['GLAT'][indx]
+        lcen,bcen,radius= _disk_fields(lcen,bcen,radius)
+        # Find all of the (l,b) of the pixels within radius of (lcen,bcen),
+        # for chunks of disks
+        fields= []
+        pixs= []
+        nchunk= max(1,_DISK_CHUNK//len(self._sintheta))
+        for start in range(0,len(lcen),nchunk):
+            tl= lcen[start:start+nchunk,None]
+            tb= bcen[start:start+nchunk,None]
+            indx= cos_sphere_dist(self._sintheta,self._costheta,
+                                  self._sinphi,self._cosphi,
+                                  numpy.sin((90.-tb)*_DEGTORAD),
+                                  numpy.cos((90.-tb)*_DEGTORAD),
+                                  numpy.sin(tl*_DEGTORAD),
+                                  numpy.cos(tl*_DEGTORAD)) \
+                                  >= numpy.cos(radius[start:start+nchunk,None]
+                                               *_DEGTORAD)
+            tfield,tpix= numpy.nonzero(indx)
+            fields.append(tfield+start)
+            pixs.append(tpix)
+        field= numpy.concatenate(fields)
+        pix= numpy.concatenate(pixs)
+        ll= numpy.asarray(self._saledata['GLON'])[pix]
+        bb= numpy.asarray(self._saledata['GLAT'])[pix]
         # Now get the extinctions for these pixels
-        pixarea= []
-        extinction= []
-        for l,b in zip(ll,bb):
-            lbIndx= self._lbIndx(l,b)
-            extinction.append(self._evaluate(l,b,dist,_lbIndx=lbIndx))
-            pixarea.append(self._dl[lbIndx]*self._db[lbIndx]*_DEGTORAD**2.)
-        pixarea= numpy.array(pixarea)
-        extinction= numpy.array(extinction)
-        return (pixarea,extinction)
-               
+        lbIndx= self._lbIndx(ll,bb)
+        extinction= self._evaluate(ll,bb,dist,
+                                   _lbIndx=lbIndx.reshape(lbIndx.shape
+                                                          +(1,)*numpy.ndim(dist)))
+        pixarea= numpy.asarray(self._dl[lbIndx]*self._db[lbIndx])*_DEGTORAD**2.
+        return (_disk_offsets(field,len(lcen)),pixarea,extinction)
+
+    def distance_at_extinction(self,l,b,A):
+        """
+        NAME:
+           distance_at_extinction
+        PURPOSE:
+           return the distance at which the extinction along a sightline first reaches a given value
+        INPUT:
+           l,b - Galactic longitude and latitude (deg)
+           A - extinction in the map's filter (E(B-V) if the map has no filter); (l,b,A) are broadcast against each other
+        OUTPUT:
+           distance in kpc, with the broadcast shape of (l,b,A): the mean extinction curve of each cell on the map's grid of distances (0.05 to 14.95 kpc) is inverted at its first crossing of A, such that decreasing (non-monotonic) segments after the curve has first reached A are ignored; the crossing is interpolated linearly in distance; 0.05 kpc if the extinction there already reaches A; infinity if the extinction saturates below A within 14.95 kpc; NaN outside of the region covered by the map
+        HISTORY:
+           2026-10-18 - Written
+        """
+        l,b,A,shape= _invert_args(l,b,A)
+        # Convert to A0, with A0/Aks = 11
+        if self._filter is None:
+            A= A*11.*aebv('2MASS Ks',sf10=self._sf10)
+        else:
+            A= A*11.*aebv('2MASS Ks',sf10=self._sf10)\
+                /aebv(self._filter,sf10=self._sf10)
+        lbIndx= self._lbIndx(l,b)
+        out= numpy.full(len(A),numpy.nan)
+        for start in range(0,len(A),_INVERT_CHUNK):
+            end= start+_INVERT_CHUNK
+            tlbIndx= lbIndx[start:end]
+            good= tlbIndx != -1
+            out[start:end][good]= _first_crossing(self._ds,
+                                                  self._meanA[tlbIndx[good]],
+                                                  A[start:end][good])[0]
+        return out.reshape(shape)
+
     def dmax(self,l,b):
         """
         NAME:
@@ -142,15 +209,18 @@ class Sale14(DustMap3D):
         PURPOSE:
            return the maximum distance for which to trust the Sale et al. (2014) data
         INPUT:
-           l- Galactic longitude (deg)
-           b- Galactic latitude (deg)
+           l- Galactic longitude (deg) can be array
+           b- Galactic latitude (deg) can be array
         OUTPUT:
-           maximum distance in kpc
+           maximum distance in kpc (NaN for array (l,b) outside of the region covered by the map)
         HISTORY:
            2015-03-08 - Written - Bovy (IAS)
         """
         lbIndx= self._lbIndx(l,b)
-        return self._saledata['trust'][lbIndx]/1000.
+        out= numpy.asarray(self._saledata['trust'])[lbIndx]/1000.
+        if isinstance(lbIndx,numpy.ndarray):
+            out[lbIndx == -1]= numpy.nan
+        return out
 
     def lbData(self,l,b):
         """
@@ -172,18 +242,79 @@ class Sale14(DustMap3D):
         out= numpy.recarray((self._ndistbin,),
                             dtype=[('a0', 'f8'),
                                    ('e_a0','f8')])
-        for ii in range(self._ndistbin):
-            out[ii]['a0']= self._saledata[lbIndx]['meanA%i' % (ii+1)]
-            out[ii]['e_a0']= self._saledata[lbIndx]['meanA%i' % (ii+1)]
+        out['a0']= self._meanA[lbIndx]
+        out['e_a0']= self._meanA[lbIndx]
         return out
 
+    def coverage(self,l,b):
+        """
+        NAME:
+           coverage
+        PURPOSE:
+           return whether sightlines are covered by the map
+        INPUT:
+           l,b - Galactic longitude and latitude (deg), broadcast against each other
+        OUTPUT:
+           boolean array with the broadcast shape of (l,b)
+        HISTORY:
+           2026-10-18 - Written
+        """
+        return self._lbIndx(numpy.asarray(l,dtype='float64'),
+                            numpy.asarray(b,dtype='float64')) != -1
+
     def _lbIndx(self,l,b):
-        """Return the index in the _saledata array corresponding to this (l,b)"""
-        if l <= self._lmin or l >= self._lmax \
-                or b <= self._bmin or b >= self._bmax:
-            raise IndexError("Given (l,b) pair not within the region covered by the Sale et al. (2014) dust map")
-        return numpy.argmin((l-self._saledata['GLON'])**2./self._dl**2.\
-                                +(b-self._saledata['GLAT'])**2./self._db**2.)
+        """Return the index in the _saledata array corresponding to this (l,b); for array input, return an array of indices that is -1 outside of the region covered by the map"""
+        if not isinstance(l,numpy.ndarray) and not isinstance(b,numpy.ndarray):
+            if l <= self._lmin or l >= self._lmax \
+                    or b <= self._bmin or b >= self._bmax:
+                raise IndexError("Given (l,b) pair not within the region covered by the Sale et al. (2014) dust map")
+            return self._lbgrid[min(int((l-self._lmin)/self._dlgrid),
+                                    self._lbgrid.shape[0]-1),
+                                min(int((b-self._bmin)/self._dbgrid),
+                                    self._lbgrid.shape[1]-1)]
+        l, b= numpy.broadcast_arrays(l,b)
+        inmap= (l > self._lmin)*(l < self._lmax)\
+            *(b > self._bmin)*(b < self._bmax)
+        lIndx= numpy.clip(((numpy.where(inmap,l,self._lmin)-self._lmin)
+                           /self._dlgrid).astype('int64'),
+                          0,self._lbgrid.shape[0]-1)
+        bIndx= numpy.clip(((numpy.where(inmap,b,self._bmin)-self._bmin)
+                           /self._dbgrid).astype('int64'),
+                          0,self._lbgrid.shape[1]-1)
+        return numpy.where(inmap,self._lbgrid[lIndx,bIndx],-1)
+
+    def _setup_lbgrid(self):
+        """Set up the regular (l,b) grid at the resolution of the smallest cells that gives the index in the _saledata array of the cell that contains each grid cell; grid cells that are not covered by any cell get the index of the nearest cell"""
+        nl= int(round((self._lmax-self._lmin)/numpy.amin(self._dl)))
+        nb= int(round((self._bmax-self._bmin)/numpy.amin(self._db)))
+        self._dlgrid= (self._lmax-self._lmin)/nl
+        self._dbgrid= (self._bmax-self._bmin)/nb
+        self._lbgrid= numpy.full((nl,nb),-1,dtype='int64')
+        lIndx_min= numpy.round((numpy.asarray(self._saledata['lmin'])-self._lmin)
+                               /self._dlgrid).astype('int64')
+        bIndx_min= numpy.round((numpy.asarray(self._saledata['b_min'])-self._bmin)
+                               /self._dbgrid).astype('int64')
+        nlcell= numpy.round(numpy.asarray(self._dl)/self._dlgrid).astype('int64')
+        nbcell= numpy.round(numpy.asarray(self._db)/self._dbgrid).astype('int64')
+        rows= numpy.arange(len(self._saledata))
+        # Fill all cells of the same size at once
+        for tnl, tnb in set(zip(nlcell,nbcell)):
+            indx= (nlcell == tnl)*(nbcell == tnb)
+            for ii in range(tnl):
+                for jj in range(tnb):
+                    self._lbgrid[lIndx_min[indx]+ii,bIndx_min[indx]+jj]= rows[indx]
+        # Fill the holes with the nearest cell
+        holes= numpy.nonzero(self._lbgrid == -1)
+        glon= numpy.asarray(self._saledata['GLON'])
+        glat= numpy.asarray(self._saledata['GLAT'])
+        dl= numpy.asarray(self._dl)
+        db= numpy.asarray(self._db)
+        for lIndx, bIndx in zip(*holes):
+            l= self._lmin+(lIndx+0.5)*self._dlgrid
+            b= self._bmin+(bIndx+0.5)*self._dbgrid
+            self._lbgrid[lIndx,bIndx]=\
+                numpy.argmin((l-glon)**2./dl**2.+(b-glat)**2./db**2.)
+        return None
 
     @classmethod
     def download(cls, test=False):
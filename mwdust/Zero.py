@@ -4,7 +4,7 @@
 #
 ###############################################################################
 import numpy
-from mwdust.DustMap3D import DustMap3D
+from mwdust.DustMap3D import DustMap3D, _disk_fields
 _DEGTORAD= numpy.pi/180.
 class Zero(DustMap3D):
     """model with zero extinction"""
@@ -33,15 +33,17 @@ class Zero(DustMap3D):
         PURPOSE:
            evaluate the dust-map
         INPUT:
-           l- Galactic longitude (deg)
-           b- Galactic latitude (deg)
-           d- distance (kpc) can be array
+           l- Galactic longitude (deg) can be array
+           b- Galactic latitude (deg) can be array
+           d- distance (kpc) can be array; (l,b,d) are broadcast against each other
         OUTPUT:
            extinction E(B-V)
         HISTORY:
            2015-03-07 - Written - Bovy (IAS)
         """
-        return numpy.zeros_like(d)
+        return numpy.zeros(numpy.broadcast_shapes(numpy.shape(l),
+                                                  numpy.shape(b),
+                                                  numpy.shape(d)))
 
     def dust_vals_disk(self,lcen,bcen,dist,radius):
         """
@@ -57,7 +59,27 @@ class Zero(DustMap3D):
            (pixarea,extinction) - arrays of pixel-area in sq rad and extinction value
         HISTORY:
            2015-03-06 - Written - Bovy (IAS)
+           2026-10-18 - Evaluated with dust_vals_disks
         """
-        pixarea= (1.-numpy.cos(radius*_DEGTORAD))*2.*numpy.pi
-        return (numpy.array([pixarea]),numpy.zeros((1,len(dist))))
+        return self.dust_vals_disks(lcen,bcen,dist,radius)[1:]
 
+    def dust_vals_disks(self,lcen,bcen,dist,radius):
+        """
+        NAME:
+           dust_vals_disks
+        PURPOSE:
+           return the distribution of extinction within many small disks (e.g., the fields of a survey) as samples
+        INPUT:
+           lcen, bcen - Galactic longitude and latitude of the centers of the disks (deg), can be arrays
+           dist - distance in kpc, scalar or array of distances at which all disks are evaluated
+           radius - radius of the disks (deg), can be array; (lcen,bcen,radius) are broadcast against each other
+        OUTPUT:
+           (offsets,pixarea,extinction) - the pixels of disk i are offsets[i]:offsets[i+1] of the arrays of pixel-area in sq rad and extinction value (with a trailing axis of distances for array dist)
+        HISTORY:
+           2026-10-18 - Written
+        """
+        lcen,bcen,radius= _disk_fields(lcen,bcen,radius)
+        # A single pixel covering each disk
+        pixarea= (1.-numpy.cos(radius*_DEGTORAD))*2.*numpy.pi
+        return (numpy.arange(len(lcen)+1),pixarea,
+                numpy.zeros((len(lcen),)+numpy.shape(dist)))
@@ -6,6 +6,7 @@
 import os, os.path
 import numpy
 import h5py
+from mwdust.util.sidecar import read_dataset
 from mwdust.util.download import dust_dir, downloader
 from mwdust.HierarchicalHealpixMap import HierarchicalHealpixMap
 
@@ -14,7 +15,8 @@ _decapsdir = os.path.join(dust_dir, 'zucker25')
 
 class Zucker25(HierarchicalHealpixMap):
     """DECaPS 3D dust-reddening map (Zucker et al. 2025)"""
-    def __init__(self, filter=None, sf10=True, load_samples=False, interpk=1):
+    def __init__(self, filter=None, sf10=True, load_samples=False, interpk=1,
+                 precompute=False, mmap=False, cache=None):
         """
         NAME:
            __init__
@@ -23,8 +25,11 @@ class Zucker25(HierarchicalHealpixMap):
         INPUT:
            filter= filter to return the extinction in
            sf10= (True) if True, use the Schlafly & Finkbeiner calibrations
-           load_samples= (False) if True, also load the samples
+           load_samples= (False) if True, also load the samples (for substitute_sample)
            interpk= (1) interpolation order
+           precompute= (False) if True, precompute the interpolation coefficients for interpk > 1 ('disk': also store them in a file)
+           mmap= (False) if True, memory-map the mean extinction rather than reading it into memory
+           cache= (None) LRUCache of the splines for interpk > 1 (default: mwdust.util.cache.shared_cache())
         OUTPUT:
            object
         HISTORY:
@@ -37,8 +42,15 @@ class Zucker25(HierarchicalHealpixMap):
         fpath = os.path.join(_decapsdir, fname)
         if not os.path.exists(fpath):
             self.download(samples=load_samples)
+        self._fpath = fpath
+        # for evaluate_samples and the quantiles
+        self._samplesfile = os.path.join(_decapsdir, 'decaps_mean_and_samples.h5')
         self._f = h5py.File(fpath, 'r')
-        self._best_fit = self._f['/mean'][:, 0, :]
+        if mmap:
+            self._best_fit = read_dataset(fpath, '/mean', mmap=True,
+                                          index=(0, slice(None)), suffix='mean0')
+        else:
+            self._best_fit = self._f['/mean'][:, 0, :]
         p = self._f['/pixel_info']
         hpx = p['healpix_index'][:]
         nside_attr = int(p.attrs['nside'])
@@ -53,16 +65,16 @@ class Zucker25(HierarchicalHealpixMap):
         if load_samples:
             if 'samples' not in self._f:
                 raise RuntimeError("Requested load_samples=True, but 'samples' dataset not found.")
-            self._samples_dset = self._f['/samples']
-        else:
-            self._samples_dset = None
+            self._setup_samples(fpath, load=False)
         self._minnside = numpy.amin(self._pix_info['nside'])
         self._maxnside = numpy.amax(self._pix_info['nside'])
         nlevels = int(numpy.log2(self._maxnside // self._minnside)) + 1
         self._nsides = [self._maxnside // 2**ii for ii in range(nlevels)]
         self._indexArray = numpy.arange(len(self._pix_info['healpix_index']))
-        self._intps = numpy.zeros(len(self._pix_info['healpix_index']), dtype='object')
+        self._setup_splines(cache)
         self._interpk = interpk
+        self._setup_ppoly(precompute, fpath)
+        self._setup_lookup(fpath)
         return None
 
     def substitute_sample(self, samplenum):
@@ -81,9 +93,41 @@ class Zucker25(HierarchicalHealpixMap):
         if self._samples_dset is None:
             raise RuntimeError('No samples present in DECaPS file')
         self._best_fit = self._samples_dset[:, samplenum, :]
-        self._intps = numpy.zeros(len(self._pix_info['healpix_index']), dtype='object')
+        self._setup_splines(self._intps)
+        self._setup_ppoly(self._ppoly_coefs is not None)
         return None
 
+    def __getstate__(self):
+        """
+        NAME:
+           __getstate__
+        PURPOSE:
+           return the state of the map for pickling, without the open HDF5 file
+        INPUT:
+        OUTPUT:
+           state
+        HISTORY:
+           2026-10-18 - Written
+        """
+        state = HierarchicalHealpixMap.__getstate__(self)
+        state['_f'] = None
+        return state
+
+    def __setstate__(self, state):
+        """
+        NAME:
+           __setstate__
+        PURPOSE:
+           restore the state of the map from __getstate__, re-opening the HDF5 file
+        INPUT:
+           state - state from __getstate__
+        OUTPUT:
+        HISTORY:
+           2026-10-18 - Written
+        """
+        HierarchicalHealpixMap.__setstate__(self, state)
+        self._f = h5py.File(self._fpath, 'r')
+
     @classmethod
     def download(cls, samples=False, test=False):
         subdir = os.path.join(dust_dir, "decaps25")
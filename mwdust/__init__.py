@@ -9,6 +9,8 @@ from mwdust.Combined15 import Combined15
 from mwdust.Combined19 import Combined19
 from mwdust.Zucker25 import Zucker25
 from mwdust.Zero import Zero
+from mwdust.CompositeMap import CompositeMap
+from mwdust.FastGridMap import FastGridMap
 
 __version__ = "1.9.dev0"
 
@@ -0,0 +1,220 @@
+###############################################################################
+#
+#   mwdust.apply: evaluate a dust map for a catalog stored in an HDF5, FITS,
+#                 or CSV file, streaming the catalog through memory in chunks;
+#                 installed as the mwdust-apply console script
+#
+###############################################################################
+import sys
+import os, os.path
+import re
+import ast
+import time
+import inspect
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy
+import tqdm
+import mwdust
+from mwdust.DustMap3D import DustMap3D, _shared_state
+from mwdust.util.extCurves import aebv
+from mwdust.util.catalog import open_catalog, create_catalog
+
+def apply_to_catalog(dustmap,infile,outfile,lcol='l',bcol='b',dcol='d',
+                     filters=None,distance_unit='kpc',keep=None,
+                     chunk_size=1000000,workers=1,inpath=None,outpath=None,
+                     progress=True):
+    """
+    NAME:
+       apply_to_catalog
+    PURPOSE:
+       evaluate a dust map for all stars in a catalog file, reading the input columns and writing the output columns in chunks of rows, such that the memory use does not depend on the size of the catalog
+    INPUT:
+       dustmap - DustMap3D instance; if filters is None, evaluated for E(B-V) (the map's filter is ignored)
+       infile - name of the input catalog (HDF5, FITS, or CSV file)
+       outfile - name of the output catalog (HDF5, FITS, or CSV file), with the rows in the same order as the input catalog
+       lcol, bcol, dcol= ('l','b','d') names of the columns with Galactic longitude and latitude (deg) and distance
+       filters= (None) list of filters to return the extinction in as columns A_filter (e.g., A_2MASS_Ks for '2MASS Ks'); if None, return E(B-V) as column EBV
+       distance_unit= ('kpc') unit of the distance column: 'kpc', 'pc', or 'distmod' for a distance modulus
+       keep= (None) list of input columns to copy to the output catalog (e.g., a source ID)
+       chunk_size= (1000000) number of rows read, evaluated, and written at a time
+       workers= (1) number of processes used to evaluate each chunk (see DustMap3D.evaluate_parallel)
+       inpath, outpath= (None) HDF5: group with the columns or table dataset, FITS: extension of the input table
+       progress= (True) if True, show a progress bar with the throughput
+    OUTPUT:
+       (number of stars, time in s)
+    HISTORY:
+       2026-10-18 - Written
+    """
+    if keep is None: keep= []
+    if filters is None:
+        outcols= ['EBV']
+    else:
+        outcols= ['A_%s' % re.sub(r'\W+','_',f).strip('_') for f in filters]
+    reader= open_catalog(infile,path=inpath)
+    missing= [col for col in [lcol,bcol,dcol]+keep
+              if not col in reader.columns]
+    if len(missing) > 0:
+        reader.close()
+        raise KeyError(f"Columns {missing} not found in {infile}; available columns are {reader.columns}")
+    pool= ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    pbar= tqdm.tqdm(total=reader.nrows,unit='star',unit_scale=True,
+                    disable=not progress)
+    writer= None
+    start= time.perf_counter()
+    stack= contextlib.ExitStack()
+    try:
+        # Share the map with the processes once for all chunks
+        state= None if pool is None else stack.enter_context(\
+            _shared_state(dustmap))
+        for cstart in range(0,max(reader.nrows,1),chunk_size):
+            data= reader.read([lcol,bcol,dcol]+keep,chunk_size)
+            d= numpy.asarray(data[dcol],dtype='float64')
+            if distance_unit == 'pc':
+                d= d/1000.
+            elif distance_unit == 'distmod':
+                d= 10.**(d/5.-2.)
+            # All filters from a single evaluation of the map
+            if len(d) == 0:
+                ext= numpy.zeros((0,len(outcols)))
+            elif pool is None:
+                ext= dustmap(numpy.asarray(data[lcol],dtype='float64'),
+                             numpy.asarray(data[bcol],dtype='float64'),d,
+                             filters=filters)
+            else:
+                ext= dustmap.evaluate_parallel(\
+                    numpy.asarray(data[lcol],dtype='float64'),
+                    numpy.asarray(data[bcol],dtype='float64'),d,
+                    chunk_size=-(-len(d)//workers),executor=pool,
+                    _state=state,filters=filters)
+            if filters is None:
+                ext= ext[:,None]
+                if not dustmap._filter is None:
+                    ext= ext/aebv(dustmap._filter,
+                                  sf10=getattr(dustmap,'_sf10',True))
+            out= dict((col,data[col]) for col in keep)
+            for ii,col in enumerate(outcols):
+                out[col]= ext[:,ii]
+            if writer is None: # dtypes of strings are set by the first chunk
+                writer= create_catalog(outfile,[(col,out[col].dtype)
+                                                for col in keep+outcols],
+                                       reader.nrows,path=outpath)
+            writer.write(out)
+            pbar.update(len(d))
+    except BaseException:
+        if not writer is None:
+            try: # don't mask the original error
+                writer.close()
+            except Exception:
+                pass
+        raise
+    else:
+        writer.close()
+    finally:
+        pbar.close()
+        reader.close()
+        if not pool is None:
+            pool.shutdown()
+        stack.close()
+    return (reader.nrows,time.perf_counter()-start)
+
+def _map_kwarg(kwarg):
+    """Parse key=value, with value a Python literal or a string"""
+    key, _, value= kwarg.partition('=')
+    try:
+        value= ast.literal_eval(value)
+    except (ValueError,SyntaxError):
+        pass
+    return (key.strip(),value)
+
+def main(argv=None):
+    """
+    NAME:
+       main
+    PURPOSE:
+       command-line interface of apply_to_catalog (mwdust-apply)
+    INPUT:
+       argv= (None: sys.argv[1:]) command-line arguments
+    OUTPUT:
+       exit status
+    HISTORY:
+       2026-10-18 - Written
+    """
+    # CompositeMap needs map objects, which cannot be given as --map-kwarg
+    maps= sorted(name for name in dir(mwdust)
+                 if inspect.isclass(getattr(mwdust,name))
+                 and issubclass(getattr(mwdust,name),DustMap3D)
+                 and name != 'CompositeMap')
+    parser= argparse.ArgumentParser(prog='mwdust-apply',
+                                    description='Evaluate a dust map for all stars in an HDF5, FITS, or CSV catalog, streaming the catalog through memory in chunks')
+    parser.add_argument('infile',help='input catalog (.h5/.hdf5, .fits, or .csv)')
+    parser.add_argument('outfile',help='output catalog (.h5/.hdf5, .fits, or .csv), with the rows in the same order as the input catalog')
+    parser.add_argument('-m','--map',default='Combined19',choices=maps,
+                        help='dust map (default: Combined19)')
+    parser.add_argument('--map-kwarg',action='append',default=[],
+                        metavar='KEY=VALUE',
+                        help='keyword argument for the dust map (e.g., interpk=3); can be given multiple times')
+    parser.add_argument('-f','--filter',action='append',dest='filters',
+                        metavar='FILTER',
+                        help='filter to return the extinction in as column A_FILTER (e.g., "2MASS Ks"); can be given multiple times; default: E(B-V) as column EBV')
+    parser.add_argument('-l','--l-column',default='l',
+                        help='column with Galactic longitude (deg)')
+    parser.add_argument('-b','--b-column',default='b',
+                        help='column with Galactic latitude (deg)')
+    parser.add_argument('-d','--d-column',default='d',
+                        help='column with distance')
+    parser.add_argument('--distance-unit',default='kpc',
+                        choices=['kpc','pc','distmod'],
+                        help='unit of the distance column (default: kpc)')
+    parser.add_argument('-k','--keep',action='append',default=[],
+                        metavar='COLUMN',
+                        help='input column to copy to the output catalog; can be given multiple times')
+    parser.add_argument('-c','--chunk-size',type=int,default=1000000,
+                        help='number of rows processed at a time (default: 1000000)')
+    parser.add_argument('-w','--workers',type=int,default=1,
+                        help='number of processes (default: 1)')
+    parser.add_argument('--inpath',default=None,
+                        help='HDF5: group with the columns or table dataset (default: /); FITS: extension of the table (default: 1)')
+    parser.add_argument('--outpath',default=None,
+                        help='HDF5: group in which to write the columns (default: /)')
+    parser.add_argument('--overwrite',action='store_true',
+                        help='overwrite the output catalog if it exists')
+    parser.add_argument('-q','--quiet',action='store_true',
+                        help='do not show progress and throughput')
+    args= parser.parse_args(argv)
+    if os.path.exists(args.outfile) and not args.overwrite:
+        parser.error(f"{args.outfile} exists; use --overwrite to overwrite it")
+    inpath= args.inpath
+    if not inpath is None and inpath.isdigit(): inpath= int(inpath)
+    kwargs= dict(_map_kwarg(kwarg) for kwarg in args.map_kwarg)
+    cls= getattr(mwdust,args.map)
+    signature= inspect.signature(cls)
+    try:
+        signature.bind(**kwargs)
+    except TypeError as e:
+        required= [name for name, par in signature.parameters.items()
+                   if par.default is par.empty and not name in kwargs]
+        if len(required) > 0:
+            parser.error(f"{args.map} requires "
+                         +' '.join(f"--map-kwarg {name}=..."
+                                   for name in required))
+        parser.error(f"invalid --map-kwarg for {args.map}: {e}")
+    # Share the map between the processes by memory-mapping it
+    if args.workers > 1 and not 'mmap' in kwargs \
+            and 'mmap' in signature.parameters:
+        kwargs['mmap']= True
+    dustmap= cls(**kwargs)
+    nstar, runtime= apply_to_catalog(\
+        dustmap,args.infile,args.outfile,lcol=args.l_column,
+        bcol=args.b_column,dcol=args.d_column,filters=args.filters,
+        distance_unit=args.distance_unit,keep=args.keep,
+        chunk_size=args.chunk_size,workers=args.workers,inpath=inpath,
+        outpath=args.outpath,progress=not args.quiet)
+    if not args.quiet:
+        print(f"mwdust-apply: evaluated {args.map} for {nstar} stars in {runtime:.1f} s ({nstar/max(runtime,1e-9):.3g} stars/s)",
+              file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
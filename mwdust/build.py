@@ -0,0 +1,316 @@
+###############################################################################
+#
+#   mwdust.build: rebuild the combined maps (Combined15 and Combined19) from
+#                 Marshall et al. (2006), Green et al. (2015/2019), and
+#                 Drimmel et al. (2003), evaluating the component maps for
+#                 chunks of HEALPix pixels on a pool of processes, with each
+#                 finished chunk checkpointed such that an interrupted build
+#                 resumes where it left off
+#
+###############################################################################
+import sys
+import os, os.path
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy
+import h5py
+import tqdm
+from mwdust.util.healpix import pix2ang
+from mwdust.util.download import dust_dir
+_MARSHALL_NSIDE= 512 # nside of the Marshall part of the combined maps
+_DRIMMEL_MINNSIDE= 256 # lowest nside of the Drimmel part of the combined maps
+_GREEN_ROWS= 2**16 # number of Green pixels copied at a time
+# Green map and distance moduli of the combined maps
+_COMBINED= {
+    19: {'green':os.path.join(dust_dir,'green19','bayestar2019.h5'),
+         'distmods':numpy.linspace(4,18.875,120),
+         'outfile':os.path.join(dust_dir,'combined19','combine19.h5')},
+    15: {'green':os.path.join(dust_dir,'green15','dust-map-3d.h5'),
+         'distmods':numpy.linspace(4.,19.,31),
+         'outfile':os.path.join(dust_dir,'combined15','dust-map-3d.h5')}}
+_WORKER_MAPS= {} # component maps of a worker process
+
+def build_combined(version=19,outfile=None,n_workers=None,chunk_size=20000,
+                   checkpoint_dir=None,keep_checkpoints=False,progress=True):
+    """
+    NAME:
+       build_combined
+    PURPOSE:
+       build a combined map from Marshall et al. (2006) at NSIDE=512 in the inner Galactic plane, Green et al. (2015/2019) outside of that area, and Drimmel et al. (2003) at NSIDE >= 256 in the pixels not covered by either; pixels with NaN extinction are filled in with Drimmel et al. (2003)
+    INPUT:
+       version= (19) 19 for Combined19 (with Green et al. 2019) or 15 for Combined15 (with Green et al. 2015)
+       outfile= (None) name of the output HDF5 file (default: the map's file in DUST_DIR)
+       n_workers= (None) number of processes that evaluate the component maps (default: number of CPUs)
+       chunk_size= (20000) number of pixels evaluated at a time
+       checkpoint_dir= (None) directory in which finished chunks are stored, such that an interrupted build resumes (default: outfile+'.build')
+       keep_checkpoints= (False) if True, keep checkpoint_dir after the build is finished
+       progress= (True) if True, show a progress bar
+    OUTPUT:
+       name of the output file
+    HISTORY:
+       2026-10-18 - Written
+    """
+    if not version in _COMBINED:
+        raise ValueError(f"version should be one of {list(_COMBINED)}, not {version}")
+    greenfile= _COMBINED[version]['green']
+    distmods= _COMBINED[version]['distmods']
+    if outfile is None:
+        outfile= _COMBINED[version]['outfile']
+    if checkpoint_dir is None:
+        checkpoint_dir= outfile+'.build'
+    with h5py.File(greenfile,'r') as greendata:
+        pix_info= greendata['/pixel_info'][:]
+    mar_pix, green_keep, drim_nside, drim_pix= combined_pixels(pix_info)
+    green_nan= _green_nan_rows(greenfile,green_keep)
+    # Chunks of pixels to evaluate: (component, nside, pixels); Green pixels
+    # with NaN extinction are evaluated with Drimmel
+    chunks= []
+    nchunks= []
+    for component, nside, pix in \
+            [('marshall',numpy.full(len(mar_pix),_MARSHALL_NSIDE),mar_pix),
+             ('drimmel',pix_info['nside'][green_nan],
+              pix_info['healpix_index'][green_nan]),
+             ('drimmel',drim_nside,drim_pix)]:
+        nside= numpy.asarray(nside,dtype='int64')
+        pix= numpy.asarray(pix,dtype='int64')
+        nchunks.append(-(-len(pix)//chunk_size))
+        chunks.extend((component,nside[start:start+chunk_size],
+                       pix[start:start+chunk_size])
+                      for start in range(0,len(pix),chunk_size))
+    _setup_checkpoints(checkpoint_dir,chunks,distmods)
+    chunkfiles= [os.path.join(checkpoint_dir,'chunk%06i.npy' % ii)
+                 for ii in range(len(chunks))]
+    todo= [ii for ii in range(len(chunks)) if not os.path.exists(chunkfiles[ii])]
+    pbar= tqdm.tqdm(total=len(chunks),initial=len(chunks)-len(todo),
+                    unit='chunk',disable=not progress)
+    try:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures= [pool.submit(_build_chunk,chunks[ii][0],chunks[ii][1],
+                                  chunks[ii][2],distmods,chunkfiles[ii])
+                      for ii in todo]
+            for future in futures:
+                future.result()
+                pbar.update(1)
+    finally:
+        pbar.close()
+    _write_combined(outfile,greenfile,pix_info,mar_pix,green_keep,green_nan,
+                    drim_nside,drim_pix,chunkfiles,len(distmods),nchunks)
+    if not keep_checkpoints:
+        shutil.rmtree(checkpoint_dir)
+    return outfile
+
+def combined_pixels(pix_info):
+    """
+    NAME:
+       combined_pixels
+    PURPOSE:
+       determine the pixels of each of the components of a combined map: Marshall et al. (2006) pixels at NSIDE=512 whose center lies in the map's area, the Green et al. pixels whose center lies outside of that area, and Drimmel et al. (2003) pixels at each level from NSIDE=256 to the maximum NSIDE of the Green map that do not contain or lie within a Green pixel, do not lie within a Drimmel pixel at a lower level, and whose center lies outside of the Marshall area
+    INPUT:
+       pix_info - pixel_info of the Green map (structured array with fields nside and healpix_index)
+    OUTPUT:
+       (Marshall pixels, indices of the Green pixels that are kept, nside of the Drimmel pixels, Drimmel pixels); all pixels are in the NESTED scheme
+    HISTORY:
+       2026-10-18 - Written, vectorized from the original combine_dustmaps scripts
+    """
+    gnside= numpy.asarray(pix_info['nside'],dtype='int64')
+    gpix= numpy.asarray(pix_info['healpix_index'],dtype='int64')
+    nside_min= int(numpy.amin(gnside))
+    nside_max= int(numpy.amax(gnside))
+    # Marshall
+    mar_pix= numpy.arange(12*_MARSHALL_NSIDE**2)
+    mar_pix= mar_pix[_in_marshall(_MARSHALL_NSIDE,mar_pix)]
+    # Green
+    inMar= numpy.zeros(len(gpix),dtype='bool')
+    for nside in numpy.unique(gnside):
+        indx= gnside == nside
+        inMar[indx]= _in_marshall(nside,gpix[indx])
+    green_keep= numpy.nonzero(~inMar)[0]
+    # Drimmel; all Green pixels (also those in the Marshall area) count
+    green_levels= dict((nside,gpix[gnside == nside])
+                       for nside in 2**numpy.arange(int(numpy.log2(nside_min)),
+                                                    int(numpy.log2(nside_max))+1))
+    drim_levels= {}
+    for nside_drim in 2**numpy.arange(int(numpy.log2(_DRIMMEL_MINNSIDE)),
+                                      int(numpy.log2(nside_max))+1):
+        rmIndx= numpy.zeros(12*nside_drim**2,dtype='bool')
+        # Remove pixels that contain Green pixels at this or a higher level
+        for nside,tgpix in green_levels.items():
+            if nside >= nside_drim:
+                rmIndx[tgpix//(nside//nside_drim)**2]= True
+        # Remove pixels that lie within Green or Drimmel pixels at a lower level
+        tpix= numpy.arange(12*nside_drim**2)
+        for levels in [green_levels,drim_levels]:
+            for nside,tgpix in levels.items():
+                if nside < nside_drim:
+                    covered= numpy.zeros(12*nside**2,dtype='bool')
+                    covered[tgpix]= True
+                    rmIndx|= covered[tpix//(nside_drim//nside)**2]
+        # Remove pixels in the Marshall area
+        rmIndx|= _in_marshall(nside_drim,tpix)
+        drim_levels[nside_drim]= tpix[~rmIndx]
+    drim_nside= numpy.concatenate([numpy.full(len(tpix),nside,dtype='int64')
+                                   for nside,tpix in drim_levels.items()])
+    drim_pix= numpy.concatenate(list(drim_levels.values()))
+    return (mar_pix,green_keep,drim_nside,drim_pix)
+
+def _in_marshall(nside,pix):
+    """Whether the centers of the NESTED pixels pix lie within the area of the Marshall et al. (2006) map"""
+    theta, phi= pix2ang(int(nside),pix,nest=True)
+    return ((phi < numpy.radians(100.125))+(phi > numpy.radians(259.875)))\
+        *(numpy.fabs(numpy.pi/2.-theta) < numpy.radians(10.125))
+
+def _green_nan_rows(greenfile,green_keep):
+    """Indices of the kept Green pixels with NaN extinction"""
+    with h5py.File(greenfile,'r') as greendata:
+        best_fit= greendata['/best_fit']
+        nan= numpy.concatenate([numpy.isnan(best_fit[start:start+_GREEN_ROWS,0])
+                                for start in range(0,len(best_fit),_GREEN_ROWS)])
+    return green_keep[nan[green_keep]]
+
+def _setup_checkpoints(checkpoint_dir,chunks,distmods):
+    """Create the checkpoint directory, removing checkpoints of a different build"""
+    sha= hashlib.sha1(numpy.ascontiguousarray(distmods).tobytes())
+    for component, nside, pix in chunks:
+        sha.update(component.encode())
+        sha.update(numpy.ascontiguousarray(nside,dtype='int64').tobytes())
+        sha.update(numpy.ascontiguousarray(pix,dtype='int64').tobytes())
+    planfile= os.path.join(checkpoint_dir,'plan.txt')
+    if os.path.exists(planfile):
+        with open(planfile,'r') as f:
+            if f.read() == sha.hexdigest():
+                return None
+    if os.path.exists(checkpoint_dir):
+        shutil.rmtree(checkpoint_dir)
+    os.makedirs(checkpoint_dir)
+    with open(planfile,'w') as f:
+        f.write(sha.hexdigest())
+    return None
+
+def _component_map(component):
+    """Return the component map of a worker process, set up once"""
+    if not component in _WORKER_MAPS:
+        if component == 'marshall':
+            from mwdust import Marshall06
+            _WORKER_MAPS[component]= Marshall06()
+        else:
+            from mwdust import Drimmel03
+            _WORKER_MAPS[component]= Drimmel03()
+    return _WORKER_MAPS[component]
+
+def _build_chunk(component,nside,pix,distmods,chunkfile):
+    """Evaluate the component map for a chunk of pixels at distmods, filling in pixels with NaN extinction with Drimmel, and store the result in chunkfile"""
+    ll= numpy.empty(len(pix))
+    bb= numpy.empty(len(pix))
+    for tnside in numpy.unique(nside):
+        indx= nside == tnside
+        theta, phi= pix2ang(int(tnside),pix[indx],nest=True)
+        ll[indx]= numpy.degrees(phi)
+        bb[indx]= 90.-numpy.degrees(theta)
+    dists= 10.**(distmods/5.-2.)
+    if component == 'marshall':
+        out= _component_map('marshall')(numpy.where(ll > 180.,ll-360.,ll),bb,
+                                        dists,grid=True)
+        nan= numpy.isnan(out[:,0])
+        if numpy.any(nan):
+            out[nan]= _component_map('drimmel')(ll[nan],bb[nan],dists,
+                                                grid=True)
+    else:
+        out= _component_map('drimmel')(ll,bb,dists,grid=True)
+    tmpfile= '%s.%i.tmp.npy' % (chunkfile[:-4],os.getpid())
+    numpy.save(tmpfile,out.astype('float64'))
+    os.replace(tmpfile,chunkfile)
+    return None
+
+def _write_combined(outfile,greenfile,pix_info,mar_pix,green_keep,green_nan,
+                    drim_nside,drim_pix,chunkfiles,ndistmods,nchunks):
+    """Write the combined map from the Green map and the evaluated chunks (nchunks: number of Marshall, Green NaN, and Drimmel chunks)"""
+    nmar_chunks, ngreen_chunks, _= nchunks
+    nout= len(mar_pix)+len(green_keep)+len(drim_pix)
+    tmpfile= '%s.%i.tmp' % (outfile,os.getpid())
+    with h5py.File(tmpfile,'w') as combdata, \
+            h5py.File(greenfile,'r') as greendata:
+        pixinfo= numpy.empty(nout,dtype=[('nside','uint32'),
+                                         ('healpix_index','uint64')])
+        pixinfo['nside'][:len(mar_pix)]= _MARSHALL_NSIDE
+        pixinfo['healpix_index'][:len(mar_pix)]= mar_pix
+        pixinfo['nside'][len(mar_pix):len(mar_pix)+len(green_keep)]=\
+            pix_info['nside'][green_keep]
+        pixinfo['healpix_index'][len(mar_pix):len(mar_pix)+len(green_keep)]=\
+            pix_info['healpix_index'][green_keep]
+        pixinfo['nside'][len(mar_pix)+len(green_keep):]= drim_nside
+        pixinfo['healpix_index'][len(mar_pix)+len(green_keep):]= drim_pix
+        combdata.create_dataset('pixel_info',data=pixinfo)
+        out= combdata.create_dataset('best_fit',shape=(nout,ndistmods),
+                                     dtype='float64')
+        # Marshall
+        start= 0
+        for chunkfile in chunkfiles[:nmar_chunks]:
+            vals= numpy.load(chunkfile)
+            out[start:start+len(vals)]= vals
+            start+= len(vals)
+        # Green, with pixels with NaN extinction replaced by Drimmel
+        if ngreen_chunks > 0:
+            nanvals= numpy.concatenate(\
+                [numpy.load(chunkfile) for chunkfile
+                 in chunkfiles[nmar_chunks:nmar_chunks+ngreen_chunks]])
+        best_fit= greendata['/best_fit']
+        for gstart in range(0,len(best_fit),_GREEN_ROWS):
+            gend= min(gstart+_GREEN_ROWS,len(best_fit))
+            keep= green_keep[(green_keep >= gstart)*(green_keep < gend)]
+            vals= best_fit[gstart:gend][keep-gstart].astype('float64')
+            if ngreen_chunks > 0:
+                nan= numpy.isin(keep,green_nan)
+                vals[nan]= nanvals[numpy.searchsorted(green_nan,keep[nan])]
+            out[start:start+len(vals)]= vals
+            start+= len(vals)
+        # Drimmel
+        for chunkfile in chunkfiles[nmar_chunks+ngreen_chunks:]:
+            vals= numpy.load(chunkfile)
+            out[start:start+len(vals)]= vals
+            start+= len(vals)
+    os.replace(tmpfile,outfile)
+    return None
+
+def main(argv=None):
+    """
+    NAME:
+       main
+    PURPOSE:
+       command-line interface of build_combined (mwdust-build)
+    INPUT:
+       argv= (None: sys.argv[1:]) command-line arguments
+    OUTPUT:
+       exit status
+    HISTORY:
+       2026-10-18 - Written
+    """
+    parser= argparse.ArgumentParser(prog='mwdust-build',
+                                    description='Build the combined map of Marshall et al. (2006), Green et al. (2015/2019), and Drimmel et al. (2003); an interrupted build resumes from its checkpoints when run again')
+    parser.add_argument('map',choices=['Combined15','Combined19'],
+                        help='combined map to build')
+    parser.add_argument('-o','--outfile',default=None,
+                        help="output HDF5 file (default: the map's file in DUST_DIR)")
+    parser.add_argument('-w','--workers',type=int,default=None,
+                        help='number of processes (default: number of CPUs)')
+    parser.add_argument('-c','--chunk-size',type=int,default=20000,
+                        help='number of pixels evaluated at a time (default: 20000)')
+    parser.add_argument('--checkpoint-dir',default=None,
+                        help='directory for the checkpoints (default: OUTFILE.build)')
+    parser.add_argument('--keep-checkpoints',action='store_true',
+                        help='keep the checkpoints after the build is finished')
+    parser.add_argument('-q','--quiet',action='store_true',
+                        help='do not show progress')
+    args= parser.parse_args(argv)
+    outfile= build_combined(version=int(args.map[-2:]),outfile=args.outfile,
+                            n_workers=args.workers,chunk_size=args.chunk_size,
+                            checkpoint_dir=args.checkpoint_dir,
+                            keep_checkpoints=args.keep_checkpoints,
+                            progress=not args.quiet)
+    if not args.quiet:
+        print(f"mwdust-build: wrote {outfile}",file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
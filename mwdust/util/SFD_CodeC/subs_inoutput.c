@@ -12,6 +12,22 @@
  */
 FILE  *  pFILEfits[IO_FOPEN_MAX];
 
+/* Lock that protects handing out and releasing the file pointers above, such
+ * that files can be opened and closed concurrently from several threads;
+ * each file pointer is only used by the thread that opened it.
+ */
+#ifdef _WIN32
+#include <windows.h>
+static SRWLOCK ioLock = SRWLOCK_INIT;
+#define IO_LOCK() AcquireSRWLockExclusive(&ioLock)
+#define IO_UNLOCK() ReleaseSRWLockExclusive(&ioLock)
+#else
+#include <pthread.h>
+static pthread_mutex_t ioLock = PTHREAD_MUTEX_INITIALIZER;
+#define IO_LOCK() pthread_mutex_lock(&ioLock)
+#define IO_UNLOCK() pthread_mutex_unlock(&ioLock)
+#endif
+
 /******************************************************************************/
 /* Return IO_GOOD if a file exists, and IO_BAD otherwise.
  */
@@ -36,7 +52,7 @@ int inoutput_free_file_pointer_()
 {
    int retval = 0;
  
-   while(retval <= IO_FOPEN_MAX && pFILEfits[retval] != NULL) retval++;
+   while(retval < IO_FOPEN_MAX && pFILEfits[retval] != NULL) retval++;
    return retval;
 }
 
@@ -58,6 +74,7 @@ int inoutput_open_file
    int      retval;
    char     tempName[IO_FORTRAN_FL];
 
+   IO_LOCK();
    if ((*pFilenum = inoutput_free_file_pointer_()) == IO_FOPEN_MAX) {
       printf("ERROR: Too many open files\n");
       retval = IO_BAD;
@@ -88,6 +105,7 @@ int inoutput_open_file
          }
       }
    }
+   IO_UNLOCK();
 
    return retval;
 }
@@ -102,12 +120,14 @@ int inoutput_close_file
 {
    int      retval;
 
+   IO_LOCK();
    if (fclose(pFILEfits[filenum]) == EOF) {
       retval = IO_BAD;
    } else {
       retval = IO_GOOD;
    }
    pFILEfits[filenum] = NULL;
+   IO_UNLOCK();
 
    return retval;
 }
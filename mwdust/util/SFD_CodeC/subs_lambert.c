@@ -78,8 +78,7 @@ void DECLARE(fort_lambert_getval)
    long     iGal;
    long     nGal;
    float *  pTemp;
-   int * err;
-   tqdm_callback_type cb;
+   int      err = 0;
 
    /* Truncate the Fortran-passed strings with a null,
     * in case they are padded with spaces */
@@ -107,11 +106,12 @@ void DECLARE(fort_lambert_getval)
    }
 
    pTemp = lambert_getval(pFileN, pFileS, nGal, pGall, pGalb,
-    qInterp, qNoloop, qVerbose, err, cb);
+    qInterp, qNoloop, qVerbose, &err, NULL);
 
    /* Copy results into Fortran-passed location for "pOutput",
     * assuming that memory has already been allocated */
    for (iGal=0; iGal < nGal; iGal++) pOutput[iGal] = pTemp[iGal];
+   ccvector_free_(pTemp);
 }
 #endif
 
@@ -119,6 +119,8 @@ void DECLARE(fort_lambert_getval)
 /* Read one value at a time from NGP+SGP polar projections.
  * Set qInterp=1 to interpolate, or =0 otherwise.
  * Set qVerbose=1 to for verbose output, or =0 otherwise.
+ * The output array is allocated here and has to be freed by the caller
+ * (with ccvector_free_); see lambert_getval_into for the arguments.
  */
 EXPORT float * lambert_getval
   (char  *  pFileN,
@@ -131,6 +133,42 @@ EXPORT float * lambert_getval
    int      qVerbose,
    int *err,
    tqdm_callback_type cb)
+{
+   float *  pOutput;
+
+   pOutput = ccvector_build_(nGal);
+   *err = lambert_getval_into(pFileN, pFileS, nGal, pGall, pGalb,
+    qInterp, qNoloop, qVerbose, 1, pOutput, cb);
+   return pOutput;
+}
+
+/******************************************************************************/
+/* Read one value at a time from NGP+SGP polar projections into the
+ * caller-allocated array pOutput of length nGal.
+ * Set qInterp=1 to interpolate, or =0 otherwise.
+ * Set qVerbose=1 to for verbose output, or =0 otherwise.
+ * Set qSigint=1 to catch CTRL-C (SIGINT) while running, or =0 otherwise;
+ * this should only be done when called from the main thread, such that
+ * concurrent calls from other threads do not touch the signal handlers.
+ * If cb is not NULL, it is called with the number of points done in
+ * batches of LAMBERT_CB_BATCH points.
+ * The FITS files are only accessed through file numbers that are handed out
+ * under a lock (see inoutput_open_file), so this function can be called
+ * concurrently from several threads.
+ * Return 0 on success and -10 if interrupted by CTRL-C.
+ */
+EXPORT int lambert_getval_into
+  (char  *  pFileN,
+   char  *  pFileS,
+   long     nGal,
+   float *  pGall,
+   float *  pGalb,
+   int      qInterp,
+   int      qNoloop,
+   int      qVerbose,
+   int      qSigint,
+   float *  pOutput,
+   tqdm_callback_type cb)
 {
    int      iloop;
    int      iGal;
@@ -154,7 +192,6 @@ EXPORT float * lambert_getval
    float    yr;
    float    pWeight[4];
    float    mapval;
-   float *  pOutput;
    float *  pDX = NULL;
    float *  pDY = NULL;
 
@@ -164,22 +201,29 @@ EXPORT float * lambert_getval
    DSIZE *  pNaxis;
    char  *  pFileIn = NULL;
    HSIZE    nHead;
-   uchar *  pHead;
+   uchar *  pHead = NULL;
+   long     nDone = 0;
+   int      err = 0;
+   #ifndef _WIN32
+      struct sigaction action;
+      struct sigaction oldaction;
+   #endif
 
    // Handle KeyboardInterrupt gracefully
+   if (qSigint) {
+      interrupted = 0;
    #ifndef _WIN32
-      struct sigaction action;
       memset(&action, 0, sizeof(struct sigaction));
       action.sa_handler = handle_sigint;
-      sigaction(SIGINT, &action, NULL);
+      sigaction(SIGINT, &action, &oldaction);
    #else
       if (SetConsoleCtrlHandler(CtrlHandler, TRUE))
       {}
    #endif
+   }
 
    /* Allocate output data array */
    pNS = ccivector_build_(nGal);
-   pOutput = ccvector_build_(nGal);
 
    /* Decide if each point should be read from the NGP or SGP projection */
    for (iGal=0; iGal < nGal; iGal++)
@@ -192,17 +236,22 @@ EXPORT float * lambert_getval
          qRead = 0;
 
          /* Loop through each data point */
-         for (iGal=0; iGal < nGal; iGal++) {
-                        if (interrupted)
+         for (iGal=0; iGal < nGal && err == 0; iGal++) {
+            if (qSigint && interrupted)
             {
-               *err = -10;
+               err = -10;
                break;
             }
             if (pNS[iGal] == iloop) {
-               if ( cb ) cb(1);  // tqdm update for 1 star
+               // tqdm update, in batches to limit calls into Python
+               if ( cb && ++nDone == LAMBERT_CB_BATCH ) {
+                  cb(nDone);
+                  nDone = 0;
+               }
                /* Read FITS header for this projection if not yet read */
                if (qRead == 0) {
                   if (iloop == 0) pFileIn = pFileN; else pFileIn = pFileS;
+                  fits_dispose_array_(&pHead);
                   fits_read_file_fits_header_only_(pFileIn, &nHead, &pHead);
                   qRead = 1;
                }
@@ -277,13 +326,9 @@ EXPORT float * lambert_getval
 
                }  /* -- END NEAREST PIXEL OR INTERPOLATE -- */
             }
-         // Back to default handler
-         #ifndef _WIN32
-                     action.sa_handler = SIG_DFL;
-                     sigaction(SIGINT, &action, NULL);
-         #endif
          }
       }
+      if ( cb && nDone > 0 ) cb(nDone);
 
    } else {  /* READ FULL IMAGE */
 
@@ -312,6 +357,7 @@ EXPORT float * lambert_getval
 
             /* Read FITS header for this projection */
             if (iloop == 0) pFileIn = pFileN; else pFileIn = pFileS;
+            fits_dispose_array_(&pHead);
             fits_read_file_fits_header_only_(pFileIn, &nHead, &pHead);
 
             if (qInterp == 0) {  /* NEAREST PIXELS */
@@ -405,6 +451,7 @@ EXPORT float * lambert_getval
                ccfree_((void **)&pSubimg);
 
             }  /* -- END NEAREST PIXEL OR INTERPOLATE -- */
+            if ( cb ) cb(nIndx);
          }
 
       }
@@ -422,10 +469,19 @@ EXPORT float * lambert_getval
       (Moved outside previous brace by Chris Stoughton 19-Jan-1999) */
    fits_dispose_array_(&pHead);
 
-   /* Deallocate output data array */
+   /* Deallocate hemisphere array */
    ccivector_free_(pNS);
 
-   return pOutput;
+   // Back to the previous handler
+   if (qSigint) {
+   #ifndef _WIN32
+      sigaction(SIGINT, &oldaction, NULL);
+   #else
+      SetConsoleCtrlHandler(CtrlHandler, FALSE);
+   #endif
+   }
+
+   return err;
 }
 
 /******************************************************************************/
@@ -7,7 +7,10 @@
 PyMODINIT_FUNC PyInit_sfd_c(void);
 #endif
 
-typedef void (*tqdm_callback_type)();
+typedef void (*tqdm_callback_type)(long);
+
+/* Number of points between calls of the progress callback */
+#define LAMBERT_CB_BATCH 1000
 
 // msvc unhappy about this section
 #ifndef _WIN32
@@ -34,6 +37,18 @@ float * lambert_getval
    int   *  err,
    tqdm_callback_type cb);
 #endif
+int lambert_getval_into
+  (char  *  pFileN,
+   char  *  pFileS,
+   long     nGal,
+   float *  pGall,
+   float *  pGalb,
+   int      qInterp,
+   int      qNoloop,
+   int      qVerbose,
+   int      qSigint,
+   float *  pOutput,
+   tqdm_callback_type cb);
 void lambert_lb2fpix
   (float    gall,   /* Galactic longitude */
    float    galb,   /* Galactic latitude */
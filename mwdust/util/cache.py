@@ -0,0 +1,198 @@
+###############################################################################
+#
+#   mwdust.util.cache: bounded least-recently-used cache of objects computed
+#                      on demand (e.g., the per-pixel splines of the HEALPix
+#                      maps for interpk > 1), with a budget in entries and/or
+#                      bytes, shared by all maps by default
+#
+###############################################################################
+import sys
+import threading
+from collections import OrderedDict
+_DEFAULT_MAXBYTES= 2**28 # default byte budget of the shared cache
+class LRUCache(object):
+    """bounded least-recently-used cache with a budget in entries and/or bytes and counters of hits, misses, and evictions"""
+    def __init__(self,maxentries=None,maxbytes=_DEFAULT_MAXBYTES,
+                 sizeof=None):
+        """
+        NAME:
+           __init__
+        PURPOSE:
+           initialize a least-recently-used cache
+        INPUT:
+           maxentries= (None) maximum number of entries (None: no limit)
+           maxbytes= (2**28) maximum approximate size in bytes of the entries (None: no limit)
+           sizeof= (None) function that returns the approximate size in bytes of a value (default: the size of the numpy arrays held by the value and its attributes)
+        OUTPUT:
+           object
+        HISTORY:
+           2026-10-18 - Written
+        """
+        self._maxentries= maxentries
+        self._maxbytes= maxbytes
+        self._sizeof= sizeof
+        self._entries= OrderedDict()
+        self._lock= threading.Lock()
+        self._nbytes= 0
+        self.hits= 0
+        self.misses= 0
+        self.evictions= 0
+        return None
+
+    def get(self,key,default=None):
+        """
+        NAME:
+           get
+        PURPOSE:
+           return the value of a key and mark it as most recently used
+        INPUT:
+           key - key, a tuple (owner,...) where owner identifies the map that the entry belongs to
+           default= (None) value to return for keys that are not in the cache
+        OUTPUT:
+           value or default
+        HISTORY:
+           2026-10-18 - Written
+        """
+        with self._lock:
+            try:
+                value= self._entries[key][0]
+            except KeyError:
+                self.misses+= 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits+= 1
+            return value
+
+    def put(self,key,value):
+        """
+        NAME:
+           put
+        PURPOSE:
+           add a value to the cache, evicting the least recently used entries that do not fit in the budget
+        INPUT:
+           key - key, a tuple (owner,...) where owner identifies the map that the entry belongs to
+           value - value
+        OUTPUT:
+           (none)
+        HISTORY:
+           2026-10-18 - Written
+        """
+        nbytes= (_sizeof if self._sizeof is None else self._sizeof)(value)
+        with self._lock:
+            if key in self._entries:
+                self._nbytes-= self._entries.pop(key)[1]
+            self._entries[key]= (value,nbytes)
+            self._nbytes+= nbytes
+            self._evict()
+        return None
+
+    def clear(self,owner=None):
+        """
+        NAME:
+           clear
+        PURPOSE:
+           remove all entries, or the entries of one owner, from the cache (not counted as evictions)
+        INPUT:
+           owner= (None) if given, only remove the entries whose key starts with owner
+        OUTPUT:
+           (none)
+        HISTORY:
+           2026-10-18 - Written
+        """
+        with self._lock:
+            if owner is None:
+                self._entries.clear()
+                self._nbytes= 0
+                return None
+            for key in [key for key in self._entries if key[0] == owner]:
+                self._nbytes-= self._entries.pop(key)[1]
+        return None
+
+    def resize(self,maxentries=None,maxbytes=None):
+        """
+        NAME:
+           resize
+        PURPOSE:
+           change the budget of the cache, evicting the least recently used entries that no longer fit
+        INPUT:
+           maxentries= (None) maximum number of entries (None: no limit)
+           maxbytes= (None) maximum approximate size in bytes of the entries (None: no limit)
+        OUTPUT:
+           (none)
+        HISTORY:
+           2026-10-18 - Written
+        """
+        with self._lock:
+            self._maxentries= maxentries
+            self._maxbytes= maxbytes
+            self._evict()
+        return None
+
+    def stats(self):
+        """
+        NAME:
+           stats
+        PURPOSE:
+           return the counters and the size of the cache
+        INPUT:
+        OUTPUT:
+           dictionary with hits, misses, evictions, entries, nbytes, maxentries, and maxbytes
+        HISTORY:
+           2026-10-18 - Written
+        """
+        with self._lock:
+            return {'hits':self.hits,'misses':self.misses,
+                    'evictions':self.evictions,'entries':len(self._entries),
+                    'nbytes':self._nbytes,'maxentries':self._maxentries,
+                    'maxbytes':self._maxbytes}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self,key):
+        return key in self._entries
+
+    def __getstate__(self):
+        """Pickle the budget of the cache, but not its entries or lock"""
+        return {'maxentries':self._maxentries,'maxbytes':self._maxbytes,
+                'sizeof':self._sizeof}
+
+    def __setstate__(self,state):
+        self.__init__(**state)
+
+    def _evict(self):
+        """Evict the least recently used entries until the cache is within its budget (with the lock held)"""
+        while len(self._entries) > 0 \
+                and ((self._maxentries is not None
+                      and len(self._entries) > self._maxentries)
+                     or (self._maxbytes is not None
+                         and self._nbytes > self._maxbytes)):
+            self._nbytes-= self._entries.popitem(last=False)[1][1]
+            self.evictions+= 1
+        return None
+
+def _sizeof(value):
+    """Approximate size in bytes of a value: the size of the value (for numpy arrays including their data, if they own it), its attributes, and the tuples and lists among these"""
+    if isinstance(value,(tuple,list)):
+        return sys.getsizeof(value)+sum(_sizeof(item) for item in value)
+    if isinstance(value,type): # classes are shared
+        return 0
+    if hasattr(value,'__dict__'):
+        return sys.getsizeof(value)+sum(_sizeof(item)
+                                        for item in vars(value).values())
+    return sys.getsizeof(value)
+
+_SHARED_CACHE= LRUCache()
+def shared_cache():
+    """
+    NAME:
+       shared_cache
+    PURPOSE:
+       return the cache that is shared by all maps that are not given their own cache (its budget can be changed with resize)
+    INPUT:
+    OUTPUT:
+       LRUCache instance
+    HISTORY:
+       2026-10-18 - Written
+    """
+    return _SHARED_CACHE
@@ -0,0 +1,288 @@
+###############################################################################
+#
+#   mwdust.util.catalog: read and write columns of HDF5, FITS, and CSV
+#                        catalogs in chunks of rows, such that catalogs that
+#                        do not fit in memory can be streamed through
+#
+###############################################################################
+import os, os.path
+import csv
+import itertools
+import numpy
+import h5py
+_FITS_BLOCK= 2880
+# FITS binary-table formats of numpy types
+_FITS_FORMATS= {'f4':'E','f8':'D','i2':'I','i4':'J','i8':'K','u1':'B',
+                'b1':'L'}
+
+def catalog_format(filename):
+    """
+    NAME:
+       catalog_format
+    PURPOSE:
+       determine the format of a catalog file from its extension
+    INPUT:
+       filename - name of the file
+    OUTPUT:
+       'hdf5', 'fits', or 'csv'
+    HISTORY:
+       2026-10-18 - Written
+    """
+    ext= os.path.splitext(filename.lower().replace('.gz',''))[1]
+    if ext in ['.h5','.hdf5','.hdf']:
+        return 'hdf5'
+    elif ext in ['.fits','.fit','.fts']:
+        return 'fits'
+    elif ext in ['.csv','.txt','.dat']:
+        return 'csv'
+    raise ValueError(f"Format of catalog {filename} could not be determined from its extension; should be .h5/.hdf5, .fits, or .csv")
+
+def open_catalog(filename,path=None):
+    """
+    NAME:
+       open_catalog
+    PURPOSE:
+       open a catalog for reading its columns in chunks of rows
+    INPUT:
+       filename - name of the file
+       path= (None) HDF5: group that contains the columns as 1D datasets or table (compound) dataset (default: '/'); FITS: extension with the binary table (default: 1)
+    OUTPUT:
+       reader with attributes columns (list of names) and nrows, and methods read(names,nrows) that returns a dict with the next nrows rows of the columns names and close()
+    HISTORY:
+       2026-10-18 - Written
+    """
+    fmt= catalog_format(filename)
+    if fmt == 'hdf5':
+        return _HDF5Reader(filename,path='/' if path is None else path)
+    elif fmt == 'fits':
+        return _FITSReader(filename,ext=1 if path is None else path)
+    else:
+        return _CSVReader(filename)
+
+def create_catalog(filename,dtypes,nrows,path=None):
+    """
+    NAME:
+       create_catalog
+    PURPOSE:
+       create a catalog to which the rows of its columns are written in chunks
+    INPUT:
+       filename - name of the file
+       dtypes - list of (name,dtype) of the columns
+       nrows - total number of rows that will be written
+       path= (None) HDF5 only: group in which the columns are created as 1D datasets (default: '/')
+    OUTPUT:
+       writer with methods write(data) that writes a dict with the next rows of all columns and close()
+    HISTORY:
+       2026-10-18 - Written
+    """
+    fmt= catalog_format(filename)
+    if fmt == 'hdf5':
+        return _HDF5Writer(filename,dtypes,nrows,path='/' if path is None
+                           else path)
+    elif fmt == 'fits':
+        return _FITSWriter(filename,dtypes,nrows)
+    else:
+        return _CSVWriter(filename,dtypes)
+
+class _HDF5Reader(object):
+    """Columns stored as 1D datasets in a group or as fields of a table"""
+    def __init__(self,filename,path='/'):
+        self._file= h5py.File(filename,'r')
+        obj= self._file[path]
+        if isinstance(obj,h5py.Group):
+            self._table= None
+            self._dsets= dict((name,dset) for name,dset in obj.items()
+                              if isinstance(dset,h5py.Dataset)
+                              and dset.ndim == 1)
+            self.columns= list(self._dsets.keys())
+            self.nrows= len(next(iter(self._dsets.values())))\
+                if len(self._dsets) > 0 else 0
+        else:
+            self._table= obj
+            self.columns= list(obj.dtype.names)
+            self.nrows= len(obj)
+        self._start= 0
+
+    def read(self,names,nrows):
+        end= min(self._start+nrows,self.nrows)
+        if self._table is None:
+            out= dict((name,self._dsets[name][self._start:end])
+                      for name in names)
+        else:
+            rows= self._table[self._start:end]
+            out= dict((name,rows[name]) for name in names)
+        self._start= end
+        return out
+
+    def close(self):
+        self._file.close()
+
+class _FITSReader(object):
+    """Columns of a memory-mapped FITS binary table"""
+    def __init__(self,filename,ext=1):
+        from astropy.io import fits
+        self._hdulist= fits.open(filename,memmap=True)
+        self._data= self._hdulist[ext].data
+        self.columns= list(self._data.columns.names)
+        self.nrows= len(self._data)
+        self._start= 0
+
+    def read(self,names,nrows):
+        end= min(self._start+nrows,self.nrows)
+        rows= self._data[self._start:end]
+        out= dict((name,numpy.array(rows[name])) for name in names)
+        self._start= end
+        return out
+
+    def close(self):
+        del self._data
+        self._hdulist.close()
+
+class _CSVReader(object):
+    """Columns of a CSV file with a header line, read sequentially; blank lines are skipped"""
+    def __init__(self,filename):
+        # Count the rows without parsing the file
+        with open(filename,'rb') as csvfile:
+            self.nrows= sum(1 for line in csvfile if not line.isspace())
+        if self.nrows == 0:
+            raise ValueError(f"CSV file {filename} is empty; it needs a header line with the names of the columns")
+        self._file= open(filename,'r',newline='')
+        self._reader= (row for row in csv.reader(self._file)
+                       if any(field.strip() for field in row))
+        self.columns= [name.strip() for name in next(self._reader)]
+        self.nrows-= 1
+        self._dtypes= {}
+
+    def read(self,names,nrows):
+        indx= [self.columns.index(name) for name in names]
+        rows= list(itertools.islice(self._reader,nrows))
+        out= {}
+        for name,ii in zip(names,indx):
+            vals= numpy.array([row[ii] for row in rows])
+            # The type of each column is widened (int -> float -> str) when
+            # a chunk does not parse as the type of the previous chunks
+            self._dtypes[name]= _csv_dtype(vals,self._dtypes.get(name,
+                                                                 numpy.int64))
+            out[name]= vals.astype(self._dtypes[name]) \
+                if self._dtypes[name] != 'str' else vals
+        return out
+
+    def close(self):
+        self._file.close()
+
+def _csv_dtype(vals,narrowest=numpy.int64):
+    """Narrowest type, starting from narrowest, as which all of vals parse"""
+    dtypes= [numpy.int64,numpy.float64,'str']
+    for dtype in dtypes[dtypes.index(narrowest):-1]:
+        try:
+            vals.astype(dtype)
+        except ValueError:
+            continue
+        else:
+            return dtype
+    return 'str'
+
+class _HDF5Writer(object):
+    """Columns written as 1D datasets in a group"""
+    def __init__(self,filename,dtypes,nrows,path='/'):
+        self._file= h5py.File(filename,'w')
+        group= self._file.require_group(path)
+        self._dsets= dict((name,group.create_dataset(name,shape=(nrows,),
+                                                     dtype=_bytes_dtype(dtype)))
+                          for name,dtype in dtypes)
+        self._start= 0
+
+    def write(self,data):
+        n= len(next(iter(data.values())))
+        for name,dset in self._dsets.items():
+            dset[self._start:self._start+n]= _to_bytes(data[name],dset.dtype,
+                                                       name)
+        self._start+= n
+
+    def close(self):
+        self._file.close()
+
+class _FITSWriter(object):
+    """Columns written as a FITS binary table, directly writing the rows as
+    they come in after a header that declares the total number of rows"""
+    def __init__(self,filename,dtypes,nrows):
+        from astropy.io import fits
+        cols= []
+        rowtype= []
+        for name,dtype in dtypes:
+            dtype= _bytes_dtype(dtype)
+            if dtype.kind == 'S':
+                cols.append(fits.Column(name=name,
+                                        format='%iA' % dtype.itemsize))
+                rowtype.append((name,dtype))
+                continue
+            if not dtype.str[1:] in _FITS_FORMATS:
+                dtype= numpy.dtype('f8') if dtype.kind == 'f' \
+                    else numpy.dtype('i8')
+            cols.append(fits.Column(name=name,
+                                    format=_FITS_FORMATS[dtype.str[1:]]))
+            rowtype.append((name,'S1' if dtype.kind == 'b'
+                            else dtype.newbyteorder('>')))
+        header= fits.BinTableHDU.from_columns(cols,nrows=0).header
+        header['NAXIS2']= nrows
+        self._rowtype= numpy.dtype(rowtype)
+        self._nrows= nrows
+        self._nwritten= 0
+        self._file= open(filename,'wb')
+        self._file.write(fits.PrimaryHDU().header.tostring().encode('ascii'))
+        self._file.write(header.tostring().encode('ascii'))
+
+    def write(self,data):
+        n= len(next(iter(data.values())))
+        rows= numpy.empty(n,dtype=self._rowtype)
+        for name in self._rowtype.names:
+            if self._rowtype[name] == numpy.dtype('S1'): # logical
+                rows[name]= numpy.where(data[name],b'T',b'F')
+            else:
+                rows[name]= _to_bytes(data[name],self._rowtype[name],name)
+        self._file.write(rows.tobytes())
+        self._nwritten+= n
+
+    def close(self):
+        if self._nwritten != self._nrows:
+            self._file.close()
+            raise RuntimeError(f"Wrote {self._nwritten} rows to a FITS table declared to have {self._nrows} rows")
+        nbytes= self._nrows*self._rowtype.itemsize
+        self._file.write(b'\0'*((-nbytes) % _FITS_BLOCK))
+        self._file.close()
+
+class _CSVWriter(object):
+    """Columns written as a CSV file with a header line"""
+    def __init__(self,filename,dtypes):
+        self._names= [name for name,dtype in dtypes]
+        self._file= open(filename,'w',newline='')
+        self._writer= csv.writer(self._file)
+        self._writer.writerow(self._names)
+
+    def write(self,data):
+        cols= [numpy.char.decode(data[name]).tolist()
+               if data[name].dtype.kind == 'S' else data[name].tolist()
+               for name in self._names]
+        self._writer.writerows(zip(*cols))
+
+    def close(self):
+        self._file.close()
+
+def _bytes_dtype(dtype):
+    """Unicode strings are stored as bytes in HDF5 and FITS files"""
+    dtype= numpy.dtype(dtype)
+    if dtype.kind == 'U':
+        return numpy.dtype('S%i' % (dtype.itemsize//4))
+    return dtype
+
+def _to_bytes(arr,dtype,name):
+    """Convert unicode strings to bytes, checking that the values fit in the
+    column, whose type and width are set by the first chunk"""
+    if (dtype.kind in 'iub' and arr.dtype.kind in 'fUS') \
+            or (dtype.kind == 'f' and arr.dtype.kind in 'US'):
+        raise ValueError(f"Column {name} has {arr.dtype} values that do not fit the {dtype} of the first chunk; increase the chunk size")
+    if arr.dtype.kind == 'U':
+        arr= numpy.char.encode(arr)
+    if arr.dtype.kind == 'S' and arr.dtype.itemsize > dtype.itemsize:
+        raise ValueError(f"Strings in column {name} are longer than the {dtype.itemsize} characters of the first chunk; increase the chunk size")
+    return arr
@@ -63,3 +63,22 @@ def aebv(filter,sf10=True):
         if not filter in avebv:
             raise ValueError("Requested filter is not supported")
         return avebv[filter]
+
+def aebv_array(filters,sf10=True):
+    """
+    NAME:
+       aebv_array
+    PURPOSE:
+       return A_filter / E(B-V) for an array of filters
+    INPUT:
+       filters - array (or list) of filters to use (e.g., ['2MASS J','2MASS H','2MASS Ks'])
+       sf10= (True) if True, use the values from Schlafly & Finkbeiner 2010, which use an updated extinction law, source spectrum, and recalibrated SFD map
+    OUTPUT:
+       array of A_filter / E(B-V) with the same shape as filters
+    HISTORY:
+       2026-10-18 - Written
+    """
+    filters= numpy.asarray(filters)
+    ufilters, indx= numpy.unique(filters,return_inverse=True)
+    return numpy.array([aebv(str(filter),sf10=sf10) for filter in ufilters])\
+        [indx].reshape(filters.shape)
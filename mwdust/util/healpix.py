@@ -31,6 +31,19 @@ if _lib is None:
             break
 if _lib is None:
     raise IOError("healpix/C module not found")
+_lib.free_array.argtypes = [ctypes.c_void_p]
+_lib.free_array.restype = None
+
+
+def _as_array(res, count, dtype):
+    """
+    Utility function
+
+    Copy the array of length count returned by a C function into a numpy array and free it
+    """
+    result = np.ctypeslib.as_array(res, shape=(count,)).astype(dtype)
+    _lib.free_array(res)
+    return result
 
 
 # useful utilities: http://graphics.stanford.edu/~seander/bithacks.html#DetermineIfPowerOf2
@@ -168,7 +181,7 @@ def ang2pix(nside, theta, phi, nest=False, lonlat=False):
         phi.astype(np.float64, order="C", copy=False),
         ctypes.c_long(nstars),
     )
-    result = np.fromiter(res, dtype=np.int32, count=nstars)
+    result = _as_array(res, nstars, np.int64)
 
     # Reset input arrays
     if f_cont[0]:
@@ -218,7 +231,7 @@ def ang2vec(theta, phi, lonlat=False):
         phi.astype(np.float64, order="C", copy=False),
         ctypes.c_long(nstars),
     )
-    result = np.fromiter(res, dtype=np.float64, count=nstars * 3)
+    result = _as_array(res, nstars * 3, np.float64)
     result = result.reshape(nstars, 3)
 
     # Reset input arrays
@@ -272,7 +285,7 @@ def pix2vec(nside, ipix, nest=False):
         npix,
         ipix.astype(np.int64, order="C", copy=False),
     )
-    result = np.fromiter(res, dtype=np.float64, count=npix * 3)
+    result = _as_array(res, npix * 3, np.float64)
     result = result.reshape(npix, 3)
 
     # Reset input arrays
@@ -326,7 +339,7 @@ def pix2ang(nside, ipix, nest=False, lonlat=False):
         npix,
         ipix.astype(np.int64, order="C", copy=False),
     )
-    result = np.fromiter(res, dtype=np.float64, count=npix * 2)
+    result = _as_array(res, npix * 2, np.float64)
     result = result.reshape(npix, 2)
 
     # Reset input arrays
@@ -341,6 +354,119 @@ def pix2ang(nside, ipix, nest=False, lonlat=False):
         return theta, phi
 
 
+def query_disc(nside, vec, radius, inclusive=False, nest=False):
+    """
+    NAME:
+        query_disc
+    PURPOSE:
+        Pixels within a disc (or within each of several discs)
+    INPUT:
+        nside - a integer of healpix map nside
+        vec - unit 3-vector of the center of the disc, or array (N,3) of the centers of N discs
+        radius - radius of the disc(s) (rad), can be array for N discs
+        inclusive - if True, return all pixels that overlap with the disc (and possibly a few more), if False, the pixels whose centers lie within the disc
+        nest - is using NEST?
+    OUTPUT:
+        ipix - sorted pixel numbers within the disc; for an array of discs, (offsets, ipix) with the pixels of disc i in ipix[offsets[i]:offsets[i+1]]
+    HISTORY:
+        2026-10-18 - Written
+    """
+    check_nside(nside, nest=nest)
+    vec = np.asarray(vec, dtype=np.float64)
+    single = vec.ndim == 1
+    vec = np.atleast_2d(vec)
+    radius = np.broadcast_to(np.asarray(radius, dtype=np.float64), (len(vec),))
+    if not nest:
+        raise NotImplementedError("RING scheme is not avaliable for now")
+    ndisc = len(vec)
+    theta = np.require(
+        np.arccos(np.clip(vec[:, 2] / np.linalg.norm(vec, axis=1), -1.0, 1.0)),
+        dtype=np.float64,
+        requirements=["C", "W"],
+    )
+    phi = np.require(
+        np.arctan2(vec[:, 1], vec[:, 0]), dtype=np.float64, requirements=["C", "W"]
+    )
+    radius = np.require(radius, dtype=np.float64, requirements=["C", "W"])
+    counts = np.zeros(ndisc, dtype=np.int64)
+
+    query_disc_c = _lib.query_disc_nest
+    ndarrayFlags = ("C_CONTIGUOUS", "WRITEABLE")
+    # (int nside, double *theta, double *phi, double *radius, int ndisc,
+    #  int inclusive, long long int *counts)
+    query_disc_c.argtypes = [
+        ctypes.c_int,
+        ndpointer(dtype=np.float64, flags=ndarrayFlags),
+        ndpointer(dtype=np.float64, flags=ndarrayFlags),
+        ndpointer(dtype=np.float64, flags=ndarrayFlags),
+        ctypes.c_int,
+        ctypes.c_int,
+        ndpointer(dtype=np.int64, flags=ndarrayFlags),
+    ]
+    query_disc_c.restype = ctypes.POINTER(ctypes.c_longlong)
+    res = query_disc_c(nside, theta, phi, radius, ndisc, int(inclusive), counts)
+    ipix = _as_array(res, max(np.sum(counts), 1), np.int64)[: np.sum(counts)]
+    if single:
+        return ipix
+    return np.concatenate(([0], np.cumsum(counts))), ipix
+
+
+def query_polygon(nside, vertices, inclusive=False, nest=False):
+    """
+    NAME:
+        query_polygon
+    PURPOSE:
+        Pixels within a convex polygon (or within each of several convex polygons)
+    INPUT:
+        nside - a integer of healpix map nside
+        vertices - array (nvertex,3) of the unit 3-vectors of the vertices of the polygon, or a list of N such arrays (or an array (N,nvertex,3)) for N polygons
+        inclusive - if True, return all pixels that overlap with the polygon (and possibly a few more), if False, the pixels whose centers lie within the polygon
+        nest - is using NEST?
+    OUTPUT:
+        ipix - sorted pixel numbers within the polygon; for several polygons, (offsets, ipix) with the pixels of polygon i in ipix[offsets[i]:offsets[i+1]]
+    HISTORY:
+        2026-10-18 - Written
+    """
+    check_nside(nside, nest=nest)
+    single = np.ndim(vertices[0]) == 1
+    if single:
+        vertices = [vertices]
+    vertices = [
+        np.asarray(vert, dtype=np.float64).reshape((-1, 3)) for vert in vertices
+    ]
+    if not nest:
+        raise NotImplementedError("RING scheme is not avaliable for now")
+    if np.any([len(vert) < 3 for vert in vertices]):
+        raise ValueError("Polygons need to have at least three vertices")
+    npoly = len(vertices)
+    nverts = np.array([len(vert) for vert in vertices], dtype=np.int32)
+    vertices = np.require(
+        np.concatenate(vertices) if npoly > 0 else np.zeros((1, 3)),
+        dtype=np.float64,
+        requirements=["C", "W"],
+    )
+    counts = np.zeros(npoly, dtype=np.int64)
+
+    query_polygon_c = _lib.query_polygon_nest
+    ndarrayFlags = ("C_CONTIGUOUS", "WRITEABLE")
+    # (int nside, double *vertices, int *nverts, int npoly, int inclusive,
+    #  long long int *counts)
+    query_polygon_c.argtypes = [
+        ctypes.c_int,
+        ndpointer(dtype=np.float64, flags=ndarrayFlags),
+        ndpointer(dtype=np.int32, flags=ndarrayFlags),
+        ctypes.c_int,
+        ctypes.c_int,
+        ndpointer(dtype=np.int64, flags=ndarrayFlags),
+    ]
+    query_polygon_c.restype = ctypes.POINTER(ctypes.c_longlong)
+    res = query_polygon_c(nside, vertices, nverts, npoly, int(inclusive), counts)
+    ipix = _as_array(res, max(np.sum(counts), 1), np.int64)[: np.sum(counts)]
+    if single:
+        return ipix
+    return np.concatenate(([0], np.cumsum(counts))), ipix
+
+
 def nside2pixarea(nside):
     """
     NAME:
@@ -321,3 +321,243 @@ EXPORT double *pix2ang_nest(int nside, int npix, long long int *ipix)
     }
     return ang;
 }
+
+EXPORT void free_array(void *ptr)
+{
+    // free arrays returned by the functions above
+    free(ptr);
+}
+
+// center of a NEST pixel as a unit vector, for any pixel number
+void pix2vec_nest_single(int nside, long long int ipix, double *xyz)
+{
+    long long int f;
+    long long int x;
+    long long int y;
+    double t;
+    double u;
+    double z;
+    double a;
+    f = ipix / ((long long int)nside * nside);
+    bit_decombine(ipix % ((long long int)nside * nside), &x, &y);
+    fxy2tu(nside, f, x, y, &t, &u);
+    tu2za(t, u, &z, &a);
+    za2vec(z, a, xyz);
+}
+
+// maximum angular distance between the center and the corners of any pixel
+// (same as Healpix_Base::max_pixrad)
+double max_pixrad(int nside)
+{
+    double va[3];
+    double vb[3];
+    double t1;
+    double cosang;
+    za2vec(2. / 3., M_PI / (4. * nside), va);
+    t1 = 1. - 1. / nside;
+    t1 *= t1;
+    za2vec(1. - t1 / 3., 0., vb);
+    cosang = va[0] * vb[0] + va[1] * vb[1] + va[2] * vb[2];
+    return acos(clip(cosang, -1., 1.));
+}
+
+// growable array of pixel numbers
+typedef struct
+{
+    long long int *pix;
+    long long int n;
+    long long int size;
+} pixlist;
+
+void pixlist_append(pixlist *list, long long int ipix)
+{
+    if (list->n == list->size)
+    {
+        list->size = list->size > 0 ? 2 * list->size : 1024;
+        list->pix = (long long int *)realloc(list->pix, (size_t)(sizeof(long long int) * list->size));
+    }
+    list->pix[list->n++] = ipix;
+}
+
+// Find the NEST pixels at nside of a region by descending from the base
+// pixels, keeping only the children of pixels that are within max_pixrad of
+// the region at each level; inside(xyz, margin, data) should return whether
+// the point xyz is within the angular distance margin of the region (for
+// negative margin: whether the point is inside the region by more than
+// -margin). Pixels that are inside the region by more than max_pixrad are
+// marked (as -pix-1) and all of their children are kept without testing
+// them. The pixels are appended to out in increasing order.
+void query_nest(int nside, int inclusive, int (*inside)(double *, double, void *), void *data, pixlist *out)
+{
+    pixlist cand = {NULL, 0, 0};
+    pixlist next = {NULL, 0, 0};
+    pixlist swap;
+    long long int ii;
+    long long int ipix;
+    int jj;
+    int tnside;
+    double xyz[3];
+    double margin;
+    for (ii = 0; ii < 12; ii++)
+        pixlist_append(&cand, ii);
+    for (tnside = 1;; tnside *= 2)
+    {
+        if (tnside == nside)
+        {
+            // pixel centers within the region (exclusive) or pixels that
+            // overlap the region, approximately (inclusive)
+            margin = inclusive ? max_pixrad(tnside) : 0.;
+            for (ii = 0; ii < cand.n; ii++)
+            {
+                if (cand.pix[ii] < 0)
+                {
+                    pixlist_append(out, -cand.pix[ii] - 1);
+                    continue;
+                }
+                pix2vec_nest_single(tnside, cand.pix[ii], xyz);
+                if (inside(xyz, margin, data))
+                    pixlist_append(out, cand.pix[ii]);
+            }
+            break;
+        }
+        // the children of a pixel have their centers within the pixel, so a
+        // slightly enlarged max_pixrad is a conservative bound
+        margin = 1.01 * max_pixrad(tnside);
+        next.n = 0;
+        for (ii = 0; ii < cand.n; ii++)
+        {
+            if (cand.pix[ii] < 0)
+            {
+                ipix = -cand.pix[ii] - 1;
+                for (jj = 0; jj < 4; jj++)
+                    pixlist_append(&next, -(4 * ipix + jj) - 1);
+                continue;
+            }
+            pix2vec_nest_single(tnside, cand.pix[ii], xyz);
+            if (!inside(xyz, margin, data))
+                continue;
+            if (inside(xyz, -margin, data))
+                for (jj = 0; jj < 4; jj++)
+                    pixlist_append(&next, -(4 * cand.pix[ii] + jj) - 1);
+            else
+                for (jj = 0; jj < 4; jj++)
+                    pixlist_append(&next, 4 * cand.pix[ii] + jj);
+        }
+        swap = cand;
+        cand = next;
+        next = swap;
+    }
+    free(cand.pix);
+    free(next.pix);
+}
+
+typedef struct
+{
+    double vec[3];
+    double radius;
+} disc;
+
+int inside_disc(double *xyz, double margin, void *data)
+{
+    disc *d = (disc *)data;
+    double cosang;
+    if (d->radius + margin >= M_PI)
+        return 1;
+    if (d->radius + margin < 0.)
+        return 0;
+    cosang = xyz[0] * d->vec[0] + xyz[1] * d->vec[1] + xyz[2] * d->vec[2];
+    return cosang >= cos(d->radius + margin);
+}
+
+// pixels within each of ndisc discs with centers (theta,phi) and radius
+// (rad), concatenated; the number of pixels of each disc is returned in counts
+EXPORT long long int *query_disc_nest(int nside, double *theta, double *phi, double *radius, int ndisc, int inclusive, long long int *counts)
+{
+    pixlist out = {NULL, 0, 0};
+    disc d;
+    long long int nstart;
+    int idisc;
+    for (idisc = 0; idisc < ndisc; idisc++)
+    {
+        za2vec(cos(theta[idisc]), phi[idisc], d.vec);
+        d.radius = radius[idisc];
+        nstart = out.n;
+        query_nest(nside, inclusive, inside_disc, &d, &out);
+        counts[idisc] = out.n - nstart;
+    }
+    if (out.pix == NULL) // always return an array that can be freed
+        out.pix = (long long int *)malloc(sizeof(long long int));
+    return out.pix;
+}
+
+typedef struct
+{
+    int nvert;
+    double *normals; // unit normals of the great circles of the edges, pointing inwards
+} polygon;
+
+int inside_polygon(double *xyz, double margin, void *data)
+{
+    polygon *p = (polygon *)data;
+    int ivert;
+    double sinmargin;
+    double *n;
+    sinmargin = sin(clip(margin, -M_PI / 2., M_PI / 2.));
+    for (ivert = 0; ivert < p->nvert; ivert++)
+    {
+        n = p->normals + 3 * ivert;
+        if (xyz[0] * n[0] + xyz[1] * n[1] + xyz[2] * n[2] < -sinmargin)
+            return 0;
+    }
+    return 1;
+}
+
+// pixels within each of npoly convex polygons, with nverts[ipoly] vertices
+// (unit vectors) each in vertices, concatenated; the number of pixels of each
+// polygon is returned in counts
+EXPORT long long int *query_polygon_nest(int nside, double *vertices, int *nverts, int npoly, int inclusive, long long int *counts)
+{
+    pixlist out = {NULL, 0, 0};
+    polygon p;
+    long long int nstart;
+    int ipoly;
+    int ivert;
+    int jj;
+    double *va;
+    double *vb;
+    double *n;
+    double norm;
+    double orient;
+    for (ipoly = 0; ipoly < npoly; ipoly++)
+    {
+        p.nvert = nverts[ipoly];
+        p.normals = (double *)malloc((size_t)(sizeof(double) * 3 * p.nvert));
+        for (ivert = 0; ivert < p.nvert; ivert++)
+        {
+            va = vertices + 3 * ivert;
+            vb = vertices + 3 * ((ivert + 1) % p.nvert);
+            n = p.normals + 3 * ivert;
+            n[0] = va[1] * vb[2] - va[2] * vb[1];
+            n[1] = va[2] * vb[0] - va[0] * vb[2];
+            n[2] = va[0] * vb[1] - va[1] * vb[0];
+            norm = sqrt(n[0] * n[0] + n[1] * n[1] + n[2] * n[2]);
+            for (jj = 0; jj < 3; jj++)
+                n[jj] /= norm;
+        }
+        // orient the normals towards the inside, using the vertex after the
+        // first edge
+        vb = vertices + 3 * (2 % p.nvert);
+        orient = p.normals[0] * vb[0] + p.normals[1] * vb[1] + p.normals[2] * vb[2];
+        if (orient < 0)
+            for (jj = 0; jj < 3 * p.nvert; jj++)
+                p.normals[jj] = -p.normals[jj];
+        nstart = out.n;
+        query_nest(nside, inclusive, inside_polygon, &p, &out);
+        counts[ipoly] = out.n - nstart;
+        free(p.normals);
+        vertices += 3 * p.nvert;
+    }
+    if (out.pix == NULL)
+        out.pix = (long long int *)malloc(sizeof(long long int));
+    return out.pix;
+}
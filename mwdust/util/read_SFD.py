@@ -7,6 +7,7 @@ import os, os.path
 from pathlib import Path
 import numpy
 import platform
+import threading
 import tqdm
 from mwdust.util.download import dust_dir
 
@@ -38,12 +39,34 @@ if _lib is None:
 if _lib is None:
     raise IOError("SFD/C module not found")
 
+# Set up the C code once, such that read_SFD_EBV does not modify the shared
+# function objects and can be called from several threads at once; ctypes
+# releases the GIL while the C code runs
+_ndarrayFlags = ("C_CONTIGUOUS", "WRITEABLE")
+_pbar_func_ctype = ctypes.CFUNCTYPE(None, ctypes.c_long)
+_lib.lambert_getval_into.argtypes = [
+    ctypes.c_char_p,
+    ctypes.c_char_p,
+    ctypes.c_long,
+    ndpointer(dtype=numpy.float32, flags=_ndarrayFlags),
+    ndpointer(dtype=numpy.float32, flags=_ndarrayFlags),
+    ctypes.c_int,
+    ctypes.c_int,
+    ctypes.c_int,
+    ctypes.c_int,
+    ndpointer(dtype=numpy.float32, flags=_ndarrayFlags),
+    _pbar_func_ctype,
+]
+_lib.lambert_getval_into.restype = ctypes.c_int
+
 # MAP path names
 ebvFileN = os.path.join(dust_dir, "maps", "SFD_dust_4096_ngp.fits")
 ebvFileS = os.path.join(dust_dir, "maps", "SFD_dust_4096_sgp.fits")
 
 
-def read_SFD_EBV(glon, glat, interp=True, noloop=False, verbose=False, pbar=True):
+def read_SFD_EBV(
+    glon, glat, interp=True, noloop=False, verbose=False, pbar=True, inmemory=False
+):
     """
     NAME:
        read_SFD_EBV
@@ -56,10 +79,12 @@ def read_SFD_EBV(glon, glat, interp=True, noloop=False, verbose=False, pbar=True
        noloop= (False) if True, don't loop through the glons
        verbose= (False) if True, be verbose
        pbar= (True) if True, show progress bar
+       inmemory= (False) if True, evaluate the maps in Python using maps that are memory-mapped once per process rather than read by the C code for every call (noloop, verbose, and pbar are then ignored)
     OUTPUT:
        array of E(B-V) from Schlegel, Finkbeiner, & Davis (1998)
     HISTORY:
        2013-11-23 - Written - Bovy (IAS)
+       2026-10-18 - Set up the C code once at import to allow concurrent calls from several threads
     """
     # Parse input
     if isinstance(glon, (int, float, numpy.float32, numpy.float64)):
@@ -67,36 +92,8 @@ def read_SFD_EBV(glon, glat, interp=True, noloop=False, verbose=False, pbar=True
     if isinstance(glat, (int, float, numpy.float32, numpy.float64)):
         glat = numpy.array([glat])
 
-    nstar = len(glon)
-    if nstar > 1 and pbar:
-        pbar = tqdm.tqdm(total=nstar, leave=False)
-        pbar_func_ctype = ctypes.CFUNCTYPE(None)
-        pbar_c = pbar_func_ctype(pbar.update)
-    else:  # pragma: no cover
-        pbar_c = None
-
-    # Set up the C code
-    ndarrayFlags = ("C_CONTIGUOUS", "WRITEABLE")
-    evalFunc = _lib.lambert_getval
-    evalFunc.argtypes = [
-        ctypes.c_char_p,
-        ctypes.c_char_p,
-        ctypes.c_long,
-        ndpointer(dtype=numpy.float32, flags=ndarrayFlags),
-        ndpointer(dtype=numpy.float32, flags=ndarrayFlags),
-        ctypes.c_int,
-        ctypes.c_int,
-        ctypes.c_int,
-        ndpointer(dtype=numpy.int32, flags=ndarrayFlags),
-        ctypes.c_void_p,
-    ]
-    evalFunc.restype = ctypes.POINTER(ctypes.c_float)
-
-    # Array requirements, first store old order
-    f_cont = [glon.flags["F_CONTIGUOUS"], glat.flags["F_CONTIGUOUS"]]
-    glon = numpy.require(glon, dtype=numpy.float64, requirements=["C", "W"])
-    glat = numpy.require(glat, dtype=numpy.float64, requirements=["C", "W"])
-    err = numpy.require(0, dtype=numpy.int32, requirements=["C", "W"])
+    if inmemory:
+        return _read_SFD_EBV_inmemory(glon, glat, interp=interp)
 
     # Check that the filename isn't too long for the SFD code
     if len(ebvFileN.encode("ascii")) >= 120 or len(ebvFileS.encode("ascii")) >= 120:
@@ -104,26 +101,154 @@ def read_SFD_EBV(glon, glat, interp=True, noloop=False, verbose=False, pbar=True
             f"The path of the file that contains the SFD dust maps is too long ({len(ebvFileN.encode('ascii'))}); please shorten the path of DUST_DIR"
         )
 
-    res = evalFunc(
-        ctypes.c_char_p(ebvFileN.encode("ascii")),
-        ctypes.c_char_p(ebvFileS.encode("ascii")),
-        ctypes.c_long(nstar),
-        glon.astype(numpy.float32, order="C", copy=False),
-        glat.astype(numpy.float32, order="C", copy=False),
-        ctypes.c_int(interp),
-        ctypes.c_int(noloop),
-        ctypes.c_int(verbose),
-        err,
+    nstar = len(glon)
+    if nstar > 1 and pbar:
+        pbar = tqdm.tqdm(total=nstar, leave=False)
+        pbar_c = _pbar_func_ctype(pbar.update)
+    else:  # pragma: no cover
+        pbar = None
+        pbar_c = _pbar_func_ctype()  # NULL pointer: no callback
+
+    glon = numpy.require(glon, dtype=numpy.float32, requirements=["C", "W"])
+    glat = numpy.require(glat, dtype=numpy.float32, requirements=["C", "W"])
+    result = numpy.empty(nstar, dtype=numpy.float32)
+
+    # Only catch CTRL-C in the main thread, where Python handles signals
+    err = _lib.lambert_getval_into(
+        ebvFileN.encode("ascii"),
+        ebvFileS.encode("ascii"),
+        nstar,
+        glon,
+        glat,
+        interp,
+        noloop,
+        verbose,
+        threading.current_thread() is threading.main_thread(),
+        result,
         pbar_c,
     )
-    if numpy.any(err == -10):
+    if pbar is not None:
+        pbar.close()
+    if err == -10:
         raise KeyboardInterrupt("Interrupted by CTRL-C (SIGINT)")
-    result = numpy.fromiter(res, dtype=float, count=nstar)
+    return result.astype(numpy.float64)
 
-    # Reset input arrays
-    if f_cont[0]:
-        glon = numpy.asfortranarray(glon)
-    if f_cont[1]:
-        glat = numpy.asfortranarray(glat)
 
-    return result
+# Maps loaded by load_SFD_maps, once per process
+_SFD_MAPS = {}
+_SFD_MAPS_LOCK = threading.Lock()
+
+
+def load_SFD_maps():
+    """
+    NAME:
+       load_SFD_maps
+    PURPOSE:
+       memory-map the NGP and SGP Lambert projections of the Schlegel, Finkbeiner, & Davis (1998) maps, only once per process
+    INPUT:
+       (none)
+    OUTPUT:
+       list of (image,nsgp,scale,crpix1,crval1,crpix2,crval2) for NGP and SGP
+    HISTORY:
+       2026-10-18 - Written
+    """
+    out = []
+    for filename in [ebvFileN, ebvFileS]:
+        with _SFD_MAPS_LOCK:
+            if filename not in _SFD_MAPS:
+                _SFD_MAPS[filename] = _load_SFD_map(filename)
+        out.append(_SFD_MAPS[filename])
+    return out
+
+
+def _load_SFD_map(filename):
+    """
+    Utility function
+
+    Memory-map a Lambert projection of the SFD maps and read its header values as floats, like in the C code
+    """
+    from astropy.io import fits
+
+    with fits.open(filename, memmap=True) as hdulist:
+        header = hdulist[0].header
+        if (
+            header["CTYPE1"].strip() != "LAMBERT--X"
+            or header["CTYPE2"].strip() != "LAMBERT--Y"
+        ):
+            raise NotImplementedError(
+                f"Projection of {filename} not supported for inmemory=True"
+            )
+        return (
+            hdulist[0].data,
+            int(header["LAM_NSGP"]),
+            numpy.float32(header["LAM_SCAL"]),
+            numpy.float32(header["CRPIX1"]),
+            numpy.float32(header["CRVAL1"]),
+            numpy.float32(header["CRPIX2"]),
+            numpy.float32(header["CRVAL2"]),
+        )
+
+
+def _lambert_lb2fpix(gall, galb, nsgp, scale, crpix1, crval1, crpix2, crval2):
+    """
+    Utility function
+
+    Vectorized version of lambert_lb2fpix in the C code for the Lambert projection, reproducing its single-precision arithmetic
+    """
+    dradeg = 180.0 / 3.1415926534
+    rho = numpy.sqrt(1.0 - nsgp * numpy.sin(galb.astype(numpy.float64) / dradeg))
+    lrad = (gall.astype(numpy.float64) / dradeg).astype(numpy.float32)
+    xr = (rho * numpy.cos(lrad.astype(numpy.float64)) * scale).astype(numpy.float32)
+    yr = (-nsgp * rho * numpy.sin(lrad.astype(numpy.float64)) * scale).astype(
+        numpy.float32
+    )
+    x = ((xr + crpix1 - crval1).astype(numpy.float64) - 1.0).astype(numpy.float32)
+    y = ((yr + crpix2 - crval2).astype(numpy.float64) - 1.0).astype(numpy.float32)
+    return (x, y)
+
+
+def _read_SFD_EBV_inmemory(glon, glat, interp=True):
+    """
+    Utility function
+
+    Evaluate the memory-mapped SFD maps, giving the same result as the C code's lambert_getval
+    """
+    glon = numpy.asarray(glon, dtype=numpy.float32)
+    glat = numpy.asarray(glat, dtype=numpy.float32)
+    out = numpy.empty(glon.shape, dtype=numpy.float32)
+    isngp = glat >= 0.0
+    for indx, (image, *pars) in zip([isngp, ~isngp], load_SFD_maps()):
+        if not numpy.any(indx):
+            continue
+        xr, yr = _lambert_lb2fpix(glon[indx], glat[indx], *pars)
+        naxis2, naxis1 = image.shape
+        if not interp:
+            xpix = numpy.floor(xr.astype(numpy.float64) + 0.5).astype(numpy.int64)
+            ypix = numpy.floor(yr.astype(numpy.float64) + 0.5).astype(numpy.int64)
+            xpix = numpy.clip(xpix, 0, naxis1 - 1)
+            ypix = numpy.clip(ypix, 0, naxis2 - 1)
+            out[indx] = image[ypix, xpix]
+            continue
+        # Bilinear interpolation
+        xpix = xr.astype(numpy.int64)
+        ypix = yr.astype(numpy.int64)
+        dx = (xpix.astype(numpy.float32) - xr).astype(numpy.float64) + 1.0
+        dy = (ypix.astype(numpy.float32) - yr).astype(numpy.float64) + 1.0
+        dx = dx.astype(numpy.float32)
+        dy = dy.astype(numpy.float32)
+        # Force pixel values to fall within the image boundaries
+        dx[xpix < 0] = 1.0
+        xpix[xpix < 0] = 0
+        dy[ypix < 0] = 1.0
+        ypix[ypix < 0] = 0
+        dx[xpix >= naxis1 - 1] = 0.0
+        xpix[xpix >= naxis1 - 1] = naxis1 - 2
+        dy[ypix >= naxis2 - 1] = 0.0
+        ypix[ypix >= naxis2 - 1] = naxis2 - 2
+        out[indx] = (
+            dx * dy * image[ypix, xpix]
+            + (1 - dx) * dy * image[ypix, xpix + 1]
+            + dx * (1 - dy) * image[ypix + 1, xpix]
+            + (1 - dx) * (1 - dy) * image[ypix + 1, xpix + 1]
+        )
+    return out.astype(numpy.float64)
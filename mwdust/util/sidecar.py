@@ -0,0 +1,348 @@
+###############################################################################
+#
+#   mwdust.util.sidecar: uncompressed .npy copies of (parts of) the HDF5 dust
+#                        maps, stored next to the maps in DUST_DIR, that can
+#                        be memory-mapped and shared between processes, and
+#                        re-chunked HDF5 copies of the maps' samples
+#
+###############################################################################
+import os
+import mmap
+import numpy
+import h5py
+_CHUNK_BYTES= 2**28 # approximate number of bytes converted at a time
+_SAMPLES_LAYOUTS= ['pixel','sample']
+# approximate size of the HDF5 chunks of the re-chunked samples
+_SAMPLES_CHUNK_BYTES= {'pixel':2**14,'sample':2**20}
+
+def sidecar_filename(filename,suffix):
+    """
+    NAME:
+       sidecar_filename
+    PURPOSE:
+       return the name of a .npy sidecar file of a map file
+    INPUT:
+       filename - name of the map file
+       suffix - suffix that identifies the sidecar
+    OUTPUT:
+       filename of the sidecar
+    HISTORY:
+       2026-10-18 - Written
+    """
+    return '%s_%s.npy' % (os.path.splitext(filename)[0],suffix)
+
+def load_sidecar(sidecarfile,filename=None,shape=None):
+    """
+    NAME:
+       load_sidecar
+    PURPOSE:
+       memory-map a sidecar file if it exists and is up to date
+    INPUT:
+       sidecarfile - name of the sidecar file
+       filename= (None) if given, name of the map file that the sidecar was derived from; the sidecar is considered stale if it is older than this file
+       shape= (None) if given, expected shape of the array
+    OUTPUT:
+       read-only numpy.memmap or None if the sidecar does not exist, is stale, or does not have the expected shape
+    HISTORY:
+       2026-10-18 - Written
+    """
+    if not os.path.exists(sidecarfile):
+        return None
+    if not filename is None and os.path.exists(filename) \
+            and os.path.getmtime(filename) > os.path.getmtime(sidecarfile):
+        return None
+    out= numpy.load(sidecarfile,mmap_mode='r')
+    if not shape is None and out.shape != tuple(shape):
+        return None
+    return out
+
+def open_sidecar(sidecarfile,dtype,shape):
+    """
+    NAME:
+       open_sidecar
+    PURPOSE:
+       create a new sidecar to be filled in; the data are written to a
+       temporary file that is only moved into place by close_sidecar, such
+       that other processes never load a partially-written sidecar
+    INPUT:
+       sidecarfile - name of the sidecar file
+       dtype - data type
+       shape - shape of the array
+    OUTPUT:
+       writeable numpy.memmap
+    HISTORY:
+       2026-10-18 - Written
+    """
+    tmpfile= '%s.%i.tmp' % (sidecarfile,os.getpid())
+    return numpy.lib.format.open_memmap(tmpfile,mode='w+',
+                                        dtype=dtype,shape=tuple(shape))
+
+def close_sidecar(out,sidecarfile):
+    """
+    NAME:
+       close_sidecar
+    PURPOSE:
+       finish writing a sidecar opened with open_sidecar and memory-map it
+    INPUT:
+       out - numpy.memmap returned by open_sidecar
+       sidecarfile - name of the sidecar file
+    OUTPUT:
+       read-only numpy.memmap of the sidecar
+    HISTORY:
+       2026-10-18 - Written
+    """
+    tmpfile= out.filename
+    out.flush()
+    del out
+    os.replace(tmpfile,sidecarfile)
+    return numpy.load(sidecarfile,mmap_mode='r')
+
+def read_dataset(filename,dsetname,mmap=False,index=(),suffix=None):
+    """
+    NAME:
+       read_dataset
+    PURPOSE:
+       read a dataset from an HDF5 map file, either fully into memory or
+       memory-mapped from an uncompressed .npy sidecar
+    INPUT:
+       filename - name of the HDF5 file
+       dsetname - name of the dataset (e.g., '/best_fit')
+       mmap= (False) if True, memory-map the dataset from a .npy sidecar next to filename, converting the dataset to the sidecar (once) if necessary
+       index= (()) index applied to all but the first axis of the dataset (e.g., (0,slice(None)) to read dset[:,0,:])
+       suffix= (dsetname without the leading /) suffix of the sidecar's filename
+    OUTPUT:
+       numpy.ndarray or read-only numpy.memmap
+    HISTORY:
+       2026-10-18 - Written
+    """
+    index= tuple(index) if isinstance(index,tuple) else (index,)
+    if not mmap:
+        with h5py.File(filename,'r') as h5file:
+            return h5file[dsetname][(slice(None),)+index]
+    if suffix is None:
+        suffix= dsetname.strip('/').replace('/','_')
+    sidecarfile= sidecar_filename(filename,suffix)
+    out= load_sidecar(sidecarfile,filename=filename)
+    if not out is None:
+        return out
+    with h5py.File(filename,'r') as h5file:
+        dset= h5file[dsetname]
+        shape= (dset.shape[0],)\
+            +numpy.broadcast_to(0,dset.shape[1:])[index].shape
+        out= open_sidecar(sidecarfile,dset.dtype,shape)
+        rowbytes= max(1,dset.dtype.itemsize*int(numpy.prod(dset.shape[1:])))
+        # Convert in whole HDF5 chunks if possible
+        nrows= max(1,_CHUNK_BYTES//rowbytes)
+        if not dset.chunks is None:
+            nrows= max(dset.chunks[0],nrows//dset.chunks[0]*dset.chunks[0])
+        for start in range(0,shape[0],nrows):
+            end= min(start+nrows,shape[0])
+            out[start:end]= dset[(slice(start,end),)+index]
+    return close_sidecar(out,sidecarfile)
+
+class _MemmapReference(object):
+    """picklable reference to an array that is backed by a memory-mapped file"""
+    def __init__(self,filename,offset,shape,strides,dtype):
+        self.filename= filename
+        self.offset= offset
+        self.shape= shape
+        self.strides= strides
+        self.dtype= dtype
+
+    def load(self):
+        mm= numpy.memmap(self.filename,dtype=numpy.uint8,mode='r')
+        return numpy.ndarray(self.shape,dtype=self.dtype,buffer=mm,
+                             offset=self.offset,strides=self.strides)
+
+def memmap_reference(arr):
+    """
+    NAME:
+       memmap_reference
+    PURPOSE:
+       return a picklable reference to an array that is (a view of) a memory-mapped file, such that another process can memory-map the same data rather than receiving a copy
+    INPUT:
+       arr - numpy.ndarray
+    OUTPUT:
+       reference (with a load() method that memory-maps the array) or None if arr is not backed by a shared memory-mapped file
+    HISTORY:
+       2026-10-18 - Written
+    """
+    mm= arr
+    while isinstance(mm,numpy.ndarray) \
+            and not (isinstance(mm,numpy.memmap)
+                     and getattr(mm,'_mmap',None) is not None):
+        mm= mm.base
+    if not isinstance(mm,numpy.memmap) or mm.filename is None \
+            or mm.mode == 'c' or arr.size == 0:
+        return None
+    # numpy.memmap maps the file from the allocation boundary before offset
+    start= mm.offset-mm.offset % mmap.ALLOCATIONGRANULARITY
+    mmstart= numpy.frombuffer(mm._mmap,dtype=numpy.uint8).ctypes.data
+    return _MemmapReference(mm.filename,start+arr.ctypes.data-mmstart,
+                            arr.shape,arr.strides,arr.dtype)
+
+def share_arrays(obj,tmpdir=None,minbytes=2**20):
+    """
+    NAME:
+       share_arrays
+    PURPOSE:
+       replace the arrays in (nested dicts, lists, and tuples of) obj by references to memory-mapped files, such that obj can be sent to other processes without copying the arrays
+    INPUT:
+       obj - object, typically the __dict__ of a map
+       tmpdir= (None) if given, directory to which arrays of at least minbytes that are not already memory-mapped are written as .npy files, such that they can be memory-mapped as well
+       minbytes= (2**20) minimum size of arrays written to tmpdir
+    OUTPUT:
+       copy of obj with arrays replaced by references (undone by unshare_arrays)
+    HISTORY:
+       2026-10-18 - Written
+    """
+    if isinstance(obj,dict):
+        return dict((key,share_arrays(val,tmpdir=tmpdir,minbytes=minbytes))
+                    for key,val in obj.items())
+    elif type(obj) in (list,tuple):
+        return type(obj)([share_arrays(val,tmpdir=tmpdir,minbytes=minbytes)
+                          for val in obj])
+    elif not isinstance(obj,numpy.ndarray):
+        return obj
+    out= memmap_reference(obj)
+    if not out is None:
+        return out
+    if tmpdir is None or obj.nbytes < minbytes or obj.dtype.hasobject:
+        return obj
+    mm= numpy.lib.format.open_memmap(\
+        os.path.join(tmpdir,'array%i.npy' % len(os.listdir(tmpdir))),
+        mode='w+',dtype=obj.dtype,shape=obj.shape)
+    mm[...]= obj
+    mm.flush()
+    return memmap_reference(mm)
+
+def shared_nbytes(obj,minbytes=2**20):
+    """
+    NAME:
+       shared_nbytes
+    PURPOSE:
+       return the number of bytes that share_arrays writes to tmpdir for obj
+    INPUT:
+       obj - object, typically the __dict__ of a map
+       minbytes= (2**20) minimum size of arrays written to tmpdir
+    OUTPUT:
+       number of bytes of the arrays of at least minbytes that are not already memory-mapped
+    HISTORY:
+       2026-10-18 - Written
+    """
+    if isinstance(obj,dict):
+        return sum(shared_nbytes(val,minbytes=minbytes) for val in obj.values())
+    elif type(obj) in (list,tuple):
+        return sum(shared_nbytes(val,minbytes=minbytes) for val in obj)
+    elif not isinstance(obj,numpy.ndarray) or obj.nbytes < minbytes \
+            or obj.dtype.hasobject or not memmap_reference(obj) is None:
+        return 0
+    return obj.nbytes
+
+def unshare_arrays(obj):
+    """
+    NAME:
+       unshare_arrays
+    PURPOSE:
+       memory-map the arrays replaced by references by share_arrays
+    INPUT:
+       obj - output of share_arrays
+    OUTPUT:
+       obj with the arrays memory-mapped (read-only)
+    HISTORY:
+       2026-10-18 - Written
+    """
+    if isinstance(obj,dict):
+        return dict((key,unshare_arrays(val)) for key,val in obj.items())
+    elif type(obj) in (list,tuple):
+        return type(obj)([unshare_arrays(val) for val in obj])
+    elif isinstance(obj,_MemmapReference):
+        return obj.load()
+    return obj
+
+def rechunked_samples_filename(filename,layout):
+    """
+    NAME:
+       rechunked_samples_filename
+    PURPOSE:
+       return the name of the re-chunked copy of the samples of a map file
+    INPUT:
+       filename - name of the HDF5 map file with the samples
+       layout - 'pixel' or 'sample' (see rechunk_samples)
+    OUTPUT:
+       filename of the re-chunked samples
+    HISTORY:
+       2026-10-18 - Written
+    """
+    return '%s_samples_%s.h5' % (os.path.splitext(filename)[0],layout)
+
+def find_rechunked_samples(filename,layout):
+    """
+    NAME:
+       find_rechunked_samples
+    PURPOSE:
+       find the re-chunked copy of the samples of a map file if it exists and is up to date
+    INPUT:
+       filename - name of the HDF5 map file with the samples
+       layout - 'pixel' or 'sample' (see rechunk_samples)
+    OUTPUT:
+       filename of the re-chunked samples or None
+    HISTORY:
+       2026-10-18 - Written
+    """
+    samplesfile= rechunked_samples_filename(filename,layout)
+    if not os.path.exists(samplesfile):
+        return None
+    if os.path.exists(filename) \
+            and os.path.getmtime(filename) > os.path.getmtime(samplesfile):
+        return None
+    return samplesfile
+
+def rechunk_samples(filename,layout='pixel',compression=None,
+                    dsetname='/samples'):
+    """
+    NAME:
+       rechunk_samples
+    PURPOSE:
+       copy the samples (npix,nsample,ndistmod) of a map file to an HDF5 file next to it with a layout chosen for how the samples are read, such that reads only touch the chunks that contain the requested data
+    INPUT:
+       filename - name of the HDF5 map file with the samples
+       layout= ('pixel') 'pixel' for small chunks that contain all samples of a few pixels (for reading the samples of the pixels of a set of stars; see evaluate_samples) or 'sample' for chunks that contain a single sample of many pixels (for reading one sample of all pixels; see substitute_sample)
+       compression= (None) None for uncompressed samples or an HDF5 compression filter (e.g., 'lzf' for a fast codec or 'gzip')
+       dsetname= ('/samples') name of the samples dataset
+    OUTPUT:
+       filename of the re-chunked samples
+    HISTORY:
+       2026-10-18 - Written
+    """
+    if not layout in _SAMPLES_LAYOUTS:
+        raise ValueError(f"layout should be one of {_SAMPLES_LAYOUTS}, not {layout}")
+    samplesfile= rechunked_samples_filename(filename,layout)
+    tmpfile= '%s.%i.tmp' % (samplesfile,os.getpid())
+    with h5py.File(filename,'r') as h5file, h5py.File(tmpfile,'w') as outfile:
+        dset= h5file[dsetname]
+        npix, nsample, ndistmod= dset.shape
+        # Uncompressed pixel-contiguous samples need no chunks
+        if layout == 'pixel' and compression is None:
+            chunks= None
+        else:
+            pixbytes= dset.dtype.itemsize*ndistmod\
+                *(nsample if layout == 'pixel' else 1)
+            chunks= (int(min(npix,max(1,_SAMPLES_CHUNK_BYTES[layout]
+                                       //pixbytes))),
+                     nsample if layout == 'pixel' else 1,ndistmod)
+        out= outfile.create_dataset('samples',shape=dset.shape,
+                                    dtype=dset.dtype,chunks=chunks,
+                                    compression=compression,
+                                    shuffle=compression is not None)
+        # Copy in whole chunks of the input and the output
+        nrows= 1
+        for cchunks in [dset.chunks,chunks]:
+            if not cchunks is None: nrows= numpy.lcm(nrows,cchunks[0])
+        nrows= int(max(nrows,_CHUNK_BYTES//(dset.dtype.itemsize*nsample
+                                            *ndistmod)//nrows*nrows))
+        for start in range(0,npix,nrows):
+            end= min(start+nrows,npix)
+            out[start:end]= dset[start:end]
+    os.replace(tmpfile,samplesfile)
+    return samplesfile
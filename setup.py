@@ -62,6 +62,8 @@ setup(name='mwdust',
                                    'extCurves/apj398709t6_ascii.txt']},
       install_requires=install_requires,
       ext_modules=ext_modules,
+      entry_points={'console_scripts':['mwdust-apply = mwdust.apply:main',
+                                       'mwdust-build = mwdust.build:main']},
       classifiers=[
         "Development Status :: 6 - Mature",
         "Intended Audience :: Science/Research",
@@ -0,0 +1,203 @@
+import numpy
+from numpy.random import default_rng
+
+rng = default_rng()
+
+
+def test_apply_against_direct(tmp_path):
+    # Test that mwdust-apply gives the same extinction as evaluating the map
+    # directly, for all combinations of input and output formats
+    import h5py
+    from astropy.io import fits
+    from mwdust import Green19
+    from mwdust.apply import main
+    from mwdust.util.extCurves import aebv
+
+    nstar = 2345
+    glons = rng.uniform(0.0, 360.0, size=nstar)
+    glats = numpy.degrees(numpy.arcsin(rng.uniform(-1.0, 1.0, size=nstar)))
+    dists = rng.uniform(0.01, 10.0, size=nstar)
+    ids = numpy.arange(nstar)
+    with h5py.File(tmp_path / "in.h5", "w") as h5file:
+        for name, col in zip(["l", "b", "d", "id"], [glons, glats, dists, ids]):
+            h5file[name] = col
+    fits.BinTableHDU.from_columns(
+        [
+            fits.Column(name=name, format=fmt, array=col)
+            for name, fmt, col in zip(
+                ["l", "b", "d", "id"], ["D", "D", "D", "K"], [glons, glats, dists, ids]
+            )
+        ]
+    ).writeto(tmp_path / "in.fits")
+    with open(tmp_path / "in.csv", "w") as csvfile:
+        csvfile.write("id,l,b,d\n")
+        for row in zip(ids, glons, glats, dists):
+            csvfile.write(",".join(repr(val.item()) for val in row) + "\n")
+    ahs = Green19()(glons, glats, dists) * aebv("2MASS H")
+
+    def read(filename):
+        if filename.endswith(".h5"):
+            with h5py.File(filename, "r") as h5file:
+                return (h5file["id"][:], h5file["A_2MASS_H"][:])
+        elif filename.endswith(".fits"):
+            data = fits.getdata(filename)
+            return (data["id"], data["A_2MASS_H"])
+        data = numpy.loadtxt(filename, delimiter=",", skiprows=1)
+        return (data[:, 0], data[:, 1])
+
+    for informat in ["h5", "fits", "csv"]:
+        for outformat in ["h5", "fits", "csv"]:
+            outfile = str(tmp_path / f"out_{informat}.{outformat}")
+            assert (
+                main(
+                    [
+                        str(tmp_path / f"in.{informat}"),
+                        outfile,
+                        "--map",
+                        "Green19",
+                        "--filter",
+                        "2MASS H",
+                        "--keep",
+                        "id",
+                        "--chunk-size",
+                        "1000",
+                        "--quiet",
+                    ]
+                )
+                == 0
+            )
+            outids, outahs = read(outfile)
+            assert numpy.all(outids == ids), (
+                f"mwdust-apply from {informat} to {outformat} does not preserve the order of the stars"
+            )
+            assert numpy.all(
+                (outahs == ahs) + (numpy.isnan(outahs) * numpy.isnan(ahs))
+            ), (
+                f"mwdust-apply from {informat} to {outformat} does not agree with evaluating the map directly"
+            )
+    return None
+
+
+def test_apply_csv_edge_cases(tmp_path):
+    # Test CSV catalogs with columns whose type changes between chunks, blank
+    # lines, and no rows or header
+    import pytest
+    from mwdust import Zero
+    from mwdust.apply import apply_to_catalog
+    from mwdust.util.catalog import open_catalog
+
+    # Integer coordinates in the first chunk and float coordinates later,
+    # with blank lines in between and at the end
+    with open(tmp_path / "a.csv", "w") as csvfile:
+        csvfile.write("id,l,b,d\n")
+        for ii in range(12):
+            csvfile.write(f"{ii},{ii},{ii},{1 if ii < 5 else 2.5}\n")
+            if ii == 7:
+                csvfile.write("\n")
+        csvfile.write("\n\n")
+    reader = open_catalog(str(tmp_path / "a.csv"))
+    assert reader.nrows == 12, "Blank lines are counted as rows of a CSV file"
+    reader.close()
+    nstar, _ = apply_to_catalog(
+        Zero(),
+        str(tmp_path / "a.csv"),
+        str(tmp_path / "a_out.h5"),
+        keep=["id"],
+        chunk_size=5,
+        progress=False,
+    )
+    assert nstar == 12, "Number of stars of a CSV file is wrong"
+    # Values of a kept column that no longer fit the first chunk's type
+    with open(tmp_path / "b.csv", "w") as csvfile:
+        csvfile.write("id,l,b,d\n")
+        for ii in range(12):
+            csvfile.write(f"{ii if ii < 5 else ii + 0.5},{ii},{ii},1\n")
+    with pytest.raises(ValueError, match="first chunk"):
+        apply_to_catalog(
+            Zero(),
+            str(tmp_path / "b.csv"),
+            str(tmp_path / "b_out.h5"),
+            keep=["id"],
+            chunk_size=5,
+            progress=False,
+        )
+    # Header only
+    with open(tmp_path / "c.csv", "w") as csvfile:
+        csvfile.write("l,b,d")
+    nstar, _ = apply_to_catalog(
+        Zero(), str(tmp_path / "c.csv"), str(tmp_path / "c_out.csv"), progress=False
+    )
+    assert nstar == 0, "Number of stars of a CSV file without rows is wrong"
+    # Empty file
+    open(tmp_path / "d.csv", "w").close()
+    with pytest.raises(ValueError, match="header"):
+        apply_to_catalog(
+            Zero(), str(tmp_path / "d.csv"), str(tmp_path / "d_out.h5"), progress=False
+        )
+    return None
+
+
+def test_apply_shares_map_once(tmp_path, monkeypatch):
+    # Test that the map is shared with the processes once for all chunks of
+    # the catalog, and that the extinction agrees with the serial evaluation
+    import h5py
+    from mwdust import DustMap3D as dustmap3d  # the module
+    from mwdust import Green19
+    from mwdust.apply import apply_to_catalog
+
+    nstar = 3000
+    glons = rng.uniform(0.0, 360.0, size=nstar)
+    glats = numpy.degrees(numpy.arcsin(rng.uniform(-1.0, 1.0, size=nstar)))
+    dists = rng.uniform(0.01, 10.0, size=nstar)
+    with h5py.File(tmp_path / "in.h5", "w") as h5file:
+        for name, col in zip(["l", "b", "d"], [glons, glats, dists]):
+            h5file[name] = col
+    nshared = []
+    share_arrays = dustmap3d.share_arrays
+
+    def counting_share_arrays(*args, **kwargs):
+        # Writing the arrays to a temporary directory, not __getstate__
+        if kwargs.get("tmpdir") is not None:
+            nshared.append(1)
+        return share_arrays(*args, **kwargs)
+
+    monkeypatch.setattr(dustmap3d, "share_arrays", counting_share_arrays)
+    green19 = Green19()
+    apply_to_catalog(
+        green19,
+        str(tmp_path / "in.h5"),
+        str(tmp_path / "out.h5"),
+        chunk_size=500,
+        workers=2,
+        progress=False,
+    )
+    assert len(nshared) == 1, "The map is shared with the processes for every chunk"
+    with h5py.File(tmp_path / "out.h5", "r") as h5file:
+        ebvs = h5file["EBV"][:]
+    tebvs = green19(glons, glats, dists)
+    assert numpy.all(
+        (ebvs == tebvs) + (numpy.isnan(ebvs) * numpy.isnan(tebvs))
+    ), "Extinction evaluated on processes does not agree with the serial evaluation"
+    return None
+
+
+def test_apply_map_kwargs(tmp_path, capsys):
+    # Test that maps that cannot be built from the command line are not
+    # offered, and that missing or unknown map keyword arguments are reported
+    # as usage errors before the input catalog is opened
+    import pytest
+    from mwdust.apply import main
+
+    infile, outfile = str(tmp_path / "missing.csv"), str(tmp_path / "out.csv")
+    for argv, message in [
+        (["-m", "CompositeMap"], "invalid choice: 'CompositeMap'"),
+        (["-m", "FastGridMap"], "FastGridMap requires --map-kwarg filename=..."),
+        (["-m", "Zero", "--map-kwarg", "nside=4"], "invalid --map-kwarg for Zero"),
+    ]:
+        with pytest.raises(SystemExit) as excinfo:
+            main([infile, outfile] + argv)
+        assert excinfo.value.code == 2, "mwdust-apply does not exit with a usage error"
+        assert (
+            message in capsys.readouterr().err
+        ), f"mwdust-apply does not report {message}"
+    return None
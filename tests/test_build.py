@@ -0,0 +1,79 @@
+import numpy
+from numpy.random import default_rng
+
+rng = default_rng()
+
+
+def test_combined_pixels_against_loops():
+    # Test that the vectorized selection of the pixels of the combined maps
+    # agrees with the loops over pixels of the original combine_dustmaps script
+    from mwdust.build import combined_pixels
+    from mwdust.util.healpix import pix2ang
+
+    # Hierarchical map with levels 64 to 512 by randomly splitting pixels
+    nside, pix = 64, numpy.arange(12 * 64**2)
+    nsides, pixs = [], []
+    while nside < 512:
+        split = rng.uniform(size=len(pix)) < 0.5
+        nsides.append(numpy.full(numpy.sum(~split), nside))
+        pixs.append(pix[~split])
+        nside, pix = 2 * nside, (4 * pix[split][:, None] + numpy.arange(4)).flatten()
+    nsides.append(numpy.full(len(pix), nside))
+    pixs.append(pix)
+    # Remove some pixels, which are filled in with Drimmel
+    pix_info = numpy.empty(
+        sum(len(pix) for pix in pixs), dtype=[("nside", "u4"), ("healpix_index", "u8")]
+    )
+    pix_info["nside"] = numpy.concatenate(nsides)
+    pix_info["healpix_index"] = numpy.concatenate(pixs)
+    pix_info = pix_info[rng.uniform(size=len(pix_info)) < 0.9]
+    mar_pix, green_keep, drim_nside, drim_pix = combined_pixels(pix_info)
+
+    def in_marshall(nside, pix):
+        theta, phi = pix2ang(int(nside), pix, nest=True)
+        return (
+            (phi < 100.125 * numpy.pi / 180.0) + (phi > 259.875 * numpy.pi / 180.0)
+        ) * (numpy.fabs(numpy.pi / 2.0 - theta) < 10.125 * numpy.pi / 180.0)
+
+    gnside = pix_info["nside"].astype("int64")
+    gpix = pix_info["healpix_index"].astype("int64")
+    inMar = numpy.array(
+        [
+            in_marshall(nside, [pix])[0]
+            for nside, pix in zip(gnside[:2000], gpix[:2000])
+        ]
+    )
+    assert numpy.array_equal(
+        green_keep[green_keep < 2000], numpy.nonzero(~inMar)[0]
+    ), "Green pixels of the combined map do not agree with the original selection"
+    tmar_pix = numpy.arange(12 * 512**2)
+    assert numpy.array_equal(
+        mar_pix, tmar_pix[in_marshall(512, tmar_pix)]
+    ), "Marshall pixels of the combined map do not agree with the original selection"
+    # Original loops for Drimmel
+    pix_drim, pix_drim_nside = [], []
+    for nside_drim in [256, 512]:
+        tpix = numpy.arange(12 * nside_drim**2)
+        rmIndx = numpy.zeros(len(tpix), dtype="bool")
+        for nside in [256, 512]:
+            if nside < nside_drim:
+                continue
+            mult_factor = (nside // nside_drim) ** 2
+            tgpix = gpix[gnside == nside]
+            for offset in numpy.arange(mult_factor):
+                rmIndx[numpy.isin(tpix * mult_factor + offset, tgpix)] = True
+        for nside in 2 ** numpy.arange(6, int(numpy.log2(nside_drim))):
+            mult_factor = (nside_drim // nside) ** 2
+            rmIndx[numpy.isin(tpix // mult_factor, gpix[gnside == nside])] = True
+            tdpix = numpy.array(pix_drim)[numpy.array(pix_drim_nside) == nside]
+            rmIndx[numpy.isin(tpix // mult_factor, tdpix)] = True
+        rmIndx[in_marshall(nside_drim, tpix)] = True
+        pix_drim.extend(tpix[~rmIndx])
+        pix_drim_nside.extend(nside_drim * numpy.ones(numpy.sum(~rmIndx)))
+    assert numpy.array_equal(
+        drim_pix, pix_drim
+    ), "Drimmel pixels of the combined map do not agree with the original selection"
+    assert numpy.array_equal(
+        drim_nside, pix_drim_nside
+    ), "Drimmel pixel levels of the combined map do not agree with the original selection"
+    return None
@@ -0,0 +1,72 @@
+import pickle
+
+import numpy
+from numpy.random import default_rng
+
+rng = default_rng()
+
+
+def test_lrucache_eviction():
+    # Test that the cache evicts the least recently used entries beyond its
+    # budget and counts hits, misses, and evictions
+    from mwdust.util.cache import LRUCache
+
+    cache = LRUCache(maxentries=3, maxbytes=None)
+    for ii in range(3):
+        cache.put(("a", ii), numpy.zeros(10))
+    assert cache.get(("a", 0)) is not None, "Cached entry is missing"
+    cache.put(("a", 3), numpy.zeros(10))
+    assert ("a", 1) not in cache, "Least recently used entry was not evicted"
+    assert ("a", 0) in cache, "Recently used entry was evicted"
+    assert cache.get(("a", 1)) is None, "Evicted entry is returned"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["entries"]) == (
+        1,
+        1,
+        1,
+        3,
+    ), "Counters of the cache are wrong"
+    # Byte budget
+    cache = LRUCache(maxbytes=10000)
+    for ii in range(10):
+        cache.put(("b", ii), numpy.zeros(200))
+    assert (
+        0 < cache.stats()["nbytes"] <= 10000 and len(cache) < 10
+    ), "Cache exceeds its byte budget"
+    cache.put(("c", 0), numpy.zeros(10))
+    cache.clear(owner="b")
+    assert len(cache) == 1, "Clearing the entries of an owner does not work"
+    return None
+
+
+def test_spline_cache_bounded():
+    # Test that the splines of the HEALPix maps for interpk > 1 stay within the
+    # budget of the cache and agree with the precomputed coefficients
+    from mwdust import Green19
+    from mwdust.util.cache import LRUCache
+
+    cache = LRUCache(maxentries=100)
+    green19 = Green19(interpk=3, cache=cache)
+    green19_ppoly = Green19(interpk=3, precompute=True)
+    nstar = 2000
+    glons = rng.uniform(0.0, 360.0, size=nstar)
+    glats = numpy.degrees(numpy.arcsin(rng.uniform(-1.0, 1.0, size=nstar)))
+    dists = rng.uniform(0.1, 10.0, size=nstar)
+    for ii in range(2):
+        assert numpy.allclose(
+            green19(glons, glats, dists),
+            green19_ppoly(glons, glats, dists),
+            equal_nan=True,
+        ), "Splines from the cache do not agree with the precomputed coefficients"
+    stats = cache.stats()
+    assert stats["entries"] <= 100, "Spline cache exceeds its budget"
+    assert stats["evictions"] > 0 and stats["misses"] > 0, "Cache counters are wrong"
+    # Pickled maps get an empty cache with the same budget
+    green19 = pickle.loads(pickle.dumps(green19))
+    assert len(green19._intps) == 0 and green19._intps.stats()["maxentries"] == 100
+    assert numpy.allclose(
+        green19(glons, glats, dists),
+        green19_ppoly(glons, glats, dists),
+        equal_nan=True,
+    ), "Splines of a pickled map do not agree with the precomputed coefficients"
+    return None
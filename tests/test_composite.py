@@ -0,0 +1,33 @@
+import numpy
+from numpy.random import default_rng
+
+rng = default_rng()
+
+
+def test_composite_against_components():
+    # Test that the composite map gives the extinction of the first map that
+    # covers each star and has a value there
+    from mwdust import CompositeMap, Drimmel03, Green19, Marshall06
+    from mwdust.util.extCurves import aebv
+
+    nstar = 10000
+    glons = rng.uniform(0.0, 360.0, size=nstar)
+    glats = numpy.degrees(numpy.arcsin(rng.uniform(-1.0, 1.0, size=nstar)))
+    dists = rng.uniform(0.01, 10.0, size=nstar)
+    maps = [Green19(), Marshall06(filter="2MASS Ks"), Drimmel03()]
+    composite = CompositeMap(maps, filter="2MASS H")
+    aebvs = composite(glons, glats, dists)
+    assert not numpy.any(
+        numpy.isnan(aebvs)
+    ), "Composite map with a full-sky map has NaN extinction"
+    ebvs = numpy.full(nstar, numpy.nan)
+    for dustmap in maps[::-1]:
+        mebvs = dustmap(glons, glats, dists)
+        if dustmap._filter is not None:
+            mebvs = mebvs / aebv(dustmap._filter)
+        indx = dustmap.coverage(glons, glats) * ~numpy.isnan(mebvs)
+        ebvs[indx] = mebvs[indx]
+    assert numpy.all(
+        ebvs * aebv("2MASS H") == aebvs
+    ), "Composite map does not agree with the extinction of its component maps"
+    return None
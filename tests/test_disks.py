@@ -0,0 +1,117 @@
+import numpy
+from numpy.random import default_rng
+
+rng = default_rng()
+
+
+def test_dust_vals_disks_against_pixel_centers():
+    # Test that the extinction in many disks agrees with evaluating the map at
+    # the centers of the pixels of each disk in turn
+    import healpy
+    from mwdust import Green19
+    from mwdust.util.healpix import pix2ang
+
+    green19 = Green19(filter="2MASS H")
+    nfield = 20
+    lcen = rng.uniform(0.0, 360.0, size=nfield)
+    bcen = rng.uniform(-60.0, 60.0, size=nfield)
+    radius = rng.uniform(0.1, 2.0, size=nfield)
+    dists = numpy.array([0.5, 2.0, 5.0])
+    offsets, pixarea, extinction = green19.dust_vals_disks(lcen, bcen, dists, radius)
+    assert len(offsets) == nfield + 1, "Offsets of the disks have the wrong length"
+    assert extinction.shape == (offsets[-1], len(dists)), "Extinction has wrong shape"
+    for ii in range(nfield):
+        vec = healpy.pixelfunc.ang2vec(
+            numpy.radians(90.0 - bcen[ii]), numpy.radians(lcen[ii])
+        )
+        tpixarea, textinction = [], []
+        for nside in green19._nsides:
+            ipixs = healpy.query_disc(
+                nside, vec, numpy.radians(radius[ii]), inclusive=False, nest=True
+            )
+            if len(ipixs) == 0:
+                continue
+            theta, phi = pix2ang(int(nside), ipixs, nest=True)
+            ls, bs = numpy.degrees(phi), 90.0 - numpy.degrees(theta)
+            lbIndx = green19._lbIndx(ls, bs)
+            inlevel = (lbIndx != -1) * (green19._pix_info["nside"][lbIndx] == nside)
+            tpixarea.extend([healpy.nside2pixarea(nside)] * numpy.sum(inlevel))
+            textinction.extend(green19(ls[inlevel], bs[inlevel], dists, grid=True))
+        assert numpy.allclose(
+            pixarea[offsets[ii] : offsets[ii + 1]], tpixarea
+        ), "Pixel areas of dust_vals_disks do not agree with the pixels in the disk"
+        assert numpy.allclose(
+            extinction[offsets[ii] : offsets[ii + 1]].reshape((-1, len(dists))),
+            numpy.reshape(textinction, (-1, len(dists))),
+            rtol=1e-10,
+        ), "Extinction of dust_vals_disks does not agree with the map at the pixel centers"
+    # Single disk
+    tpixarea, textinction = green19.dust_vals_disk(lcen[0], bcen[0], 2.0, radius[0])
+    assert numpy.allclose(
+        textinction, extinction[offsets[0] : offsets[1], 1]
+    ), "dust_vals_disk does not agree with dust_vals_disks"
+    return None
+
+
+def test_region_stats_against_dust_vals_disks():
+    # Test that the statistics of the extinction within many disks agree with
+    # those of the pixels returned by dust_vals_disks
+    from mwdust import Green19
+
+    green19 = Green19()
+    nfield = 50
+    lcen = rng.uniform(0.0, 360.0, size=nfield)
+    bcen = rng.uniform(-60.0, 60.0, size=nfield)
+    radius = rng.uniform(0.1, 2.0, size=nfield)
+    dists = numpy.array([0.5, 2.0, 5.0])
+    bins = numpy.linspace(0.0, 5.0, 1001)
+    stats = green19.region_stats(
+        lcen,
+        bcen,
+        dists,
+        radius,
+        stats=("mean", "min", "max", "area", "hist", "p0", "p50", "p100"),
+        bins=bins,
+    )
+    offsets, pixarea, extinction = green19.dust_vals_disks(lcen, bcen, dists, radius)
+    for ii in range(nfield):
+        for jj in range(len(dists)):
+            ext = extinction[offsets[ii] : offsets[ii + 1], jj]
+            area = pixarea[offsets[ii] : offsets[ii + 1]]
+            if len(ext) == 0:
+                assert numpy.isnan(stats["mean"][ii, jj]), "Empty disk has a mean"
+                continue
+            assert numpy.isclose(
+                stats["mean"][ii, jj], numpy.sum(area * ext) / numpy.sum(area)
+            ), "Mean of region_stats does not agree with dust_vals_disks"
+            assert (
+                stats["min"][ii, jj] == numpy.amin(ext)
+                and stats["max"][ii, jj] == numpy.amax(ext)
+            ), "Extrema of region_stats do not agree with dust_vals_disks"
+            assert (
+                stats["p0"][ii, jj] == stats["min"][ii, jj]
+                and stats["p100"][ii, jj] == stats["max"][ii, jj]
+            ), "0th and 100th percentiles of region_stats are not the extrema"
+            assert numpy.isclose(
+                stats["area"][ii, jj], numpy.sum(area)
+            ), "Area of region_stats does not agree with dust_vals_disks"
+            assert numpy.allclose(
+                stats["hist"][ii, jj], numpy.histogram(ext, bins=bins, weights=area)[0]
+            ), "Histogram of region_stats does not agree with dust_vals_disks"
+            # Area-weighted median, up to the width of the bins; at jumps of
+            # the cumulative area the median is anywhere between two values
+            sortext = ext[numpy.argsort(ext)]
+            cumarea = numpy.cumsum(area[numpy.argsort(ext)])
+            lo, hi = sortext[
+                numpy.minimum(
+                    numpy.searchsorted(
+                        cumarea, 0.5 * cumarea[-1] * numpy.array([1 - 1e-9, 1 + 1e-9])
+                    ),
+                    len(ext) - 1,
+                )
+            ]
+            binwidth = bins[1] - bins[0]
+            assert (
+                lo - binwidth <= stats["p50"][ii, jj] <= hi + binwidth
+            ), "Median of region_stats does not agree with dust_vals_disks"
+    return None
@@ -0,0 +1,72 @@
+import numpy
+from numpy.random import default_rng
+
+rng = default_rng()
+
+
+def check_first_crossing(dustmap, glons, glats, A, dgrid, atol=1e-10, **kwargs):
+    # Check that the map reaches A at the returned distance (up to atol for
+    # maps that are not linear between the distances of the grid) and not at
+    # any distance of the grid before it
+    dists = dustmap.distance_at_extinction(glons, glats, A, **kwargs)
+    assert dists.shape == A.shape, "distance_at_extinction returns the wrong shape"
+    indx = numpy.isfinite(dists) * (dists > dgrid[0])
+    assert numpy.allclose(
+        dustmap(glons[indx], glats[indx], dists[indx]), A[indx], atol=atol
+    ), "Extinction at the distance returned by distance_at_extinction is not A"
+    indx = numpy.isfinite(dists)
+    curves = dustmap(glons[indx], glats[indx], dgrid, grid=True)
+    assert not numpy.any(
+        (curves > A[indx, None] + 1e-10)
+        * (dgrid < dists[indx, None] * (1.0 - 1e-10))
+    ), "Extinction reaches A before the distance returned by distance_at_extinction"
+    # Saturation: infinity where the extinction never reaches A
+    indx = numpy.isinf(dists)
+    curves = dustmap(glons[indx], glats[indx], dgrid, grid=True)
+    assert numpy.all(
+        numpy.nanmax(curves, axis=1) < A[indx]
+    ), "distance_at_extinction is infinite where the extinction reaches A"
+    return dists
+
+
+def test_distance_at_extinction_hierarchical():
+    from mwdust import Green19
+
+    green19 = Green19(filter="2MASS H")
+    nstar = 10000
+    glons = rng.uniform(0.0, 360.0, size=nstar)
+    glats = numpy.degrees(numpy.arcsin(rng.uniform(-1.0, 1.0, size=nstar)))
+    A = rng.uniform(0.0, 1.0, size=nstar)
+    dgrid = 10.0 ** (green19._distmods / 5.0 - 2.0)
+    dists = check_first_crossing(green19, glons, glats, A, dgrid)
+    assert numpy.all(
+        numpy.isnan(dists) == ~green19.coverage(glons, glats)
+    ), "distance_at_extinction is not NaN exactly outside of the map's coverage"
+    indx = green19.coverage(glons, glats)
+    assert numpy.all(
+        green19.distance_at_extinction(glons[indx], glats[indx], 0.0) == dgrid[0]
+    ), "distance_at_extinction for zero extinction is not the first distance"
+    return None
+
+
+def test_distance_at_extinction_curves():
+    # Maps given as curves along sightlines and the general evaluation on a
+    # grid of distances
+    from mwdust import Drimmel03, Marshall06
+
+    marshall = Marshall06(filter="2MASS Ks")
+    nstar = 2000
+    glons = rng.uniform(-100.0, 100.0, size=nstar)
+    glats = rng.uniform(-10.0, 10.0, size=nstar)
+    A = rng.uniform(0.0, 2.0, size=nstar)
+    check_first_crossing(marshall, glons, glats, A, numpy.linspace(0.0, 30.0, 601))
+    drimmel = Drimmel03()
+    nstar = 200
+    glons = rng.uniform(0.0, 360.0, size=nstar)
+    glats = rng.uniform(-20.0, 20.0, size=nstar)
+    A = rng.uniform(0.0, 2.0, size=nstar)
+    dgrid = numpy.linspace(0.0, 20.0, 201)
+    check_first_crossing(
+        drimmel, glons, glats, A, dgrid, atol=0.1, distances=dgrid
+    )
+    return None
@@ -0,0 +1,192 @@
+import numpy
+from numpy.random import default_rng
+from scipy.ndimage import map_coordinates
+
+rng = default_rng()
+_DEGTORAD = numpy.pi / 180.0
+
+
+def reference_drimmel(drim, l, b, d):
+    # Scalar evaluation of the Drimmel03 map for one line of sight, as
+    # implemented before the vectorization: brute-force nearest COBE pixel for
+    # the re-scaling, maximum distances from if statements, and
+    # map_coordinates with its own pre-filtering for each grid
+    maps = drim._drimmelMaps
+    cl, sl = numpy.cos(l * _DEGTORAD), numpy.sin(l * _DEGTORAD)
+    cb, sb = numpy.cos(b * _DEGTORAD), numpy.sin(b * _DEGTORAD)
+    rfIndx = numpy.argmax(nearest_cos(drim, l, b))
+    rf = {1: 1.0, 2: 1.0, 3: 1.0}
+    if maps["rf_comp"][rfIndx] in rf:
+        rf[maps["rf_comp"][rfIndx]] = maps["rf"][rfIndx]
+    dmax = 100.0
+    if b != 0.0:
+        dmax = 0.49999 / numpy.fabs(sb) - drim._zsun / sb
+    dmax_ori = dmax
+    if cl != 0.0:
+        dmax = min(dmax, 14.9999 / numpy.fabs(cl) - drim._xsun / cl)
+    if sl != 0.0:
+        dmax = min(dmax, 14.9999 / numpy.fabs(sl))
+    if cl > 0.0:
+        dmax_ori = min(dmax_ori, 2.374999 / numpy.fabs(cl))
+    if cl < 0.0:
+        dmax_ori = min(dmax_ori, 1.374999 / numpy.fabs(cl))
+    if sl != 0.0:
+        dmax_ori = min(dmax_ori, 3.749999 / numpy.fabs(sl))
+
+    def interp(name, coords, n):
+        return map_coordinates(
+            maps[name],
+            [[c / dc + off] for c, dc, off in zip(coords, n[0], n[1])],
+            mode="constant",
+            cval=0.0,
+        )[0]
+
+    def centered(nx, ny, nz):
+        return [(nx - 1) / 2.0, (ny - 1) / 2.0, (nz - 1) / 2.0]
+
+    out = []
+    for td in numpy.atleast_1d(d):
+        td = min(td, dmax)
+        X, Y, Z = td * cb * cl, td * cb * sl, td * sb + drim._zsun
+        avori, avdisk = 0.0, 0.0
+        if numpy.fabs(X) < 1.0 and numpy.fabs(Y) < 2.0:
+            avori = interp(
+                "avori2",
+                [X, Y, Z],
+                [
+                    [drim._dx_ori2, drim._dy_ori2, drim._dz_ori2],
+                    centered(drim._nx_ori2, drim._ny_ori2, drim._nz_ori2),
+                ],
+            )
+        else:
+            dori = min(td, dmax_ori)
+            avori = interp(
+                "avori",
+                [dori * cb * cl + drim._xsun, dori * cb * sl, dori * sb + drim._zsun],
+                [
+                    [drim._dx_ori, drim._dy_ori, drim._dz_ori],
+                    [2.5 * (drim._nx_ori - 1)]
+                    + centered(drim._nx_ori, drim._ny_ori, drim._nz_ori)[1:],
+                ],
+            )
+        disk_grid = [
+            [drim._dx_disk, drim._dy_disk, drim._dz_disk],
+            centered(drim._nx_disk, drim._ny_disk, drim._nz_disk),
+        ]
+        if numpy.fabs(X) < 0.75 and numpy.fabs(Y) < 0.75:
+            avdisk = interp(
+                "avdloc",
+                [X, Y, Z],
+                [
+                    [drim._dx_diskloc, drim._dy_diskloc, drim._dz_diskloc],
+                    centered(drim._nx_diskloc, drim._ny_diskloc, drim._nz_diskloc),
+                ],
+            )
+        else:
+            avdisk = interp("avdisk", [X + drim._xsun, Y, Z], disk_grid)
+        avspir = interp("avspir", [X + drim._xsun, Y, Z], disk_grid)
+        out.append(rf[1] * avdisk + rf[2] * avspir + rf[3] * avori)
+    return numpy.array(out) / 3.09 / ((1 - drim._sf10) + drim._sf10 * 0.86)
+
+
+def nearest_cos(drim, l, b):
+    # Cosine of the angular distance to all COBE pixels of the re-scaling
+    rf_glon = drim._drimmelMaps["rf_glon"].astype("float64") * _DEGTORAD
+    rf_glat = drim._drimmelMaps["rf_glat"].astype("float64") * _DEGTORAD
+    return numpy.sin(b * _DEGTORAD) * numpy.sin(rf_glat) + numpy.cos(
+        b * _DEGTORAD
+    ) * numpy.cos(rf_glat) * numpy.cos(l * _DEGTORAD - rf_glon)
+
+
+def away_from_rf_boundaries(drim, glons, glats, gap=1e-6):
+    # Keep the lines of sight whose nearest COBE pixel for the re-scaling is
+    # unambiguous, such that the KD-tree and the brute-force search agree
+    keep = []
+    for l, b in zip(glons, glats):
+        cos = numpy.sort(nearest_cos(drim, l, b))
+        keep.append(cos[-1] - cos[-2] > gap)
+    return numpy.array(keep)
+
+
+def test_against_scalar_reference():
+    # Test that the vectorized evaluation agrees with the scalar evaluation
+    # from before the vectorization, for lines of sight that include the
+    # special cases of the maximum distance and for distances beyond it
+    from mwdust import Drimmel03
+
+    drim = Drimmel03()
+    nstar = 30
+    glons = numpy.concatenate(
+        (rng.uniform(0.0, 360.0, size=nstar), [0.0, 90.0, 180.0, 270.0, 45.0])
+    )
+    glats = numpy.concatenate(
+        (
+            numpy.degrees(numpy.arcsin(rng.uniform(-1.0, 1.0, size=nstar))),
+            [0.0, 0.0, 0.0, 0.0, 30.0],
+        )
+    )
+    keep = away_from_rf_boundaries(drim, glons, glats)
+    glons, glats = glons[keep], glats[keep]
+    dists = numpy.array([0.05, 0.3, 0.7, 1.5, 3.0, 8.0, 20.0, 60.0])
+    ref = numpy.array(
+        [reference_drimmel(drim, l, b, dists) for l, b in zip(glons, glats)]
+    )
+    assert numpy.allclose(
+        drim(glons, glats, dists, grid=True), ref, rtol=1e-5, atol=1e-7
+    ), "Vectorized Drimmel03 does not agree with the scalar evaluation"
+    return None
+
+
+def test_array_against_scalar_loop():
+    # Test that evaluating arrays of (l,b,d) agrees with a loop over scalars
+    from mwdust import Drimmel03
+
+    drim = Drimmel03()
+    nstar = 50
+    glons = rng.uniform(0.0, 360.0, size=nstar)
+    glats = numpy.degrees(numpy.arcsin(rng.uniform(-1.0, 1.0, size=nstar)))
+    dists = rng.uniform(0.01, 25.0, size=nstar)
+    loop = numpy.array(
+        [drim(float(l), float(b), float(d)) for l, b, d in zip(glons, glats, dists)]
+    ).flatten()
+    assert numpy.allclose(
+        drim(glons, glats, dists), loop, rtol=1e-12, atol=0.0
+    ), "Drimmel03 for arrays does not agree with a loop over scalars"
+    return None
+
+
+def test_dust_vals_disk_against_pixel_loop():
+    # Test that dust_vals_disk agrees with evaluating the pixels of the
+    # disk one at a time with the scalar evaluation
+    import healpy
+
+    from mwdust import Drimmel03
+
+    drim = Drimmel03()
+    nside = 256
+    for lcen, bcen, dist, radius in [(30.0, 5.0, 2.0, 0.3), (200.0, -20.0, 0.8, 0.5)]:
+        pixarea, extinction = drim.dust_vals_disk(lcen, bcen, dist, radius)
+        vec = healpy.ang2vec((90.0 - bcen) * _DEGTORAD, lcen * _DEGTORAD)
+        ipixs = healpy.query_disc(
+            nside, vec, radius * _DEGTORAD, inclusive=False, nest=True
+        )
+        theta, phi = healpy.pix2ang(nside, ipixs, nest=True)
+        glons, glats = numpy.degrees(phi), 90.0 - numpy.degrees(theta)
+        assert len(extinction) == len(
+            ipixs
+        ), "dust_vals_disk does not return all pixels of the disk"
+        assert numpy.allclose(
+            pixarea, healpy.nside2pixarea(nside)
+        ), "dust_vals_disk returns the wrong pixel area"
+        # Only the pixels whose re-scaling is unambiguous are compared
+        keep = away_from_rf_boundaries(drim, glons, glats)
+        ref = numpy.array(
+            [
+                reference_drimmel(drim, l, b, dist)[0]
+                for l, b in zip(glons[keep], glats[keep])
+            ]
+        )
+        assert numpy.allclose(
+            extinction[keep], ref, rtol=1e-5, atol=1e-7
+        ), "dust_vals_disk does not agree with evaluating the pixels one by one"
+    return None
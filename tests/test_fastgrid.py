@@ -0,0 +1,71 @@
+import numpy
+from numpy.random import default_rng
+
+rng = default_rng()
+
+
+def test_fastgrid_against_source(tmp_path):
+    # Test that the resampled map agrees with the original map at the nodes of
+    # the grid and that the error of the resampled map is reported
+    from mwdust import Drimmel03, FastGridMap, Green19
+    from mwdust.util.extCurves import aebv
+    from mwdust.util.healpix import pix2ang
+
+    # HEALPix grid at the resolution of the finest level, at the centers of
+    # pixels with that resolution
+    green19 = Green19(filter="2MASS H")
+    nside = int(numpy.amax(green19._nsides))
+    distmods = numpy.linspace(6.0, 16.0, 11)
+    filename = str(tmp_path / "green19_fast.h5")
+    fast = FastGridMap.resample(
+        green19, filename, nside=nside, distmods=distmods, filter="2MASS H"
+    )
+    pix = rng.integers(12 * nside**2, size=1000)
+    theta, phi = pix2ang(nside, pix, nest=True)
+    ls, bs = numpy.degrees(phi), 90.0 - numpy.degrees(theta)
+    lbIndx = green19._lbIndx(ls, bs)
+    indx = (lbIndx != -1) * (green19._pix_info["nside"][lbIndx] == nside)
+    dists = 10.0 ** (distmods[rng.integers(len(distmods), size=1000)] / 5.0 - 2.0)
+    assert numpy.allclose(
+        fast(ls[indx], bs[indx], dists[indx]),
+        green19(ls[indx], bs[indx], dists[indx]),
+        rtol=1e-5,
+    ), "Resampled HEALPix map does not agree with the original map at the grid nodes"
+    assert (
+        numpy.isfinite(fast.errors["max"]) and fast.errors["npoints"] > 0
+    ), "Error of the resampled HEALPix map is not reported"
+    # The file can be loaded again, in a different filter
+    fastk = FastGridMap(filename, filter="2MASS Ks")
+    assert fastk.errors == fast.errors, "Errors of the resampled map are not stored"
+    assert numpy.allclose(
+        fastk(ls[indx], bs[indx], dists[indx]),
+        green19(ls[indx], bs[indx], dists[indx])
+        * aebv("2MASS Ks")
+        / aebv("2MASS H"),
+        rtol=1e-5,
+    ), "Resampled HEALPix map does not convert to a different filter"
+    # Cartesian grid
+    drimmel = Drimmel03()
+    x, y, z = (
+        numpy.linspace(-2.0, 2.0, 21),
+        numpy.linspace(-2.0, 2.0, 21),
+        numpy.linspace(-0.5, 0.5, 11),
+    )
+    fast = FastGridMap.resample(
+        drimmel, str(tmp_path / "drimmel_fast.h5"), grid="cartesian", x=x, y=y, z=z
+    )
+    ix, iy, iz = (rng.integers(len(axis), size=1000) for axis in (x, y, z))
+    d = numpy.sqrt(x[ix] ** 2.0 + y[iy] ** 2.0 + z[iz] ** 2.0)
+    indx = d > 1e-3
+    ls = numpy.degrees(numpy.arctan2(y[iy], x[ix]))[indx] % 360.0
+    bs = numpy.degrees(numpy.arcsin(z[iz][indx] / d[indx]))
+    assert numpy.allclose(
+        fast(ls, bs, d[indx]), drimmel(ls, bs, d[indx]), rtol=1e-5, atol=1e-7
+    ), "Resampled Cartesian map does not agree with the original map at the grid nodes"
+    assert (
+        numpy.isfinite(fast.errors["max"]) and fast.errors["npoints"] > 0
+    ), "Error of the resampled Cartesian map is not reported"
+    assert numpy.isnan(
+        fast(0.0, 0.0, 5.0)
+    ), "Resampled Cartesian map is not NaN outside of the grid"
+    return None
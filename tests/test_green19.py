@@ -67,3 +67,264 @@ def test_against_known_values_vectorized():
     assert numpy.all(ebvs-green19(glons,glats,dists) < 10.**-8.), \
         'Vectorized Green19 extinction does not agree with known values'
     return None
+
+
+def test_vectorized_against_splines():
+    # Test that the vectorized linear interpolation agrees with evaluating
+    # the per-pixel k=1 splines that were used before
+    from scipy import interpolate
+    from mwdust import Green19
+    green19= Green19()
+    glons= rng.uniform(0.,360.,size=200)
+    glats= rng.uniform(-90.,90.,size=200)
+    dists= rng.uniform(0.01,100.,size=200)
+    ebvs= green19(glons,glats,dists)
+    lbIndx= green19._lbIndx(glons,glats)
+    for ebv,indx,dist in zip(ebvs,lbIndx,dists):
+        if indx == -1:
+            assert numpy.isnan(ebv), \
+                'Vectorized Green19 extinction is not NaN outside of the map'
+            continue
+        spl= interpolate.InterpolatedUnivariateSpline(green19._distmods,
+                                                      green19._best_fit[indx],
+                                                      k=1)
+        assert numpy.fabs(ebv-spl(5.*numpy.log10(dist)+10.)) < 10.**-12., \
+            'Vectorized Green19 extinction does not agree with the per-pixel spline'
+    return None
+
+
+def test_precomputed_against_splines():
+    # Test that the precomputed piecewise-polynomial coefficients for
+    # interpk > 1 agree with the per-pixel splines
+    from mwdust import Green19
+    glons= rng.uniform(0.,360.,size=200)
+    glats= rng.uniform(-90.,90.,size=200)
+    dists= rng.uniform(0.01,10.,size=200)
+    green19= Green19(interpk=3)
+    ebvs= green19(glons,glats,dists)
+    del green19
+    green19= Green19(interpk=3,precompute=True)
+    assert numpy.nanmax(numpy.fabs(ebvs-green19(glons,glats,dists))) < 10.**-10., \
+        'Green19 extinction with precomputed coefficients does not agree with the per-pixel splines'
+    return None
+
+def test_mmap_against_inmemory():
+    # Test that the memory-mapped map gives the same extinction as the
+    # in-memory one
+    from mwdust import Green19
+    glons= rng.uniform(0.,360.,size=200)
+    glats= rng.uniform(-90.,90.,size=200)
+    dists= rng.uniform(0.01,10.,size=200)
+    green19= Green19()
+    ebvs= green19(glons,glats,dists)
+    del green19
+    # Twice: once to create the .npy files, once to load them
+    for ii in range(2):
+        green19= Green19(mmap=True)
+        assert isinstance(green19._best_fit,numpy.memmap), \
+            'Green19 with mmap=True does not memory-map the best fit'
+        assert numpy.all((ebvs == green19(glons,glats,dists))
+                         +(numpy.isnan(ebvs)
+                           *numpy.isnan(green19(glons,glats,dists)))), \
+            'Green19 extinction with mmap=True does not agree with the in-memory map'
+        del green19
+    return None
+
+def test_dense_lookup_against_levels():
+    # Test that the dense pixel lookup table gives the same map entries as
+    # the per-level sorted index
+    from mwdust import Green19
+    import mwdust.HierarchicalHealpixMap
+    glons= rng.uniform(0.,360.,size=10000)
+    glats= numpy.degrees(numpy.arcsin(rng.uniform(-1.,1.,size=10000)))
+    green19= Green19()
+    indx= green19._lbIndx(glons,glats)
+    dense_maxnside= mwdust.HierarchicalHealpixMap._DENSE_LOOKUP_MAXNSIDE
+    try:
+        mwdust.HierarchicalHealpixMap._DENSE_LOOKUP_MAXNSIDE= 0
+        green19._setup_lookup()
+        assert green19._lookup_levels is not None, \
+            'Green19 does not use the per-level sorted index for large nside'
+        assert numpy.all(indx == green19._lbIndx(glons,glats)), \
+            'Green19 dense pixel lookup does not agree with the per-level sorted index'
+    finally:
+        mwdust.HierarchicalHealpixMap._DENSE_LOOKUP_MAXNSIDE= dense_maxnside
+    return None
+
+def test_evaluate_parallel_against_serial():
+    # Test that evaluating the map in chunks on threads and processes gives
+    # the same extinction, in the same order, as the serial evaluation
+    from mwdust import Green19
+    glons= rng.uniform(0.,360.,size=5000)
+    glats= numpy.degrees(numpy.arcsin(rng.uniform(-1.,1.,size=5000)))
+    dists= rng.uniform(0.01,10.,size=5000)
+    for mmap in [False,True]:
+        green19= Green19(mmap=mmap)
+        ebvs= green19(glons,glats,dists)
+        for executor in ['thread','process']:
+            pebvs= green19.evaluate_parallel(glons,glats,dists,n_workers=2,
+                                             chunk_size=700,executor=executor)
+            assert numpy.all((ebvs == pebvs)
+                             +(numpy.isnan(ebvs)*numpy.isnan(pebvs))), \
+                f'Green19 extinction evaluated in parallel with {executor}s and mmap={mmap} does not agree with the serial evaluation'
+        del green19
+    return None
+
+def test_evaluate_parallel_full_shm(monkeypatch):
+    # Test that the map's arrays are not written to /dev/shm if it does not
+    # have room for them, and that the evaluation still works
+    import collections
+    import tempfile
+    from mwdust import Green19
+    from mwdust import DustMap3D as dustmap3d # the module
+    green19= Green19()
+    state= green19.__getstate__()
+    monkeypatch.setattr(dustmap3d.shutil,'disk_usage',
+                        lambda path: collections.namedtuple(\
+                            'usage',['total','used','free'])(2**26,2**26,0))
+    assert dustmap3d._share_dir(state) == tempfile.gettempdir(), \
+        'Map arrays are written to /dev/shm without room for them'
+    glons= rng.uniform(0.,360.,size=1000)
+    glats= numpy.degrees(numpy.arcsin(rng.uniform(-1.,1.,size=1000)))
+    dists= rng.uniform(0.01,10.,size=1000)
+    ebvs= green19(glons,glats,dists)
+    pebvs= green19.evaluate_parallel(glons,glats,dists,n_workers=2,
+                                     chunk_size=300,executor='process')
+    assert numpy.all((ebvs == pebvs)+(numpy.isnan(ebvs)*numpy.isnan(pebvs))), \
+        'Green19 extinction evaluated in parallel without /dev/shm does not agree with the serial evaluation'
+    return None
+
+def test_grid_against_forloop():
+    # Test that evaluating the map on a grid of sightlines and distances, and
+    # with general broadcasting, gives the same extinction as evaluating
+    # each (sightline,distance) pair
+    from mwdust import Green19
+    glons= rng.uniform(0.,360.,size=50)
+    glats= rng.uniform(-90.,90.,size=50)
+    dists= rng.uniform(0.01,10.,size=7)
+    green19= Green19()
+    ebvs= numpy.array([[green19(glon,glat,dist)[0] for dist in dists]
+                       for glon,glat in zip(glons,glats)])
+    for gebvs in [green19(glons,glats,dists,grid=True),
+                  green19(glons[:,None],glats[:,None],dists)]:
+        assert gebvs.shape == (len(glons),len(dists)), \
+            'Green19 extinction on a grid does not have the expected shape'
+        assert numpy.all((ebvs == gebvs)
+                         +(numpy.isnan(ebvs)*numpy.isnan(gebvs))), \
+            'Green19 extinction on a grid does not agree with the extinction evaluated for each sightline and distance'
+    return None
+
+def test_filters_against_single_filter():
+    # Test that the extinction in multiple filters from a single evaluation
+    # agrees with the extinction of maps set up for each filter
+    from mwdust import Green19
+    glons= rng.uniform(0.,360.,size=100)
+    glats= rng.uniform(-90.,90.,size=100)
+    dists= rng.uniform(0.01,10.,size=100)
+    filters= ['2MASS J','2MASS H','2MASS Ks']
+    green19= Green19()
+    aebvs= green19(glons,glats,dists,filters=filters)
+    assert aebvs.shape == (len(glons),len(filters)), \
+        'Green19 extinction in multiple filters does not have the expected shape'
+    # per-star filters
+    starfilters= numpy.array(filters)[rng.integers(len(filters),size=100)]
+    saebvs= green19(glons,glats,dists,filters=starfilters)
+    for ii,filter in enumerate(filters):
+        fgreen19= Green19(filter=filter)
+        faebvs= fgreen19(glons,glats,dists)
+        assert numpy.all((aebvs[:,ii] == faebvs)
+                         +(numpy.isnan(aebvs[:,ii])*numpy.isnan(faebvs))), \
+            'Green19 extinction in multiple filters does not agree with the extinction of the map for a single filter'
+        indx= starfilters == filter
+        assert numpy.all((saebvs[indx] == faebvs[indx])
+                         +(numpy.isnan(saebvs[indx])
+                           *numpy.isnan(faebvs[indx]))), \
+            'Green19 extinction in per-star filters does not agree with the extinction of the map for a single filter'
+    # and in parallel
+    paebvs= green19.evaluate_parallel(glons,glats,dists,chunk_size=30,
+                                      filters=filters)
+    assert numpy.all((aebvs == paebvs)+(numpy.isnan(aebvs)*numpy.isnan(paebvs))), \
+        'Green19 extinction in multiple filters evaluated in parallel does not agree with the serial evaluation'
+    paebvs= green19.evaluate_parallel(glons,glats,dists,chunk_size=30,
+                                      filters=starfilters)
+    assert numpy.all((saebvs == paebvs)+(numpy.isnan(saebvs)*numpy.isnan(paebvs))), \
+        'Green19 extinction in per-star filters evaluated in parallel does not agree with the serial evaluation'
+    return None
+
+def test_evaluate_samples_against_substitute_sample():
+    # Test that evaluating all samples in a single pass gives the same
+    # extinction as substituting each sample for the best fit
+    from mwdust import Green19
+    glons= rng.uniform(0.,360.,size=1000)
+    glats= rng.uniform(-90.,90.,size=1000)
+    dists= rng.uniform(0.01,10.,size=1000)
+    green19= Green19()
+    sebvs= green19.evaluate_samples(glons,glats,dists)
+    green19= Green19(load_samples=True)
+    for ii in range(sebvs.shape[1]):
+        green19.substitute_sample(ii)
+        ebvs= green19(glons,glats,dists)
+        assert numpy.all((ebvs == sebvs[:,ii])
+                         +(numpy.isnan(ebvs)*numpy.isnan(sebvs[:,ii]))), \
+            'Green19 extinction of all samples does not agree with the extinction from substitute_sample'
+    # A subset of the samples and percentiles
+    samples= [3,1]
+    assert numpy.all((green19.evaluate_samples(glons,glats,dists,
+                                               samples=samples)
+                      == sebvs[:,samples])
+                     +numpy.isnan(sebvs[:,samples])), \
+        'Green19 extinction of a subset of the samples does not agree with the extinction of all samples'
+    pebvs= green19.evaluate_samples(glons,glats,dists,percentiles=[16.,50.,84.])
+    assert numpy.allclose(pebvs,numpy.percentile(sebvs,[16.,50.,84.],axis=1).T,
+                          equal_nan=True), \
+        'Green19 percentiles of the samples do not agree with the percentiles of the extinction of all samples'
+    return None
+
+def test_quantiles_against_samples():
+    # Test that the precomputed quantiles agree with the percentiles of the
+    # samples at the distances of the map
+    from mwdust import Green19
+    glons= rng.uniform(0.,360.,size=1000)
+    glats= rng.uniform(-90.,90.,size=1000)
+    green19= Green19()
+    green19.precompute_quantiles(quantiles=[0.5])
+    green19= Green19()
+    for distmod in green19._distmods[::17]:
+        dist= 10.**(distmod/5.-2.)
+        qebvs= green19(glons,glats,dist,quantiles=[0.5])
+        sebvs= green19.evaluate_samples(glons,glats,dist,percentiles=[50.])
+        assert qebvs.shape == (len(glons),1), \
+            'Green19 quantiles of the extinction do not have the expected shape'
+        assert numpy.allclose(qebvs,sebvs,equal_nan=True), \
+            'Green19 quantiles of the extinction do not agree with the percentiles of the samples'
+    return None
+
+def test_rechunked_samples_against_samples():
+    # Test that the samples re-chunked for reading sets of pixels or single
+    # samples give the same extinction as the original samples
+    import os
+    from mwdust import Green19
+    glons= rng.uniform(0.,360.,size=1000)
+    glats= rng.uniform(-90.,90.,size=1000)
+    dists= rng.uniform(0.01,10.,size=1000)
+    green19= Green19(load_samples=True)
+    sebvs= green19.evaluate_samples(glons,glats,dists)
+    for layout, compression in [('pixel',None),('sample','lzf')]:
+        green19.rechunk_samples(layout=layout,compression=compression)
+        rgreen19= Green19(load_samples=True)
+        try:
+            rsebvs= rgreen19.evaluate_samples(glons,glats,dists)
+            assert numpy.all((rsebvs == sebvs)
+                             +(numpy.isnan(rsebvs)*numpy.isnan(sebvs))), \
+                f'Green19 extinction of the samples re-chunked with layout {layout} does not agree with that of the original samples'
+            rgreen19.substitute_sample(1)
+            rebvs= rgreen19(glons,glats,dists)
+            assert numpy.all((rebvs == sebvs[:,1])
+                             +(numpy.isnan(rebvs)*numpy.isnan(sebvs[:,1]))), \
+                f'Green19 extinction of a sample re-chunked with layout {layout} does not agree with that of the original sample'
+        finally:
+            # Remove the re-chunked samples
+            samplesfile= rgreen19._samplesfile
+            del rgreen19
+            os.remove(f'{os.path.splitext(samplesfile)[0]}_samples_{layout}.h5')
+    return None
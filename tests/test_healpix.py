@@ -0,0 +1,158 @@
+import numpy
+from numpy.random import default_rng
+
+rng = default_rng()
+
+
+def test_query_disc_against_healpy():
+    # Test that the pixels within discs agree with healpy's query_disc
+    import healpy
+    from mwdust.util.healpix import query_disc
+
+    for nside in [1, 16, 256, 1024]:
+        ndisc = 20
+        vecs = healpy.ang2vec(
+            numpy.arccos(rng.uniform(-1.0, 1.0, size=ndisc)),
+            rng.uniform(0.0, 2.0 * numpy.pi, size=ndisc),
+        )
+        radii = rng.uniform(0.0, 0.2, size=ndisc)
+        radii[0] = 2.0  # large disc
+        offsets, ipixs = query_disc(nside, vecs, radii, nest=True)
+        for ii in range(ndisc):
+            assert numpy.array_equal(
+                ipixs[offsets[ii] : offsets[ii + 1]],
+                healpy.query_disc(nside, vecs[ii], radii[ii], nest=True),
+            ), "query_disc does not agree with healpy"
+            assert numpy.array_equal(
+                ipixs[offsets[ii] : offsets[ii + 1]],
+                query_disc(nside, vecs[ii], radii[ii], nest=True),
+            ), "query_disc for multiple discs does not agree with a single disc"
+            # Inclusive queries return at least the pixels that healpy returns
+            ipix_inclusive = query_disc(
+                nside, vecs[ii], radii[ii], inclusive=True, nest=True
+            )
+            assert numpy.all(
+                numpy.isin(
+                    healpy.query_disc(
+                        nside, vecs[ii], radii[ii], inclusive=True, nest=True
+                    ),
+                    ipix_inclusive,
+                )
+            ), "query_disc with inclusive=True misses pixels that overlap the disc"
+    return None
+
+
+def test_query_polygon_against_healpy():
+    # Test that the pixels within convex polygons agree with healpy's
+    # query_polygon
+    import healpy
+    from mwdust.util.healpix import query_polygon
+
+    for nside in [1, 16, 256, 1024]:
+        polygons = []
+        for ii in range(20):
+            center = healpy.ang2vec(
+                numpy.arccos(rng.uniform(-1.0, 1.0)), rng.uniform(0.0, 2.0 * numpy.pi)
+            )
+            east = numpy.cross([0.0, 0.0, 1.0], center)
+            east /= numpy.linalg.norm(east)
+            north = numpy.cross(center, east)
+            angles = numpy.sort(rng.uniform(0.0, 2.0 * numpy.pi, size=3 + ii % 3))
+            size = rng.uniform(0.01, 0.3)
+            vertices = numpy.cos(size) * center + numpy.sin(size) * (
+                numpy.cos(angles)[:, None] * east + numpy.sin(angles)[:, None] * north
+            )
+            if ii % 2 == 1:  # both orientations
+                vertices = vertices[::-1]
+            try:
+                healpy.query_polygon(nside, vertices, nest=True)
+            except ValueError:  # not convex
+                continue
+            polygons.append(vertices)
+        offsets, ipixs = query_polygon(nside, polygons, nest=True)
+        for ii, vertices in enumerate(polygons):
+            assert numpy.array_equal(
+                ipixs[offsets[ii] : offsets[ii + 1]],
+                healpy.query_polygon(nside, vertices, nest=True),
+            ), "query_polygon does not agree with healpy"
+            ipix_inclusive = query_polygon(nside, vertices, inclusive=True, nest=True)
+            assert numpy.all(
+                numpy.isin(
+                    healpy.query_polygon(nside, vertices, inclusive=True, nest=True),
+                    ipix_inclusive,
+                )
+            ), "query_polygon with inclusive=True misses pixels that overlap the polygon"
+    return None
+
+
+def test_to_healpix_against_pixel_centers():
+    # Test that the full-sky export agrees with evaluating the map at the
+    # centers of the pixels, and with averaging the pixels for a lower nside
+    from mwdust import Green19
+    from mwdust.util.healpix import pix2ang
+
+    green19 = Green19(filter="2MASS H")
+    dists = numpy.array([0.7, 2.5])
+    nside = 2 * int(green19._maxnside)
+    pix_val = green19.to_healpix(nside, dists)
+    theta, phi = pix2ang(nside, numpy.arange(12 * nside**2), nest=True)
+    assert numpy.allclose(
+        pix_val,
+        green19(numpy.degrees(phi), 90.0 - numpy.degrees(theta), dists, grid=True).T,
+        equal_nan=True,
+        rtol=1e-12,
+    ), "to_healpix does not agree with the map at the centers of the pixels"
+    pix_val_low = green19.to_healpix(nside // 8, dists)
+    children = pix_val.reshape((len(dists), -1, 64))
+    covered = numpy.sum(~numpy.isnan(children), axis=2)
+    assert numpy.allclose(
+        pix_val_low[covered > 0],
+        numpy.nansum(children, axis=2)[covered > 0] / covered[covered > 0],
+    ), "to_healpix for a lower nside does not agree with averaging the pixels"
+    assert numpy.all(
+        numpy.isnan(pix_val_low[covered == 0])
+    ), "to_healpix for a lower nside has values outside of the map"
+    return None
+
+
+def test_to_healpix_nan_per_distance(tmp_path):
+    # Test that averaging the pixels for a lower nside skips NaN extinction
+    # that only occurs at some distances, and that writing to a file gives
+    # the same maps
+    from mwdust import Green19
+
+    green19 = Green19(filter="2MASS H")
+    disk_extinction = green19._disk_extinction
+
+    def nan_disk_extinction(lbIndx, dist):
+        # NaN extinction at the first distance for every third row
+        out = disk_extinction(lbIndx, dist)
+        out[(lbIndx % 3 == 0), ..., 0] = numpy.nan
+        return out
+
+    green19._disk_extinction = nan_disk_extinction
+    dists = numpy.array([0.7, 2.5])
+    nside = 2 * int(green19._maxnside)
+    pix_val = green19.to_healpix(nside, dists)
+    children = pix_val.reshape((len(dists), -1, 64))
+    covered = numpy.sum(~numpy.isnan(children), axis=2)
+    assert numpy.any(
+        covered[0] != covered[1]
+    ), "The test does not have NaN extinction at only some distances"
+    pix_val_low = green19.to_healpix(nside // 8, dists)
+    assert numpy.allclose(
+        pix_val_low[covered > 0],
+        numpy.nansum(children, axis=2)[covered > 0] / covered[covered > 0],
+    ), "to_healpix for a lower nside does not skip NaN extinction"
+    assert numpy.all(
+        numpy.isnan(pix_val_low[covered == 0])
+    ), "to_healpix for a lower nside has values where all extinction is NaN"
+    filename = str(tmp_path / "green19.npy")
+    pix_val_file = green19.to_healpix(nside // 8, dists, filename=filename)
+    assert numpy.array_equal(
+        numpy.load(filename), pix_val_low, equal_nan=True
+    ), "to_healpix with filename= does not agree with the maps in memory"
+    assert numpy.array_equal(
+        pix_val_file, pix_val_low, equal_nan=True
+    ), "to_healpix with filename= does not return the maps"
+    return None
@@ -0,0 +1,79 @@
+import numpy
+import pytest
+from numpy.random import default_rng
+from scipy import interpolate
+
+rng = default_rng()
+
+
+def test_array_against_scalar_loop():
+    # Test that evaluating arrays of (l,b,d) agrees with a loop over scalars
+    # and with the linear spline through the data of each line of sight that
+    # the scalar evaluation used before the vectorization
+    from mwdust import Marshall06
+
+    marshall = Marshall06(filter="2MASS Ks")
+    nstar = 200
+    glons = rng.uniform(-100.0, 100.0, size=nstar)
+    glons[::2] %= 360.0  # both conventions for l
+    glats = rng.uniform(-10.0, 10.0, size=nstar)
+    dists = rng.uniform(0.0, 35.0, size=nstar)  # includes the extrapolation
+    loop = numpy.array(
+        [marshall(l, b, d) for l, b, d in zip(glons, glats, dists)]
+    ).flatten()
+    assert numpy.allclose(
+        marshall(glons, glats, dists), loop, rtol=1e-12, atol=0.0
+    ), "Marshall06 for arrays does not agree with a loop over scalars"
+    ref = numpy.array(
+        [
+            interpolate.InterpolatedUnivariateSpline(
+                marshall.lbData(l, b, addBC=True)["dist"],
+                marshall.lbData(l, b, addBC=True)["aks"],
+                k=1,
+            )(d)
+            for l, b, d in zip(glons, glats, dists)
+        ]
+    )
+    assert numpy.allclose(
+        loop, ref, rtol=1e-10, atol=1e-12
+    ), "Marshall06 does not agree with a linear spline through the data"
+    # Grid of distances for each line of sight
+    grid_dists = numpy.array([0.0, 0.5, 2.0, 7.5, 15.0, 40.0])
+    assert numpy.allclose(
+        marshall(glons, glats, grid_dists, grid=True),
+        numpy.array([marshall(l, b, grid_dists) for l, b in zip(glons, glats)]),
+        rtol=1e-12,
+        atol=0.0,
+    ), "Marshall06 for a grid of distances does not agree with a loop over scalars"
+    return None
+
+
+def test_outside_of_the_map():
+    # Test that lines of sight outside of the map give NaN for array input
+    # and raise an IndexError for scalar input
+    from mwdust import Marshall06
+
+    marshall = Marshall06(filter="2MASS Ks")
+    glons = numpy.array([0.0, 150.0, -120.0, 100.2, 30.0, 30.0, 250.0, 5.0])
+    glats = numpy.array([0.0, 0.0, 1.0, 0.0, 10.2, -12.0, 0.0, -3.0])
+    inside = numpy.array([True, False, False, False, False, False, False, True])
+    dists = numpy.full(len(glons), 3.0)
+    ext = marshall(glons, glats, dists)
+    assert numpy.all(
+        numpy.isnan(ext[~inside])
+    ), "Marshall06 for arrays is not NaN outside of the map"
+    assert numpy.all(
+        numpy.isfinite(ext[inside])
+    ), "Marshall06 for arrays is not finite inside of the map"
+    for ii in range(len(glons)):
+        if inside[ii]:
+            assert numpy.allclose(
+                marshall(glons[ii], glats[ii], dists[ii]),
+                ext[ii],
+                rtol=1e-12,
+                atol=0.0,
+            ), "Marshall06 for scalars does not agree with arrays inside the map"
+            continue
+        with pytest.raises(IndexError):
+            marshall(glons[ii], glats[ii], dists[ii])
+    return None
@@ -0,0 +1,131 @@
+import numpy
+import pytest
+from numpy.random import default_rng
+from scipy import interpolate
+
+rng = default_rng()
+
+
+def spline_extinction(sale, row, d):
+    # Extinction in 2MASS Ks of a cell from the linear spline through its data
+    # that the scalar evaluation used before the vectorization (A0/AKs = 11)
+    return (
+        interpolate.InterpolatedUnivariateSpline(sale._ds, sale._meanA[row], k=1)(d)
+        / 11.0
+    )
+
+
+def containing_cell(sale, l, b, margin=1e-4):
+    # The cell that contains (l,b) by more than margin, -1 if there is none
+    rows = numpy.nonzero(
+        (numpy.asarray(sale._saledata["lmin"]) < l - margin)
+        * (numpy.asarray(sale._saledata["lmax"]) > l + margin)
+        * (numpy.asarray(sale._saledata["b_min"]) < b - margin)
+        * (numpy.asarray(sale._saledata["b_max"]) > b + margin)
+    )[0]
+    return rows[0] if len(rows) == 1 else -1
+
+
+def nearest_cell(sale, l, b):
+    # The cell that the scalar evaluation used before the vectorization
+    return numpy.argmin(
+        (l - sale._saledata["GLON"]) ** 2.0 / sale._dl**2.0
+        + (b - sale._saledata["GLAT"]) ** 2.0 / sale._db**2.0
+    )
+
+
+def test_array_against_scalar_loop():
+    # Test that evaluating arrays of (l,b,d) agrees with a loop over scalars,
+    # including distances outside of the distance grid of the map, and that
+    # lines of sight outside of the map give NaN for arrays and raise an
+    # IndexError for scalars
+    from mwdust import Sale14
+
+    sale = Sale14(filter="2MASS Ks")
+    nstar = 200
+    glons = rng.uniform(sale._lmin - 1.0, sale._lmax + 1.0, size=nstar)
+    glats = rng.uniform(sale._bmin - 1.0, sale._bmax + 1.0, size=nstar)
+    dists = rng.uniform(0.0, 16.0, size=nstar)
+    inside = (
+        (glons > sale._lmin)
+        * (glons < sale._lmax)
+        * (glats > sale._bmin)
+        * (glats < sale._bmax)
+    )
+    ext = sale(glons, glats, dists)
+    assert numpy.all(
+        numpy.isnan(ext[~inside])
+    ), "Sale14 for arrays is not NaN outside of the map"
+    loop = numpy.array(
+        [
+            sale(l, b, d)
+            for l, b, d in zip(glons[inside], glats[inside], dists[inside])
+        ]
+    ).flatten()
+    assert numpy.allclose(
+        ext[inside], loop, rtol=1e-12, atol=0.0
+    ), "Sale14 for arrays does not agree with a loop over scalars"
+    for l, b, d in zip(glons[~inside][:10], glats[~inside][:10], dists[~inside][:10]):
+        with pytest.raises(IndexError):
+            sale(l, b, d)
+    # Lines of sight that are clearly inside of a cell get its extinction
+    rows = numpy.array(
+        [containing_cell(sale, l, b) for l, b in zip(glons[inside], glats[inside])]
+    )
+    assert numpy.allclose(
+        ext[inside][rows != -1],
+        [
+            spline_extinction(sale, row, d)
+            for row, d in zip(rows[rows != -1], dists[inside][rows != -1])
+        ],
+        rtol=1e-10,
+        atol=0.0,
+    ), "Sale14 does not agree with a linear spline through the data of the cell"
+    return None
+
+
+def test_lbgrid_holes():
+    # Test that the parts of the map that are not covered by any cell get
+    # the extinction of the nearest cell, as for the scalar evaluation before
+    # the vectorization; cells are removed to make sure that there are holes
+    from mwdust import Sale14
+
+    sale = Sale14(filter="2MASS Ks")
+    keep = numpy.arange(len(sale._saledata)) % 50 != 7
+    sale._saledata = sale._saledata[keep]
+    sale._dl, sale._db = sale._dl[keep], sale._db[keep]
+    sale._meanA = sale._meanA[keep]
+    sale._setup_lbgrid()
+    # Centers of the grid cells that are not covered by any cell
+    lIndx, bIndx = numpy.meshgrid(
+        numpy.arange(sale._lbgrid.shape[0]),
+        numpy.arange(sale._lbgrid.shape[1]),
+        indexing="ij",
+    )
+    glons = (sale._lmin + (lIndx + 0.5) * sale._dlgrid).flatten()
+    glats = (sale._bmin + (bIndx + 0.5) * sale._dbgrid).flatten()
+    holes = numpy.array(
+        [containing_cell(sale, l, b, margin=0.0) for l, b in zip(glons, glats)]
+    )
+    holes = holes == -1
+    assert numpy.sum(holes) >= numpy.sum(~keep), "The test has no holes in the map"
+    glons, glats = glons[holes], glats[holes]
+    dists = rng.uniform(0.0, 16.0, size=len(glons))
+    ref = numpy.array(
+        [
+            spline_extinction(sale, nearest_cell(sale, l, b), d)
+            for l, b, d in zip(glons, glats, dists)
+        ]
+    )
+    assert numpy.allclose(
+        sale(glons, glats, dists), ref, rtol=1e-10, atol=0.0
+    ), "Sale14 for arrays does not use the nearest cell in the holes of the map"
+    assert numpy.allclose(
+        numpy.array(
+            [sale(l, b, d) for l, b, d in zip(glons, glats, dists)]
+        ).flatten(),
+        ref,
+        rtol=1e-10,
+        atol=0.0,
+    ), "Sale14 for scalars does not use the nearest cell in the holes of the map"
+    return None
@@ -62,3 +62,42 @@ def test_against_known_values():
         < 10.0**-7.0
     ), f"SFD extinction does not agree with known values, with max difference {numpy.amax(numpy.fabs(ebvs-numpy.array([sfd(glon,glat,1.)[0] for glon,glat in zip(glons,glats)])))}"
     return None
+
+
+def test_inmemory_against_c():
+    # Test that the in-memory SFD evaluation agrees exactly with the C code
+    from mwdust import SFD
+
+    glons = rng.uniform(0.0, 360.0, size=1000)
+    glats = numpy.degrees(numpy.arcsin(rng.uniform(-1.0, 1.0, size=1000)))
+    for interp in [True, False]:
+        sfd_c = SFD(interp=interp, noloop=True)
+        sfd_inmemory = SFD(interp=interp, inmemory=True)
+        assert numpy.all(
+            sfd_c(glons, glats, 1.0) == sfd_inmemory(glons, glats, 1.0)
+        ), f"In-memory SFD extinction with interp={interp} does not agree with the C code"
+    return None
+
+
+def test_threads_against_serial():
+    # Test that concurrent SFD evaluations from several threads agree exactly
+    # with serial evaluations
+    from concurrent.futures import ThreadPoolExecutor
+    from mwdust import SFD
+
+    glons = rng.uniform(0.0, 360.0, size=400)
+    glats = numpy.degrees(numpy.arcsin(rng.uniform(-1.0, 1.0, size=400)))
+    for noloop in [False, True]:
+        sfd = SFD(noloop=noloop)
+        serial = sfd(glons, glats, 1.0)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            threaded = list(
+                executor.map(
+                    lambda ii: sfd(glons[ii::8], glats[ii::8], 1.0), range(8)
+                )
+            )
+        for ii in range(8):
+            assert numpy.all(
+                threaded[ii] == serial[ii::8]
+            ), f"SFD extinction evaluated in threads with noloop={noloop} does not agree with serial evaluation"
+    return None